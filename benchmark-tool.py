@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Builtin Modules
+import time
+import textwrap
+import argparse
+
+# Project Modules
+from worker.utils import yaml_resources
+from worker.utils.log_helper import LogHelper
+from worker.utils.extra_helpers import MySQLHelper, RedisHelper
+
+COLOR_MAP = {
+    'grey'   : '\033[0;30m',
+    'red'    : '\033[0;31m',
+    'green'  : '\033[0;32m',
+    'yellow' : '\033[0;33m',
+    'blue'   : '\033[0;34m',
+    'magenta': '\033[0;35m',
+    'cyan'   : '\033[0;36m',
+}
+def colored(s, color=None):
+    if not color:
+        color = 'yellow'
+
+    color = COLOR_MAP[color]
+
+    return color + '{}\033[0m'.format(s)
+
+CONFIG = yaml_resources.get('CONFIG')
+
+DEFAULT_COUNT = 10000
+
+COMMAND_FUNCS = {}
+
+def command(F):
+    COMMAND_FUNCS[F.__name__] = F
+    return F
+
+def prepare_task(task):
+    '''
+    准备任务对象（不经过Celery直接使用）
+    '''
+    task.logger   = LogHelper()
+    task.db       = MySQLHelper(task.logger)
+    task.cache_db = RedisHelper(task.logger)
+
+    task.db.skip_log       = True
+    task.cache_db.skip_log = True
+
+    task.prepare_task_helpers()
+
+    return task
+
+def run_benchmark(title, count, func):
+    # 预热
+    func()
+
+    start_time = time.perf_counter()
+    for i in range(count):
+        func()
+
+    cost = time.perf_counter() - start_time
+
+    print('{0}: {1} x {2} ({3} per call, {4} ops/s)'.format(
+        colored(title, 'cyan'),
+        count,
+        colored('{:.3f}s'.format(cost)),
+        colored('{:.2f}μs'.format(cost / count * 1000 * 1000)),
+        colored(int(count / cost), 'green')))
+
+@command
+def safe_scope(options):
+    '''
+    创建安全脚本作用域
+    '''
+    from worker.tasks.main.func_runner import func_runner
+
+    task  = prepare_task(func_runner)
+    count = options.get('count') or DEFAULT_COUNT
+
+    extra_vars = {
+        '_DFF_DEBUG'    : False,
+        '_DFF_SCRIPT_ID': 'benchmark__main',
+        '_DFF_FUNC_ID'  : 'benchmark__main.run',
+    }
+
+    def create_safe_scope():
+        task.create_safe_scope(
+            script_name='benchmark__main',
+            script_dict={},
+            extra_vars=extra_vars)
+
+    run_benchmark('Create safe scope', count, create_safe_scope)
+
+@command
+def func_result(options):
+    '''
+    生成函数运行结果（多MB返回值）
+    '''
+    from worker.tasks.main import FuncResponse
+    from worker.tasks.main.func_runner import func_runner
+
+    task  = prepare_task(func_runner)
+    count = options.get('count') or 10
+
+    # 约5MB的返回值
+    data = [ { 'id': i, 'name': 'item-{0}'.format(i), 'tags': [ 'a', 'b', 'c' ], 'value': i * 1.5 } for i in range(60000) ]
+    func_resp = FuncResponse(data)
+
+    print('Result size: {0}'.format(colored('{:.2f}MB'.format(len(func_resp.data_dumps) / 1024 / 1024))))
+
+    run_benchmark('Create FuncResponse', count, lambda: FuncResponse(data))
+    for return_type in ('raw', 'jsonDumps', 'repr', 'ALL'):
+        run_benchmark('Create func result ({0})'.format(return_type), count,
+                lambda: task.create_func_result(func_resp, return_type))
+
+def main(options):
+    command = options.get('command')
+    command_func = COMMAND_FUNCS.get(command)
+
+    if not command_func:
+        raise Exception('No such command: {0}\n Command should be one of {1}'.format(
+                command,
+                ', '.join(COMMAND_FUNCS.keys())
+            ))
+
+    command_func(options)
+
+def get_options_by_command_line():
+    arg_parser = argparse.ArgumentParser(
+        prog='benchmark-tool.py',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description=textwrap.dedent('''
+            +------------------------------+
+            | DataFlux Func Benchmark Tool |
+            +------------------------------+
+            This tool should run in the Docker container:
+                $ docker exec {DataFlux Func Container ID} sh -c 'exec python benchmark-tool.py --help'
+                $ docker exec {DataFlux Func Container ID} sh -c 'exec python benchmark-tool.py safe_scope'
+                $ docker exec {DataFlux Func Container ID} sh -c 'exec python benchmark-tool.py safe_scope -n 100000'
+                $ docker exec {DataFlux Func Container ID} sh -c 'exec python benchmark-tool.py func_result'
+        '''))
+
+    # 执行操作
+    arg_parser.add_argument('command', metavar='<Command>', help=', '.join(COMMAND_FUNCS.keys()))
+
+    # 执行次数
+    arg_parser.add_argument('-n', '--count', type=int, help='Count of calls (default: {0})'.format(DEFAULT_COUNT))
+
+    args = vars(arg_parser.parse_args())
+    args = dict(filter(lambda x: x[1] is not None, args.items()))
+
+    return args
+
+if __name__ == '__main__':
+    options = get_options_by_command_line()
+
+    try:
+        main(options)
+
+    except KeyboardInterrupt as e:
+        print(colored('Canceled', 'yellow'))
+
+    except Exception as e:
+        print(colored(str(e), 'red'))
+
+    else:
+        print(colored('Done', 'green'))
@@ -407,6 +407,21 @@ VALUES
 UNLOCK TABLES;
 
 
+# 转储表 biz_main_script_change_log
+# ------------------------------------------------------------
+
+DROP TABLE IF EXISTS `biz_main_script_change_log`;
+
+CREATE TABLE `biz_main_script_change_log` (
+  `seq` bigint(20) unsigned NOT NULL AUTO_INCREMENT,
+  `scriptId` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin DEFAULT NULL COMMENT '脚本ID（NULL表示全部脚本）',
+  `createTime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updateTime` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`seq`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='脚本变更记录';
+
+
+
 # 转储表 biz_main_script_failure
 # ------------------------------------------------------------
 
@@ -107,6 +107,29 @@ function _getTaskDefaultQueue(execMode) {
   return FUNC_TASK_DEFAULT_QUEUE_MAP[execMode] || CONFIG._FUNC_TASK_DEFAULT_QUEUE;
 };
 
+function _resolveTaskQueue(queue, execMode) {
+  if (toolkit.isNullOrUndefined(queue)) {
+    return _getTaskDefaultQueue(execMode);
+  }
+
+  var queueNumber = parseInt(queue);
+  if (!isNaN(queueNumber) && queueNumber >= 0 && queueNumber < CONFIG._WORKER_QUEUE_COUNT) {
+    // 直接指定队列编号
+    return queue;
+  }
+
+  // 指定队列别名
+  var queueNumber = parseInt(CONFIG.WORKER_QUEUE_ALIAS_MAP[queue]);
+  if (isNaN(queueNumber) || queueNumber < 0 || queueNumber >= CONFIG._WORKER_QUEUE_COUNT) {
+    // 配置错误，无法解析为队列编号，或队列编号超过范围，使用默认函数队列。
+    // 保证无论如何都有Worker负责执行（实际运行会报错）
+    return _getTaskDefaultQueue(execMode);
+  }
+
+  // 队列别名转换为队列编号
+  return queueNumber;
+};
+
 function _getFuncById(locals, funcId, callback) {
   if (!funcId) {
     // 未传递函数ID不执行
@@ -449,6 +472,11 @@ function _createFuncCallOptionsFromRequest(req, res, func, callback) {
     }
   }
 
+  // 结果缓存过期后继续使用旧结果的时长
+  if (funcCallOptions.cacheResult && !toolkit.isNothing(func.extraConfigJSON.cacheResultStale)) {
+    funcCallOptions.cacheResultStale = parseInt(func.extraConfigJSON.cacheResultStale) || false;
+  }
+
   // HTTP请求信息
   funcCallOptions.httpRequest = _getHTTPRequestInfo(req);
 
@@ -546,6 +574,11 @@ function _createFuncCallOptionsForAPIAuth(req, res, func, apiAuth, callback) {
     }
   }
 
+  // 结果缓存过期后继续使用旧结果的时长
+  if (funcCallOptions.cacheResult && !toolkit.isNothing(func.extraConfigJSON.cacheResultStale)) {
+    funcCallOptions.cacheResultStale = parseInt(func.extraConfigJSON.cacheResultStale) || false;
+  }
+
   // HTTP请求信息
   funcCallOptions.httpRequest = funcCallOptions.funcCallKwargs.req = _getHTTPRequestInfo(req);
 
@@ -588,20 +621,72 @@ function _getFuncCallResultFromCache(locals, funcCallOptions, callback) {
   }
 
   // 2. 从Redis中获取
-  var cacheKey = toolkit.getWorkerCacheKey('cache', 'funcResult', [
-      'funcId'              , funcId,
-      'scriptCodeMD5'       , funcCallOptions.scriptCodeMD5,
-      'scriptPublishVersion', funcCallOptions.scriptPublishVersion,
-      'funcCallKwargsMD5'   , funcCallOptions.funcCallKwargsMD5]);
-  locals.cacheDB.get(cacheKey, function(err, cacheRes) {
+  var cacheTags = [
+    'funcId'              , funcId,
+    'scriptCodeMD5'       , funcCallOptions.scriptCodeMD5,
+    'scriptPublishVersion', funcCallOptions.scriptPublishVersion,
+    'funcCallKwargsMD5'   , funcCallOptions.funcCallKwargsMD5];
+
+  var cacheKey      = toolkit.getWorkerCacheKey('cache', 'funcResult', cacheTags);
+  var freshCacheKey = toolkit.getWorkerCacheKey('cache', 'funcResultFresh', cacheTags);
+  locals.cacheDB.mget([cacheKey, freshCacheKey], function(err, cacheRes) {
     if (err) return callback(err);
 
-    if (cacheRes) {
-      cacheRes = JSON.parse(cacheRes);
+    var resultCacheRes = cacheRes[0];
+    var freshCacheRes  = cacheRes[1];
+
+    if (resultCacheRes) {
+      resultCacheRes = JSON.parse(resultCacheRes);
+
+      // 结果已过期但仍可继续使用时，在后台刷新缓存
+      if (funcCallOptions.cacheResultStale && !freshCacheRes) {
+        _refreshFuncCallResultCache(locals, funcCallOptions, cacheTags);
+
+        // 不放入本地缓存，避免掩盖刷新后的结果
+        return callback(null, resultCacheRes);
+      }
     }
 
-    FUNC_RESULT_LRU.set(lruKey, cacheRes);
-    return callback(err, cacheRes);
+    FUNC_RESULT_LRU.set(lruKey, resultCacheRes);
+    return callback(null, resultCacheRes);
+  });
+};
+
+function _refreshFuncCallResultCache(locals, funcCallOptions, cacheTags) {
+  // 同一结果同时只允许一个刷新任务
+  var lockKey   = toolkit.getWorkerCacheKey('lock', 'funcResultRefresh', cacheTags);
+  var lockValue = toolkit.genUUID();
+  var lockAge   = funcCallOptions.timeout + CONFIG._FUNC_TASK_EXTRA_TIMEOUT_TO_KILL;
+  locals.cacheDB.lock(lockKey, lockValue, lockAge, function(err, cacheRes) {
+    if (err) return locals.logger.logError(err);
+
+    // 已有刷新任务
+    if (!cacheRes) return;
+
+    var celery = celeryHelper.createHelper(locals.logger);
+
+    var taskOptions = {
+      id           : toolkit.genDataId('task'),
+      queue        : funcCallOptions.queue,
+      softTimeLimit: funcCallOptions.timeout,
+      timeLimit    : funcCallOptions.timeout + CONFIG._FUNC_TASK_EXTRA_TIMEOUT_TO_KILL,
+    };
+    var taskKwargs = {
+      funcId           : funcCallOptions.funcId,
+      funcCallKwargs   : funcCallOptions.funcCallKwargs,
+      funcCallKwargsMD5: funcCallOptions.funcCallKwargsMD5,
+      origin           : funcCallOptions.origin,
+      originId         : funcCallOptions.originId,
+      execMode         : 'async',
+      cacheRefresh     : true,
+      triggerTime      : funcCallOptions.triggerTime,
+      triggerTimeMs    : funcCallOptions.triggerTimeMs,
+      queue            : funcCallOptions.queue,
+      httpRequest      : funcCallOptions.httpRequest,
+    };
+    celery.putTask('Main.FuncRunner', null, taskKwargs, taskOptions, function(err) {
+      if (err) locals.logger.logError(err);
+    });
   });
 };
 
@@ -700,28 +785,7 @@ function _callFuncRunner(locals, funcCallOptions, callback) {
     if (err) return callback(err);
 
     // 处理队列别名
-    if (toolkit.isNullOrUndefined(funcCallOptions.queue)) {
-      funcCallOptions.queue = _getTaskDefaultQueue(funcCallOptions.execMode);
-
-    } else {
-      var queueNumber = parseInt(funcCallOptions.queue);
-      if (!isNaN(queueNumber) && queueNumber >= 0 && queueNumber < CONFIG._WORKER_QUEUE_COUNT) {
-        // 直接指定队列编号
-
-      } else {
-        // 指定队列别名
-        var queueNumber = parseInt(CONFIG.WORKER_QUEUE_ALIAS_MAP[funcCallOptions.queue]);
-        if (isNaN(queueNumber) || queueNumber < 0 || queueNumber >= CONFIG._WORKER_QUEUE_COUNT) {
-          // 配置错误，无法解析为队列编号，或队列编号超过范围，使用默认函数队列。
-          // 保证无论如何都有Worker负责执行（实际运行会报错）
-          funcCallOptions.queue = _getTaskDefaultQueue(funcCallOptions.execMode);
-
-        } else {
-          // 队列别名转换为队列编号
-          funcCallOptions.queue = queueNumber;
-        }
-      }
-    }
+    funcCallOptions.queue = _resolveTaskQueue(funcCallOptions.queue, funcCallOptions.execMode);
 
     var celery = celeryHelper.createHelper(locals.logger);
 
@@ -758,6 +822,7 @@ function _callFuncRunner(locals, funcCallOptions, callback) {
       originId         : funcCallOptions.originId,
       execMode         : funcCallOptions.execMode,
       saveResult       : funcCallOptions.saveResult,
+      returnType       : funcCallOptions.returnType,
       triggerTime      : funcCallOptions.triggerTime,
       triggerTimeMs    : funcCallOptions.triggerTimeMs,
       queue            : funcCallOptions.queue,
@@ -1063,9 +1128,24 @@ function _doAPIResponse(locals, res, ret, options, callback) {
     // 响应控制（下载文件）
     var filePath = path.join(CONFIG.RESOURCE_ROOT_PATH, responseControl.filePath.replace(/^\/+/, ''));
 
-    fs.readFile(filePath, function(err, buffer) {
+    // 存在压缩文件且客户端支持gzip时，直接返回压缩文件
+    var gzipFilePath = null;
+    if (responseControl.gzipFilePath) {
+      gzipFilePath = path.join(CONFIG.RESOURCE_ROOT_PATH, responseControl.gzipFilePath.replace(/^\/+/, ''));
+    }
+    var useGzip = !!gzipFilePath && responseControl.downloadFile === false && !!res.req.acceptsEncodings('gzip');
+
+    fs.readFile(useGzip ? gzipFilePath : filePath, function(err, buffer) {
       if (err) return callback(err);
 
+      // 响应内容随客户端是否支持gzip变化，需要告知缓存
+      if (gzipFilePath && responseControl.downloadFile === false) {
+        res.vary('Accept-Encoding');
+      }
+      if (useGzip) {
+        res.set('Content-Encoding', 'gzip');
+      }
+
       // 默认与源文件名相同
       var fileName = filePath.split('/').pop();
       if ('string' === typeof responseControl.downloadFile) {
@@ -1083,6 +1163,10 @@ function _doAPIResponse(locals, res, ret, options, callback) {
 
       if (responseControl.autoDeleteFile) {
         fs.remove(filePath);
+
+        if (gzipFilePath) {
+          fs.remove(gzipFilePath);
+        }
       }
 
       return;
@@ -2002,6 +2086,160 @@ exports.callFuncDraft = function(req, res, next) {
   });
 };
 
+function _reduceFuncMapItemResult(item, returnType) {
+  if (!item.result) return;
+
+  delete item.result._responseControl;
+  if (returnType !== 'ALL') {
+    item.result = item.result[returnType] || null;
+  }
+};
+
+exports.callFuncMap = function(req, res, next) {
+  var funcId             = req.params.funcId;
+  var funcCallKwargsList = req.body.kwargsList;
+
+  if (funcCallKwargsList.length > CONFIG._FUNC_TASK_MAP_MAX_KWARGS_COUNT) {
+    return next(new E('EClientBadRequest', 'Invalid kwargsList, too many kwargs', { max: CONFIG._FUNC_TASK_MAP_MAX_KWARGS_COUNT }));
+  }
+
+  var func = null;
+  var funcCallOptions = null;
+  async.series([
+    // 获取函数
+    function(asyncCallback) {
+      _getFuncById(res.locals, funcId, function(err, _func) {
+        if (err) return asyncCallback(err);
+
+        func = _func;
+
+        return asyncCallback();
+      });
+    },
+    // 创建函数调用选项
+    function(asyncCallback) {
+      _createFuncCallOptionsFromRequest(req, res, func, function(err, _funcCallOptions) {
+        if (err) return asyncCallback(err);
+
+        funcCallOptions = _funcCallOptions;
+
+        if (funcCallOptions.execMode !== 'sync') {
+          return asyncCallback(new E('EClientBadRequest', 'Invalid options, execMode should be "sync" in Func Map calling'));
+        }
+
+        return asyncCallback();
+      });
+    },
+  ], function(err) {
+    if (err) return next(err);
+
+    var celery = celeryHelper.createHelper(res.locals.logger);
+
+    var name  = 'Main.FuncMapRunner';
+    var queue = _resolveTaskQueue(funcCallOptions.queue, funcCallOptions.execMode);
+
+    var taskOptions = {
+      id               : toolkit.genDataId('task'),
+      queue            : queue,
+      resultWaitTimeout: funcCallOptions.apiTimeout * 1000,
+      softTimeLimit    : funcCallOptions.timeout,
+      timeLimit        : funcCallOptions.timeout + CONFIG._FUNC_TASK_EXTRA_TIMEOUT_TO_KILL,
+    };
+    var taskKwargs = {
+      funcId            : funcCallOptions.funcId,
+      funcCallKwargsList: funcCallKwargsList,
+      origin            : funcCallOptions.origin,
+      originId          : res.locals.traceId,
+      execMode          : funcCallOptions.execMode,
+      returnType        : funcCallOptions.returnType,
+      streamResult      : toolkit.toBoolean(funcCallOptions.streamResult),
+      triggerTime       : funcCallOptions.triggerTime,
+      triggerTimeMs     : funcCallOptions.triggerTimeMs,
+      queue             : queue,
+      httpRequest       : funcCallOptions.httpRequest,
+    };
+
+    var onResultCallback = function(err, celeryRes, extraInfo) {
+      if (err) return next(err);
+
+      celeryRes = celeryRes || {};
+      extraInfo = extraInfo || {};
+
+      // 无法通过JSON.parse解析
+      if ('string' === typeof celeryRes) {
+        return next(new E('EFuncResultParsingFailed', 'Func result is not standard JSON'));
+      }
+
+      if (celeryRes.status === 'FAILURE') {
+        // 正式调用发生错误只返回堆栈错误信息最后一行
+        var einfoTEXT = celeryRes.einfoTEXT.trim().split('\n').pop().trim();
+
+        if (celeryRes.einfoTEXT.indexOf('billiard.exceptions.SoftTimeLimitExceeded') >= 0) {
+          // 超时错误
+          return next(new E('EFuncTimeout', 'Calling Function timeout', {
+            id       : celeryRes.id,
+            etype    : celeryRes.result && celeryRes.result.exc_type,
+            einfoTEXT: einfoTEXT,
+          }));
+
+        } else {
+          // 其他错误
+          return next(new E('EFuncFailed', 'Calling Function failed', {
+            id       : celeryRes.id,
+            etype    : celeryRes.result && celeryRes.result.exc_type,
+            einfoTEXT: einfoTEXT,
+          }));
+        }
+
+      } else if (extraInfo.status === 'TIMEOUT') {
+        // API等待超时
+        return next(new E('EAPITimeout', 'Waiting Func result timeout, but task is still running', {
+          id: extraInfo.id,
+        }));
+      }
+
+      var retval = celeryRes.retval || {};
+
+      // 流式输出结果时，执行结果通过任务ID获取
+      if (retval.resultKey) {
+        delete retval.resultKey;
+        retval.taskId = taskOptions.id;
+      }
+
+      // 各组参数的执行结果只返回指定的返回类型
+      (retval.items || []).forEach(function(item) {
+        _reduceFuncMapItemResult(item, funcCallOptions.returnType);
+      });
+
+      var ret = toolkit.initRet(retval);
+      return res.locals.sendJSON(ret);
+    };
+
+    celery.putTask(name, null, taskKwargs, taskOptions, null, onResultCallback);
+  });
+};
+
+exports.getFuncMapResult = function(req, res, next) {
+  var taskId     = req.query.taskId;
+  var returnType = req.query.returnType || 'raw';
+  var offset     = parseInt(req.query.offset) || 0;
+  var limit      = parseInt(req.query.limit)  || 100;
+
+  var cacheKey = toolkit.getWorkerCacheKey('cache', 'funcMapResult', [ 'taskId', taskId ]);
+  res.locals.cacheDB.lrange(cacheKey, offset, offset + limit - 1, function(err, cacheRes) {
+    if (err) return next(err);
+
+    var items = (cacheRes || []).map(function(x) {
+      var item = JSON.parse(x);
+      _reduceFuncMapItemResult(item, returnType);
+      return item;
+    });
+
+    var ret = toolkit.initRet(items);
+    return res.locals.sendJSON(ret);
+  });
+};
+
 exports.getFuncResult = function(req, res, next) {
   var taskId     = req.query.taskId;
   var returnType = req.query.returnType || 'raw';
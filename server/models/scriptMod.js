@@ -153,7 +153,19 @@ EntityModel.prototype.modify = function(id, data, callback) {
     }
   }
 
-  return this._modify(id, data, callback);
+  var self = this;
+
+  self._modify(id, data, function(err) {
+    if (err) return callback(err);
+
+    // 发布代码时记录脚本变更
+    if ('undefined' === typeof data.code) return callback(null, id, data);
+
+    self.logChange(id, function(err) {
+      if (err) return callback(err);
+      return callback(null, id, data);
+    });
+  });
 };
 
 EntityModel.prototype.delete = function(id, callback) {
@@ -186,6 +198,10 @@ EntityModel.prototype.delete = function(id, callback) {
         self.db.query(sql, sqlParams, eachCallback);
       }, asyncCallback);
     },
+    // 记录脚本变更
+    function(asyncCallback) {
+      self.logChange(id, asyncCallback);
+    },
   ], function(err) {
     transScope.end(err, function(scopeErr) {
       if (scopeErr) return callback(scopeErr);
@@ -195,6 +211,24 @@ EntityModel.prototype.delete = function(id, callback) {
   });
 };
 
+/**
+ * 记录脚本变更
+ * Worker 根据变更记录判断是否需要重新加载脚本
+ *
+ * @param {String|null} scriptId 脚本ID，为null时表示全部脚本
+ */
+EntityModel.prototype.logChange = function(scriptId, callback) {
+  var sql = toolkit.createStringBuilder();
+  sql.append('INSERT INTO biz_main_script_change_log');
+  sql.append('SET');
+  sql.append('  scriptId = ?');
+
+  var sqlParams = [scriptId || null];
+  this.db.query(sql, sqlParams, function(err) {
+    return callback(err);
+  });
+};
+
 function _prepareData(data) {
   data = toolkit.jsonCopy(data);
 
@@ -12,6 +12,7 @@ var CONFIG      = require('../utils/yamlResources').get('CONFIG');
 var toolkit     = require('../utils/toolkit');
 var modelHelper = require('../utils/modelHelper');
 
+var scriptMod    = require('./scriptMod');
 var scriptSetMod = require('./scriptSetMod');
 
 /* Configure */
@@ -129,6 +130,8 @@ EntityModel.prototype.add = function(data, callback) {
 EntityModel.prototype.recover = function(id, data, callback) {
   var self = this;
 
+  var scriptModel = scriptMod.createModel(self.locals);
+
   var scriptRecoverPoint = null;
 
   var transScope = modelHelper.createTransScope(self.db);
@@ -197,6 +200,10 @@ EntityModel.prototype.recover = function(id, data, callback) {
         ], eachCallback);
       }, asyncCallback);
     },
+    // 记录脚本变更
+    function(asyncCallback) {
+      scriptModel.logChange(null, asyncCallback);
+    },
   ], function(err) {
     transScope.end(err, function(scopeErr) {
       if (scopeErr) return callback(scopeErr);
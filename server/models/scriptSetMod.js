@@ -13,6 +13,7 @@ var CONFIG      = require('../utils/yamlResources').get('CONFIG');
 var toolkit     = require('../utils/toolkit');
 var modelHelper = require('../utils/modelHelper');
 
+var scriptMod                 = require('./scriptMod');
 var scriptRecoverPointMod     = require('./scriptRecoverPointMod');
 var scriptSetExportHistoryMod = require('./scriptSetExportHistoryMod');
 var scriptSetImportHistoryMod = require('./scriptSetImportHistoryMod');
@@ -65,6 +66,8 @@ EntityModel.prototype.list = function(options, callback) {
 EntityModel.prototype.delete = function(id, callback) {
   var self = this;
 
+  var scriptModel = scriptMod.createModel(self.locals);
+
   var transScope = modelHelper.createTransScope(self.db);
   async.series([
     function(asyncCallback) {
@@ -90,6 +93,10 @@ EntityModel.prototype.delete = function(id, callback) {
         self.db.query(sql, sqlParams, eachCallback);
       }, asyncCallback);
     },
+    // 记录脚本变更
+    function(asyncCallback) {
+      scriptModel.logChange(null, asyncCallback);
+    },
   ], function(err) {
     transScope.end(err, function(scopeErr) {
       if (scopeErr) return callback(scopeErr);
@@ -102,6 +109,8 @@ EntityModel.prototype.delete = function(id, callback) {
 EntityModel.prototype.clone = function(id, newId, callback) {
   var self = this;
 
+  var scriptModel = scriptMod.createModel(self.locals);
+
   var transScope = modelHelper.createTransScope(self.db);
   async.series([
     function(asyncCallback) {
@@ -287,6 +296,10 @@ EntityModel.prototype.clone = function(id, newId, callback) {
         self.db.query(sql, sqlParams, asyncCallback);
       });
     },
+    // 记录脚本变更
+    function(asyncCallback) {
+      scriptModel.logChange(null, asyncCallback);
+    },
   ], function(err) {
     transScope.end(err, function(scopeErr) {
       if (scopeErr) return callback(scopeErr);
@@ -683,6 +696,7 @@ EntityModel.prototype.import = function(packageData, recoverData, callback) {
     packageData = JSON.parse(packageData);
   }
 
+  var scriptModel                 = scriptMod.createModel(self.locals);
   var scriptRecoverPointModel     = scriptRecoverPointMod.createModel(self.locals);
   var scriptSetImportHistoryModel = scriptSetImportHistoryMod.createModel(self.locals);
 
@@ -884,6 +898,10 @@ EntityModel.prototype.import = function(packageData, recoverData, callback) {
       }
       scriptSetImportHistoryModel.add(_data, asyncCallback);
     },
+    // 记录脚本变更
+    function(asyncCallback) {
+      scriptModel.logChange(null, asyncCallback);
+    },
   ], function(err) {
     transScope.end(err, function(scopeErr) {
       if (scopeErr) return callback(scopeErr);
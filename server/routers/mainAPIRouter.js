@@ -59,6 +59,16 @@ routeLoader.load(ROUTE.mainAPI.callFuncDraft, [
   mainAPICtrl.callFuncDraft,
 ]);
 
+// 使用多组参数调用函数
+routeLoader.load(ROUTE.mainAPI.callFuncMap, [
+  mainAPICtrl.callFuncMap,
+]);
+
+// 获取多组参数调用结果
+routeLoader.load(ROUTE.mainAPI.getFuncMapResult, [
+  mainAPICtrl.getFuncMapResult,
+]);
+
 // 获取函数结果
 routeLoader.load(ROUTE.mainAPI.getFuncResult, [
   mainAPICtrl.getFuncResult,
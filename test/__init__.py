@@ -237,6 +237,21 @@ class BaseTestSuit(object):
         cls.PRE_FUNC_ID       = None
         cls.PRE_SCRIPT_CODE   = None
 
+    def wait_sync_cache(self, url, query, check, timeout=90):
+        # 同步缓存任务每分钟执行一次
+        data = None
+        for i in range(timeout // 5):
+            status_code, resp = self.API.get(url, query=query)
+            assert status_code == 200, AssertDesc.bad_resp(resp)
+
+            data = resp['data']
+            if check(data):
+                break
+
+            time.sleep(5)
+
+        return data
+
     def do_test_add(self, data, field_check_ignore=None):
         # 测试接口
         body = { 'data': data }
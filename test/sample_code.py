@@ -40,6 +40,156 @@ def test_func_large_data_with_cache(with_datetime_field=False):
     data = gen_large_data(with_datetime_field)
     return DFF.RESP_LARGE_DATA(data)
 
+@DFF.API('大型数据-非列表数据')
+def test_func_large_data_scalar(value_type):
+    if value_type == 'int':
+        return DFF.RESP_LARGE_DATA(123)
+    elif value_type == 'none':
+        return DFF.RESP_LARGE_DATA(None)
+    else:
+        return DFF.RESP_LARGE_DATA({ 'id': i } for i in range(3))
+
 @DFF.API('认证函数')
 def test_func_auth(req):
     return req['headers']['x-my-token'] == '<TOKEN>'
+
+PROCESS_FACTOR = 1
+
+def _process_square(x):
+    return x * x * PROCESS_FACTOR
+
+@DFF.API('多进程', queue='cpu')
+def test_func_process(n=5):
+    return DFF.PROCESS.map(_process_square, range(int(n)))
+
+@DFF.API('多进程-非指定队列')
+def test_func_process_wrong_queue(n=5):
+    try:
+        DFF.PROCESS.map(_process_square, range(int(n)))
+    except Exception as e:
+        return e.__class__.__name__
+
+@DFF.API('Worker并发数')
+def test_func_worker_concurrency():
+    from worker.celeryconfig import get_worker_concurrency
+    return {
+        'auto'  : get_worker_concurrency('auto'),
+        'number': get_worker_concurrency('4'),
+    }
+
+@DFF.API('多线程')
+def test_func_thread_map(n=5):
+    return DFF.THREAD.map(lambda x: x * x, range(int(n)))
+
+@DFF.API('多线程超时')
+def test_func_thread_map_timeout(n=20):
+    executed = []
+    def _slow(x):
+        executed.append(x)
+        time.sleep(0.5)
+
+    timeout_error = None
+    try:
+        DFF.THREAD.map(_slow, range(int(n)), timeout=0.2)
+    except Exception as e:
+        timeout_error = e.__class__.__name__
+
+    # 等待已开始的调用结束，超时后未开始的调用应当已被取消
+    time.sleep(1.5)
+    return { 'timeoutError': timeout_error, 'executedCount': len(executed) }
+
+@DFF.API('多线程汇总超时')
+def test_func_thread_gather_timeout(n=20):
+    executed = []
+    def _slow(x):
+        executed.append(x)
+        time.sleep(0.5)
+
+    for x in range(int(n)):
+        DFF.THREAD.start(_slow, args=[x])
+
+    timeout_error = None
+    try:
+        DFF.THREAD.gather(timeout=0.2)
+    except Exception as e:
+        timeout_error = e.__class__.__name__
+
+    # 等待已开始的调用结束，超时后未开始的调用应当已被取消
+    time.sleep(1.5)
+    return { 'timeoutError': timeout_error, 'executedCount': len(executed) }
+
+@DFF.API('结果缓存合并调用', cache_result=30)
+def test_func_single_flight(key=None):
+    time.sleep(1)
+    return random.random()
+
+@DFF.API('结果缓存过期后使用旧结果', cache_result=2, cache_result_stale=30)
+def test_func_stale_cache(key=None):
+    return random.random()
+
+@DFF.API('被调用函数超时', timeout=1)
+def test_func_slow_callee(seconds=3):
+    time.sleep(seconds)
+    return 'done'
+
+@DFF.API('同步调用函数')
+def test_func_call_wait(x, y):
+    func_id = _DFF_SCRIPT_ID + '.test_func'
+    return DFF.FUNC(func_id, { 'x': x, 'y': y }, wait=True).result()
+
+@DFF.API('同步调用函数超时')
+def test_func_call_wait_timeout():
+    func_id = _DFF_SCRIPT_ID + '.test_func_slow_callee'
+    try:
+        DFF.FUNC(func_id, { 'seconds': 3 }, wait=True).result()
+    except Exception as e:
+        return e.__class__.__name__
+
+@DFF.API('使用多组参数调用函数')
+def test_func_call_map():
+    func_id = _DFF_SCRIPT_ID + '.test_func'
+    return DFF.FUNC_MAP(func_id, [ { 'x': i, 'y': i } for i in range(3) ])
+
+@DFF.API('输出日志及报错')
+def test_func_log_and_fail(marker, fail=False):
+    print(marker)
+    if fail:
+        raise Exception(marker)
+
+    return marker
+
+@DFF.API('多组参数调用-单组报错')
+def test_func_map_item(n):
+    n = int(n)
+    if n % 2 == 1:
+        raise Exception('Odd number: {}'.format(n))
+
+    return n * 10
+
+@DFF.API('多组参数调用-运行信息')
+def test_func_map_running_info(n):
+    n = int(n)
+    if n % 2 == 1:
+        raise Exception('Odd number: {}'.format(n))
+
+    return n
+
+@DFF.API('获取函数运行信息')
+def test_func_get_running_info(func_id):
+    from worker.utils.log_helper import LogHelper
+    from worker.utils.extra_helpers import MySQLHelper
+
+    db = MySQLHelper(LogHelper())
+    sql = '''
+        SELECT
+             SUM(succeedCount) AS succeedCount
+            ,SUM(failCount)    AS failCount
+        FROM biz_rel_func_running_info
+        WHERE
+            funcId = ?
+        '''
+    db_res = db.query(sql, [ func_id ])[0]
+    return {
+        'succeedCount': int(db_res['succeedCount'] or 0),
+        'failCount'   : int(db_res['failCount']    or 0),
+    }
@@ -61,5 +61,23 @@ class TestSuitBatch(BaseTestSuit):
     #----------------------#
 
     def test_call(self):
-        # TODO
-        pass
+        data = {
+            'funcId': self.get_pre_func_id('test_func'),
+            'funcCallKwargsJSON': { 'x': 1, 'y': 2 },
+        }
+        batch_id = self.do_test_add(data)
+
+        call_count = 5
+        for i in range(call_count):
+            params = { 'id': batch_id }
+            body   = { 'kwargs': {} }
+            status_code, resp = self.API.post('/api/v1/bat/:id', params=params, body=body)
+            assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        # 任务信息按入队顺序批量同步，最终状态均为成功
+        def _check(data):
+            return len(data) == call_count and all(d['status'] == 'success' for d in data)
+
+        data = self.wait_sync_cache('/api/v1/batch-task-info/do/list', { 'batchId': batch_id }, _check)
+        assert len(data) == call_count,                      AssertDesc.bad_count()
+        assert all(d['status'] == 'success' for d in data), AssertDesc.bad_value()
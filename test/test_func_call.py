@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from . import BaseTestSuit, AssertDesc, gen_test_id
+
+class TestSuitFuncCall(BaseTestSuit):
+    def setup_class(self):
+        self.prepare_func()
+
+    def teardown_class(self):
+        self.do_teardown_class()
+
+    def call_func(self, func_name, kwargs=None):
+        params = { 'funcId': self.get_pre_func_id(func_name) }
+        body   = { 'kwargs': kwargs or {} }
+        return self.API.post('/api/v1/func/:funcId', params=params, body=body)
+
+    def republish(self, code):
+        params = { 'id': self.PRE_SCRIPT_ID }
+        body   = { 'data': { 'codeDraft': code } }
+        status_code, resp = self.API.post('/api/v1/scripts/:id/do/modify', params=params, body=body)
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        body = { 'force': True, 'wait': True }
+        status_code, resp = self.API.post('/api/v1/scripts/:id/do/publish', params=params, body=body)
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+    def test_process_after_republish(self):
+        # 首次调用
+        status_code, resp = self.call_func('test_func_process', { 'n': 5 })
+        assert status_code == 200,                           AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == [0, 1, 4, 9, 16], AssertDesc.bad_value()
+
+        # 修改代码重新发布后，进程池中需要使用新代码
+        code = self.PRE_SCRIPT_CODE.replace('PROCESS_FACTOR = 1', 'PROCESS_FACTOR = 2')
+        self.republish(code)
+
+        status_code, resp = self.call_func('test_func_process', { 'n': 5 })
+        assert status_code == 200,                            AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == [0, 2, 8, 18, 32], AssertDesc.bad_value()
+
+        # 恢复代码
+        self.republish(self.PRE_SCRIPT_CODE)
+
+    def test_process_wrong_queue(self):
+        # 非指定队列中拒绝使用进程池
+        status_code, resp = self.call_func('test_func_process_wrong_queue', { 'n': 5 })
+        assert status_code == 200,                             AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 'NotSupportException', AssertDesc.bad_value()
+
+    def test_worker_concurrency_auto(self):
+        # 进程池大小依赖Worker并发数，"auto"需要解析为数字
+        status_code, resp = self.call_func('test_func_worker_concurrency')
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        result = resp['data']['result']
+        assert isinstance(result['auto'], int), AssertDesc.bad_value()
+        assert 3 <= result['auto'] <= 10,       AssertDesc.bad_value()
+        assert result['number'] == 4,           AssertDesc.bad_value()
+
+    def test_thread_map(self):
+        status_code, resp = self.call_func('test_func_thread_map', { 'n': 5 })
+        assert status_code == 200,                           AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == [0, 1, 4, 9, 16], AssertDesc.bad_value()
+
+    def test_thread_map_timeout(self):
+        status_code, resp = self.call_func('test_func_thread_map_timeout', { 'n': 20 })
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        result = resp['data']['result']
+        assert result['timeoutError'] == 'TimeoutError', AssertDesc.bad_value()
+        assert result['executedCount'] < 20,              AssertDesc.bad_value()
+
+    def test_thread_gather_timeout(self):
+        status_code, resp = self.call_func('test_func_thread_gather_timeout', { 'n': 20 })
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        result = resp['data']['result']
+        assert result['timeoutError'] == 'TimeoutError', AssertDesc.bad_value()
+        assert result['executedCount'] < 20,              AssertDesc.bad_value()
+
+    def test_result_cache_single_flight(self):
+        key = gen_test_id()
+
+        # 相同的并发调用只执行一次
+        with ThreadPoolExecutor(5) as pool:
+            futures = [ pool.submit(self.call_func, 'test_func_single_flight', { 'key': key }) for _ in range(5) ]
+            results = []
+            for f in futures:
+                status_code, resp = f.result()
+                assert status_code == 200, AssertDesc.bad_resp(resp)
+
+                results.append(resp['data']['result'])
+
+        assert len(set(results)) == 1, AssertDesc.bad_value()
+
+    def test_result_cache_stale(self):
+        key = gen_test_id()
+
+        status_code, resp = self.call_func('test_func_stale_cache', { 'key': key })
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        first_result = resp['data']['result']
+
+        # 结果过期后，仍然返回旧结果，同时在后台刷新
+        time.sleep(3)
+
+        status_code, resp = self.call_func('test_func_stale_cache', { 'key': key })
+        assert status_code == 200,                    AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == first_result, AssertDesc.bad_value()
+
+        # 刷新后返回新结果
+        time.sleep(1)
+
+        status_code, resp = self.call_func('test_func_stale_cache', { 'key': key })
+        assert status_code == 200,                    AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] != first_result, AssertDesc.bad_value()
+
+    def test_call_func_wait(self):
+        status_code, resp = self.call_func('test_func_call_wait', { 'x': 1, 'y': 2 })
+        assert status_code == 200,            AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 3.0, AssertDesc.bad_value()
+
+    def test_call_func_wait_timeout(self):
+        # 在当前进程中执行时，同样遵守被调用函数的超时配置
+        status_code, resp = self.call_func('test_func_call_wait_timeout')
+        assert status_code == 200,                       AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 'TimeoutError', AssertDesc.bad_value()
+
+    def test_call_func_map(self):
+        status_code, resp = self.call_func('test_func_call_map')
+        assert status_code == 200,                        AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == [0.0, 2.0, 4.0], AssertDesc.bad_value()
+
+    def test_func_map(self):
+        params = { 'funcId': self.get_pre_func_id('test_func') }
+        body   = { 'kwargsList': [ { 'x': 1, 'y': 2 }, { 'x': 'a', 'y': 2 }, { 'x': 3, 'y': 4 } ] }
+        status_code, resp = self.API.post('/api/v1/func-map/:funcId', params=params, body=body)
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        data = resp['data']
+        assert data['succeedCount'] == 2, AssertDesc.bad_count()
+        assert data['failCount']    == 1, AssertDesc.bad_count()
+
+        # 单组参数执行失败不影响其他参数执行
+        items = data['items']
+        assert [ item['index'] for item in items ] == [0, 1, 2], AssertDesc.bad_value()
+        assert items[0]['result'] == 3.0,                        AssertDesc.bad_value()
+        assert items[1]['isFailed'] is True,                     AssertDesc.bad_value()
+        assert items[1]['error'].startswith('ValueError'),       AssertDesc.bad_value()
+        assert items[2]['result'] == 7.0,                        AssertDesc.bad_value()
+
+    def call_func_map(self, func_name, kwargs_list, options=None):
+        params = { 'funcId': self.get_pre_func_id(func_name) }
+        body   = { 'kwargsList': kwargs_list, 'options': options or {} }
+        return self.API.post('/api/v1/func-map/:funcId', params=params, body=body)
+
+    def test_func_map_item_errors(self):
+        status_code, resp = self.call_func_map('test_func_map_item', [ { 'n': i } for i in range(5) ])
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        data = resp['data']
+        assert data['succeedCount'] == 3, AssertDesc.bad_count()
+        assert data['failCount']    == 2, AssertDesc.bad_count()
+
+        # 报错的参数组只返回错误信息，其他参数组正常返回
+        for i, item in enumerate(data['items']):
+            assert item['index'] == i, AssertDesc.bad_value()
+            if i % 2 == 1:
+                assert item['isFailed'] is True,                       AssertDesc.bad_value()
+                assert item['error'] == f"Exception: Odd number: {i}", AssertDesc.bad_value()
+                assert 'result' not in item,                           AssertDesc.bad_value()
+            else:
+                assert item['isFailed'] is False, AssertDesc.bad_value()
+                assert item['result'] == i * 10,  AssertDesc.bad_value()
+
+    def test_func_map_stream_result(self):
+        kwargs_list = [ { 'n': i } for i in range(5) ]
+        status_code, resp = self.call_func_map('test_func_map_item', kwargs_list, { 'streamResult': True })
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        # 流式输出时只返回汇总及任务ID
+        data = resp['data']
+        assert data['succeedCount'] == 3, AssertDesc.bad_count()
+        assert data['failCount']    == 2, AssertDesc.bad_count()
+        assert 'items' not in data,       AssertDesc.bad_value()
+        assert data.get('taskId'),        AssertDesc.bad_value()
+
+        # 分段获取执行结果
+        items = []
+        for offset in range(0, len(kwargs_list), 2):
+            query = { 'taskId': data['taskId'], 'offset': offset, 'limit': 2 }
+            status_code, resp = self.API.get('/api/v1/func-map-result', query=query)
+            assert status_code == 200, AssertDesc.bad_resp(resp)
+
+            items.extend(resp['data'])
+
+        assert [ item['index'] for item in items ] == [0, 1, 2, 3, 4], AssertDesc.bad_value()
+        assert [ item['isFailed'] for item in items ] == [False, True, False, True, False], AssertDesc.bad_value()
+        assert items[4]['result'] == 40, AssertDesc.bad_value()
+
+    def test_func_map_running_info(self):
+        func_id = self.get_pre_func_id('test_func_map_running_info')
+
+        def _get_running_info():
+            status_code, resp = self.call_func('test_func_get_running_info', { 'func_id': func_id })
+            assert status_code == 200, AssertDesc.bad_resp(resp)
+            return resp['data']['result']
+
+        prev_running_info = _get_running_info()
+
+        status_code, resp = self.call_func_map('test_func_map_running_info', [ { 'n': i } for i in range(4) ])
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        # 各组参数的执行次数汇总后写入运行信息（进程内汇总、定期写入Redis、每分钟同步至数据库）
+        running_info = None
+        for i in range(90 // 5):
+            running_info = _get_running_info()
+            if running_info['succeedCount'] - prev_running_info['succeedCount'] >= 2:
+                break
+
+            time.sleep(5)
+
+        assert running_info['succeedCount'] - prev_running_info['succeedCount'] == 2, AssertDesc.bad_count()
+        assert running_info['failCount']    - prev_running_info['failCount']    == 2, AssertDesc.bad_count()
+
+    def test_func_map_too_many_kwargs(self):
+        params = { 'funcId': self.get_pre_func_id('test_func') }
+        body   = { 'kwargsList': [ { 'x': i, 'y': i } for i in range(1001) ] }
+        status_code, resp = self.API.post('/api/v1/func-map/:funcId', params=params, body=body)
+        assert status_code == 400, AssertDesc.bad_resp(resp)
+
+    def test_reload_after_republish(self):
+        status_code, resp = self.call_func('test_func', { 'x': 1, 'y': 2 })
+        assert status_code == 200,            AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 3.0, AssertDesc.bad_value()
+
+        # 重新发布后，使用新代码执行
+        code = self.PRE_SCRIPT_CODE.replace('return float(x) + float(y)', 'return float(x) + float(y) + 100')
+        self.republish(code)
+
+        status_code, resp = self.call_func('test_func', { 'x': 1, 'y': 2 })
+        assert status_code == 200,              AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 103.0, AssertDesc.bad_value()
+
+        # 恢复代码
+        self.republish(self.PRE_SCRIPT_CODE)
+
+        status_code, resp = self.call_func('test_func', { 'x': 1, 'y': 2 })
+        assert status_code == 200,            AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 3.0, AssertDesc.bad_value()
+
+    def test_func_registry_after_republish(self):
+        # 重新发布后，新增的函数可以调用
+        code = self.PRE_SCRIPT_CODE + '''
+@DFF.API('新增函数')
+def test_func_added():
+    return 'added'
+'''
+        self.republish(code)
+
+        status_code, resp = self.call_func('test_func_added')
+        assert status_code == 200,                AssertDesc.bad_resp(resp)
+        assert resp['data']['result'] == 'added', AssertDesc.bad_value()
+
+        # 恢复代码后，删除的函数不可再调用
+        self.republish(self.PRE_SCRIPT_CODE)
+
+        status_code, resp = self.call_func('test_func_added')
+        assert status_code != 200, AssertDesc.bad_resp(resp)
+
+    def test_sync_script_log_and_failure(self):
+        status_code, resp = self.API.get('/api/v1/func-system-config')
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+
+        system_config = resp['data']
+        if not system_config['_INTERNAL_KEEP_SCRIPT_LOG'] or not system_config['_INTERNAL_KEEP_SCRIPT_FAILURE']:
+            pytest.skip(f"Script log / failure is not kept")
+
+        func_id = self.get_pre_func_id('test_func_log_and_fail')
+        markers = [ gen_test_id() for i in range(3) ]
+        for marker in markers:
+            self.call_func('test_func_log_and_fail', { 'marker': marker, 'fail': True })
+
+        # 日志、故障均批量写入数据库
+        def _check_logs(data):
+            message_text = '\n'.join([ d['messageTEXT'] for d in data ])
+            return all(m in message_text for m in markers)
+
+        data = self.wait_sync_cache('/api/v1/script-logs/do/list', { 'funcId': func_id }, _check_logs)
+        assert _check_logs(data), AssertDesc.bad_count()
+
+        def _check_failures(data):
+            einfo_text = '\n'.join([ d['einfoTEXT'] for d in data ])
+            return all(m in einfo_text for m in markers)
+
+        data = self.wait_sync_cache('/api/v1/script-failures/do/list', { 'funcId': func_id }, _check_failures)
+        assert _check_failures(data), AssertDesc.bad_count()
+
+    @pytest.mark.parametrize('value_type, expected', [
+        ('int',       123),
+        ('none',      None),
+        ('generator', [ { 'id': 0 }, { 'id': 1 }, { 'id': 2 } ]),
+    ])
+    def test_large_data_scalar(self, value_type, expected):
+        status_code, resp = self.call_func('test_func_large_data_scalar', { 'value_type': value_type })
+        assert status_code == 200, AssertDesc.bad_resp(resp)
+        assert resp == expected,   AssertDesc.bad_value()
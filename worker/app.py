@@ -36,7 +36,7 @@ CHILD_PROCESS_MAP = {} # PID -> Process
 MONITOR_HEARTBEAT_TIMESTAMP       = 0
 MONITOR_SYS_STATS_CHECK_TIMESTAMP = 0
 
-from worker.app_init import before_app_create, after_app_created
+from worker.app_init import before_app_create, after_app_created, before_worker_start
 
 # Disable InsecureRequestWarning
 import requests
@@ -161,6 +161,10 @@ def heartbeat():
             cache_key = toolkit.get_server_cache_key('monitor', 'sysStats', ['metric', 'workerMemoryPSS', 'hostname', hostname]);
             REDIS_HELPER.ts_add(cache_key, total_memory_pss, timestamp=current_timestamp)
 
+@signals.worker_init.connect
+def on_worker_init(*args, **kwargs):
+    before_worker_start(app)
+
 @signals.worker_ready.connect
 def on_worker_ready(*args, **kwargs):
     after_app_created(app)
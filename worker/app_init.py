@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
 # Builtin Modules
+import gc
+import traceback
 
 # 3rd-party Modules
+import psutil
 
 # Project Modules
 from worker.utils import toolkit, yaml_resources
@@ -44,3 +47,34 @@ def after_app_created(celery_app):
     reload_scripts.apply_async(kwargs={'isOnLaunch': True, 'force': True}, countdown=10)
     auto_run.apply_async(countdown=10)
     auto_clean.apply_async(countdown=30)
+
+def before_worker_start(celery_app):
+    if not CONFIG['_WORKER_PRELOAD_SCRIPTS']:
+        return
+
+    from worker.utils.log_helper import LogHelper
+    from worker.tasks.main.func_runner import func_runner
+
+    logger = LogHelper()
+
+    main_process = psutil.Process()
+    memory_pss_before = main_process.memory_full_info().pss
+
+    # 主进程预加载脚本，子进程Fork后以写时复制方式共享
+    try:
+        func_runner.preload_script_dict_cache()
+
+    except Exception as e:
+        logger.error('Preload scripts failed: {}'.format(e))
+        for line in traceback.format_exc().splitlines():
+            logger.error(line)
+
+    else:
+        # 冻结当前所有对象，避免GC修改对象头导致共享内存页被复制
+        gc.freeze()
+
+        # 记录预加载前后主进程内存PSS，用于对比子进程共享效果
+        memory_pss_after = main_process.memory_full_info().pss
+        logger.info('Preload scripts: main process memory PSS {} MB -> {} MB'.format(
+            round(memory_pss_before / 1024 / 1024, 2),
+            round(memory_pss_after  / 1024 / 1024, 2)))
@@ -18,24 +18,34 @@ CONFIG = yaml_resources.get('CONFIG')
 def create_queue(queue_name):
     return Queue(queue_name, routing_key=queue_name)
 
-'''
-Some fixed Celery configs
-'''
+# Worker 并发数
+#   指定为"auto"时，根据内存大小自动决定
+def get_worker_concurrency(concurrency):
+    if concurrency != 'auto':
+        return int(concurrency)
 
-# Worker
-worker_concurrency = CONFIG['_WORKER_CONCURRENCY']
-if worker_concurrency == 'auto':
     memory_gb = math.ceil(psutil.virtual_memory().total / 1024 / 1024 / 1024)
     if memory_gb < 3:
-        worker_concurrency = 3
+        return 3
     elif memory_gb > 10:
-        worker_concurrency = 10
+        return 10
     else:
-        worker_concurrency = memory_gb
+        return memory_gb
+
+'''
+Some fixed Celery configs
+'''
+
+# Worker
+worker_concurrency = get_worker_concurrency(CONFIG['_WORKER_CONCURRENCY'])
 
 worker_prefetch_multiplier = CONFIG['_WORKER_PREFETCH_MULTIPLIER']
 worker_max_tasks_per_child = CONFIG['_WORKER_MAX_TASKS_PER_CHILD']
 
+# 子进程内存超过限制（MB）时，在当前任务结束后回收
+if CONFIG['_WORKER_MAX_MEMORY_PER_CHILD']:
+    worker_max_memory_per_child = CONFIG['_WORKER_MAX_MEMORY_PER_CHILD'] * 1024
+
 # Worker log
 worker_hijack_root_logger  = False
 worker_log_color           = False
@@ -110,6 +120,13 @@ beat_schedule['run-crontab-starter'] = {
     'schedule': create_schedule(CONFIG['_CRONTAB_STARTER']),
 }
 
+# 重新加载脚本（检查脚本变更记录）
+beat_schedule['run-reload-scripts'] = {
+    'task'    : 'Main.ReloadScripts',
+    'kwargs'  : { 'isOnCrontab': True },
+    'schedule': create_schedule(CONFIG['_CRONTAB_RELOAD_SCRIPT']),
+}
+
 # 强制重新加载脚本
 beat_schedule['run-force-reload-scripts'] = {
     'task'    : 'Main.ReloadScripts',
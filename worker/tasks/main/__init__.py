@@ -3,29 +3,48 @@
 # Builtin Modules
 import os
 import sys
+import marshal
+import tempfile
 import inspect
 import traceback
 import linecache
 from types import ModuleType
+import importlib.util
 import time
 import uuid
+import signal
+import gzip
+import hashlib
+import hmac
+import itertools
 import pprint
 import importlib
 import functools
-from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import asyncio
+import threading
+import multiprocessing
+import resource
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures import wait as futures_wait, as_completed as futures_as_completed
 from collections import OrderedDict
+from collections.abc import Iterator
+from types import MappingProxyType
 
 # 3rd-party Modules
 import six
 import arrow
+from celery.exceptions import SoftTimeLimitExceeded
 import pylru
 import requests
 from croniter import croniter
 import funcsigs
+import psutil
 
 # Project Modules
 from worker import app
-from worker.tasks import BaseTask, BaseResultSavingTask, gen_task_id
+from worker.tasks import BaseTask, BaseResultSavingTask, gen_task_id, CELERY_TASK_KEY_PREFIX
 from worker.utils import yaml_resources, toolkit
 from worker.utils.extra_helpers import DataWayHelper, DataKitHelper, SidecarHelper
 from worker.utils.extra_helpers import InfluxDBHelper, MySQLHelper, RedisHelper, MemcachedHelper, ClickHouseHelper
@@ -35,7 +54,8 @@ from worker.utils.extra_helpers import format_sql_v2 as format_sql
 CONFIG = yaml_resources.get('CONFIG')
 ROUTE  = yaml_resources.get('ROUTE')
 
-COMPILED_CODE_LRU = pylru.lrucache(CONFIG['_FUNC_TASK_COMPILE_CACHE_MAX_SIZE'])
+COMPILED_CODE_LRU    = pylru.lrucache(CONFIG['_FUNC_TASK_COMPILE_CACHE_MAX_SIZE'])
+FUNC_DEFINATION_LRU  = pylru.lrucache(CONFIG['_FUNC_TASK_FUNC_DEFINATION_CACHE_MAX_SIZE'])
 
 FIX_INTEGRATION_KEY_MAP = {
     # 额外用于登录DataFlux Func平台的函数
@@ -95,8 +115,25 @@ DECIPHER_FIELDS = [
 
 EXCLUDE_BUILTIN_NAMES = ('import', )
 
-THREAD_POOL       = None
-THREAD_RESULT_MAP = {}
+# 安全脚本作用域模板（每个进程只创建一次，只读）
+SAFE_SCOPE_BUILTINS_TEMPLATE     = None
+SAFE_SCOPE_INJECT_FUNCS_TEMPLATE = None
+
+THREAD_POOL = None
+
+# 多进程处理模块进程池，及子进程中缓存的脚本作用域
+PROCESS_POOL           = None
+PROCESS_POOL_SCOPE_MAP = {}
+
+# 函数注册表（以函数ID为键）及对应的脚本清单MD5
+FUNC_REGISTRY             = None
+FUNC_REGISTRY_SCRIPTS_MD5 = None
+
+# 异步函数事件循环（每个进程只创建一次）
+ASYNC_LOOP = None
+
+# 当前进程（用于记录内存使用，子进程中需要重新获取）
+CURRENT_PROCESS = None
 
 # 添加额外import路径
 extra_import_paths = [
@@ -111,6 +148,10 @@ for p in extra_import_paths:
 download_temp_folder = os.path.join(CONFIG.get('RESOURCE_ROOT_PATH'), CONFIG.get('DOWNLOAD_TEMP_ROOT_FOLDER'))
 os.makedirs(download_temp_folder, exist_ok=True)
 
+# 脚本编译结果缓存
+compiled_script_folder = os.path.join(CONFIG.get('RESOURCE_ROOT_PATH'), CONFIG.get('COMPILED_SCRIPT_ROOT_FOLDER'))
+os.makedirs(compiled_script_folder, exist_ok=True)
+
 class DataFluxFuncBaseException(Exception):
     pass
 class NotFoundException(DataFluxFuncBaseException):
@@ -125,6 +166,8 @@ class AccessDenyException(DataFluxFuncBaseException):
     pass
 class FuncChainTooLongException(DataFluxFuncBaseException):
     pass
+class FuncCallFailedException(DataFluxFuncBaseException):
+    pass
 
 class DFFWraper(object):
     def __init__(self, inject_funcs=None):
@@ -191,7 +234,7 @@ def get_resource_path(file_path):
     return abs_path
 
 class ScriptCacherMixin(object):
-    def get_scripts(self, script_ids=None):
+    def get_scripts(self, script_ids=None, with_code=True):
         # 【注意】
         # 加载脚本处理存在两处
         #   1. ReloadScriptsTask.force_reload_script()
@@ -200,18 +243,25 @@ class ScriptCacherMixin(object):
         #       按需加载已变更的脚本，并缓存到Redis
         #   3. RunnerTask.update_script_dict_cache()
         #       缓存击穿时加载所需脚本，并缓存到内存
+        # Redis中按脚本逐个缓存，并附带脚本清单（scriptManifest）
+        # 脚本清单MD5（scriptsMD5）作为脚本整体版本号
 
         # 获取脚本数据
+        # 不包含代码时，仅获取元数据
         sql = '''
             SELECT
                  `scpt`.`seq`
                 ,`scpt`.`id`
                 ,`scpt`.`publishVersion`
-                ,`scpt`.`code`
                 ,`scpt`.`codeMD5`
 
                 ,`sset`.`id` AS `scriptSetId`
-
+            '''
+        if with_code:
+            sql += '''
+                ,`scpt`.`code`
+            '''
+        sql += '''
             FROM biz_main_script_set AS sset
 
             JOIN biz_main_script AS scpt
@@ -230,6 +280,7 @@ class ScriptCacherMixin(object):
             SELECT
                  `func`.`id`
                 ,`func`.`scriptId`
+                ,`func`.`integration`
                 ,`func`.`extraConfigJSON`
             FROM biz_main_func AS func
             '''
@@ -241,9 +292,11 @@ class ScriptCacherMixin(object):
 
         funcs = self.db.query(sql, sql_params)
 
-        # 整理函数额外配置表
+        # 整理函数额外配置表、函数集成表
         # 结构如下：{ "<脚本ID>": { "<函数ID>": <额外配置JSON> }}
+        #           { "<脚本ID>": { "<函数ID>": "<集成类型>" }}
         script_func_extra_config_map = {}
+        script_func_integration_map  = {}
         for f in funcs:
             func_id           = f['id']
             script_id         = f['scriptId']
@@ -256,43 +309,198 @@ class ScriptCacherMixin(object):
 
             script_func_extra_config_map[f['scriptId']][func_id] = func_extra_config
 
-        # 函数额外配置表插入脚本信息
+            if f['integration']:
+                if f['scriptId'] not in script_func_integration_map:
+                    script_func_integration_map[f['scriptId']] = {}
+
+                script_func_integration_map[f['scriptId']][func_id] = f['integration']
+
+        # 函数额外配置表、函数集成表插入脚本信息
         for s in scripts:
             s['funcExtraConfig'] = script_func_extra_config_map.get(s['id']) or {}
+            s['funcIntegration'] = script_func_integration_map.get(s['id'])  or {}
+
+        return scripts
+
+    def get_script_cache_key(self, script_id):
+        return toolkit.get_cache_key('fixedCache', 'script', tags=['scriptId', script_id])
+
+    def get_cached_script_manifest(self):
+        '''
+        获取缓存的脚本清单
+        结构如下：{ "<脚本ID>": { "codeMD5": "<MD5>", "publishVersion": <发布版本>, "funcExtraConfig": {...}, ... } }
+        '''
+        cache_key = toolkit.get_cache_key('fixedCache', 'scriptManifest')
+        cache_res = self.cache_db.get(cache_key)
+        if not cache_res:
+            return None
+
+        script_manifest = None
+        try:
+            script_manifest = toolkit.json_loads(six.ensure_str(cache_res))
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.error(line)
+
+        return script_manifest
+
+    def create_func_registry(self, script_manifest):
+        '''
+        根据脚本清单创建函数注册表
+        结构如下：{ "<函数ID>": { "id": "<函数ID>", "scriptId": "<脚本ID>", "integration": "<集成类型>", "extraConfig": {...}, ... } }
+        '''
+        func_registry = {}
+        for script_id, script_meta in script_manifest.items():
+            func_integration_map = script_meta.get('funcIntegration') or {}
+            for func_id, func_extra_config in (script_meta.get('funcExtraConfig') or {}).items():
+                func_extra_config = func_extra_config or {}
+                func_registry[func_id] = {
+                    'id'         : func_id,
+                    'scriptId'   : script_id,
+                    'integration': func_integration_map.get(func_id),
+                    'extraConfig': func_extra_config,
+                    'timeout'    : func_extra_config.get('timeout'),
+                    'queue'      : func_extra_config.get('queue'),
+                    'cacheResult': func_extra_config.get('cacheResult'),
+                }
+
+        return func_registry
+
+    def get_func_registry(self):
+        '''
+        获取函数注册表
+        与脚本缓存使用相同的版本号（scriptsMD5），版本未变化时直接使用本地缓存
+        '''
+        global FUNC_REGISTRY
+        global FUNC_REGISTRY_SCRIPTS_MD5
+
+        cache_key = toolkit.get_cache_key('fixedCache', 'scriptsMD5')
+        scripts_md5 = self.cache_db.get(cache_key)
+        if scripts_md5:
+            scripts_md5 = six.ensure_str(scripts_md5)
+            if FUNC_REGISTRY is not None and scripts_md5 == FUNC_REGISTRY_SCRIPTS_MD5:
+                return FUNC_REGISTRY
+
+        script_manifest = None
+        if scripts_md5:
+            script_manifest = self.get_cached_script_manifest()
+
+        # Redis中无脚本清单，或脚本清单为旧版本格式时，直接从数据库获取（正常不会发生）
+        if script_manifest is None or any('funcIntegration' not in m for m in script_manifest.values()):
+            self.logger.warning('[FUNC REGISTRY] Cache missed! Use DB data')
+
+            script_manifest = dict([ (s['id'], s) for s in self.get_scripts(with_code=False) ])
+            scripts_md5     = None
+
+        FUNC_REGISTRY             = self.create_func_registry(script_manifest)
+        FUNC_REGISTRY_SCRIPTS_MD5 = scripts_md5
+
+        return FUNC_REGISTRY
+
+    def get_cached_scripts(self, script_ids):
+        '''
+        批量获取缓存的脚本
+        缓存中不存在的脚本会被忽略
+        '''
+        script_ids = list(script_ids)
+        if not script_ids:
+            return []
+
+        cache_keys = [self.get_script_cache_key(script_id) for script_id in script_ids]
+        cache_res  = self.cache_db.mget(cache_keys)
+
+        scripts = []
+        for script_dump in cache_res:
+            if not script_dump:
+                continue
+
+            try:
+                scripts.append(toolkit.json_loads(six.ensure_str(script_dump)))
+            except Exception as e:
+                for line in traceback.format_exc().splitlines():
+                    self.logger.error(line)
 
         return scripts
 
 class FuncThreadHelper(object):
+    '''
+    多线程处理模块
+    线程池每个进程只创建一次，提交的任务及结果只在本次任务内可见
+    '''
     def __init__(self, task):
         self.__task = task
 
-    def start(self, fn, args=None, kwargs=None, key=None):
+        self.__future_map   = OrderedDict()
+        self.__is_cancelled = False
+
+        # `map()`等内部提交的调用，不对外公开结果，但需要能被取消
+        self.__inner_futures = set()
+
+        # 限制已提交但未完成的数量，队列满时提交方等待
+        self.__queue_semaphore = threading.BoundedSemaphore(CONFIG['_FUNC_TASK_THREAD_POOL_MAX_QUEUE_SIZE'])
+
+        # 本次任务在线程中运行的累计耗时
+        self.__cost_lock  = threading.Lock()
+        self.thread_cost = 0
+
+    def _get_pool(self):
         global THREAD_POOL
-        global THREAD_RESULT_MAP
 
         if not THREAD_POOL:
             self.__task.logger.debug('[THREAD POOL] Create Pool')
 
             pool_size = CONFIG['_FUNC_TASK_THREAD_POOL_SIZE']
             THREAD_POOL = ThreadPoolExecutor(pool_size)
-            THREAD_RESULT_MAP.clear()
 
+        return THREAD_POOL
+
+    def _run(self, fn, args, kwargs):
+        start_time = time.time()
+        try:
+            return fn(*args, **kwargs)
+
+        finally:
+            with self.__cost_lock:
+                self.thread_cost += time.time() - start_time
+
+    def _submit_to_pool(self, fn, args, kwargs):
+        return self._get_pool().submit(self._run, fn, args, kwargs)
+
+    def _submit(self, fn, args=None, kwargs=None):
+        if self.__is_cancelled:
+            e = CancelledError('Thread pool of this task is already cancelled')
+            raise e
+
+        self.__queue_semaphore.acquire()
+        try:
+            future = self._submit_to_pool(fn, args or [], kwargs or {})
+        except Exception as e:
+            self.__queue_semaphore.release()
+            raise
+
+        future.add_done_callback(lambda f: self.__queue_semaphore.release())
+        return future
+
+    def _get_futures(self, key=None):
+        if key is None:
+            return list(self.__future_map.items())
+
+        return [ (k, self.__future_map[k]) for k in toolkit.as_array(key) if k in self.__future_map ]
+
+    def start(self, fn, args=None, kwargs=None, key=None):
         key = key or toolkit.gen_data_id('async')
         self.__task.logger.debug('[THREAD POOL] Submit Key=`{0}`'.format(key))
 
-        if key in THREAD_RESULT_MAP:
+        if key in self.__future_map:
             e = DuplicationException('Thread result key already existed: `{0}`'.format(key))
             raise e
 
-        args   = args   or []
-        kwargs = kwargs or {}
-        THREAD_RESULT_MAP[key] = THREAD_POOL.submit(fn, *args, **kwargs)
+        self.__future_map[key] = self._submit(fn, args, kwargs)
 
-    def get_result(self, wait=True, key=None):
-        global THREAD_POOL
-        global THREAD_RESULT_MAP
+        return key
 
-        if not THREAD_RESULT_MAP:
+    def get_result(self, wait=True, key=None):
+        if not self.__future_map:
             return None
 
         if wait is None:
@@ -300,11 +508,11 @@ class FuncThreadHelper(object):
 
         collected_res = {}
 
-        keys = key or list(THREAD_RESULT_MAP.keys())
+        keys = key or list(self.__future_map.keys())
         for k in toolkit.as_array(keys):
             collected_res[k] = None
 
-            future_res = THREAD_RESULT_MAP.get(k)
+            future_res = self.__future_map.get(k)
             if future_res is None:
                 continue
 
@@ -325,6 +533,313 @@ class FuncThreadHelper(object):
         else:
             return collected_res
 
+    def map(self, fn, iterable, timeout=None):
+        '''
+        使用多线程对每个元素调用函数，按顺序返回结果
+        任一调用出错时抛出错误
+        '''
+        futures = []
+        for x in iterable:
+            future = self._submit(fn, [x])
+            self.__inner_futures.add(future)
+            future.add_done_callback(self.__inner_futures.discard)
+
+            futures.append(future)
+
+        _, not_done = futures_wait(futures, timeout=timeout)
+        if not_done:
+            # 超时后取消未开始的调用，避免在后台继续运行
+            for future in not_done:
+                future.cancel()
+
+            e = TimeoutError('{} of {} calls not finished in {} seconds'.format(len(not_done), len(futures), timeout))
+            raise e
+
+        return [ f.result() for f in futures ]
+
+    def as_completed(self, key=None, timeout=None):
+        '''
+        按完成顺序逐个返回`(key, retval, error)`
+        '''
+        future_key_map = dict([ (f, k) for k, f in self._get_futures(key) ])
+        for future in futures_as_completed(future_key_map.keys(), timeout=timeout):
+            retval = None
+            error  = None
+            try:
+                retval = future.result()
+            except Exception as e:
+                error = e
+
+            yield future_key_map[future], retval, error
+
+    def gather(self, key=None, timeout=None, return_exceptions=False):
+        '''
+        等待全部完成，按提交顺序返回结果
+        `return_exceptions=False`时，任一调用出错时抛出错误
+        '''
+        futures = [ f for k, f in self._get_futures(key) ]
+        _, not_done = futures_wait(futures, timeout=timeout)
+        if not_done:
+            # 超时后取消未开始的调用，避免在后台继续运行
+            for future in not_done:
+                future.cancel()
+
+            e = TimeoutError('{} of {} calls not finished in {} seconds'.format(len(not_done), len(futures), timeout))
+            raise e
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+
+                results.append(e)
+
+        return results
+
+    def cancel(self):
+        '''
+        取消本次任务所有未开始的调用，之后不再接受提交
+        已在运行中的调用无法中断，但结果不再可见
+        '''
+        self.__is_cancelled = True
+
+        futures = list(self.__future_map.values()) + list(self.__inner_futures)
+
+        cancelled_count = 0
+        for future in futures:
+            if future.cancel():
+                cancelled_count += 1
+
+        if futures:
+            self.__task.logger.debug('[THREAD POOL] Cancel {0} of {1} futures'.format(cancelled_count, len(futures)))
+
+        self.__future_map.clear()
+        self.__inner_futures.clear()
+
+        return cancelled_count
+
+def _process_pool_initializer():
+    '''
+    进程池子进程初始化
+    子进程以spawn方式创建，不继承Worker子进程中的线程及锁，需要自行建立数据库连接
+    '''
+    from worker.utils.log_helper import LogHelper
+    from worker.tasks.main.func_runner import func_runner
+
+    func_runner.logger   = LogHelper()
+    func_runner.db       = MySQLHelper(func_runner.logger)
+    func_runner.cache_db = RedisHelper(func_runner.logger)
+
+    func_runner.prepare_task_helpers()
+
+def _process_pool_call(script_id, script_code_md5, func_name, args, kwargs):
+    '''
+    在进程池子进程中调用脚本函数
+    脚本作用域在子进程中按脚本版本缓存，同一脚本只执行一次
+    '''
+    from worker.tasks.main.func_runner import func_runner
+
+    script_scope = None
+
+    cached_scope = PROCESS_POOL_SCOPE_MAP.get(script_id)
+    if cached_scope and cached_scope['codeMD5'] == script_code_md5:
+        script_scope = cached_scope['scope']
+
+    else:
+        # 子进程中的脚本缓存需要从Redis加载，脚本发布后同样需要重新加载
+        target_script = func_runner.get_cached_script(script_id)
+        if not target_script or target_script['codeMD5'] != script_code_md5:
+            func_runner.load_script_dict_cache()
+            target_script = func_runner.get_cached_script(script_id)
+
+        if not target_script or target_script['codeMD5'] != script_code_md5:
+            e = NotFoundException('Script `{}` not found in process pool'.format(script_id))
+            raise e
+
+        func_id = '{}.{}'.format(script_id, func_name)
+        extra_vars = {
+            '_DFF_DEBUG'        : False,
+            '_DFF_SCRIPT_SET_ID': script_id.split('__')[0],
+            '_DFF_SCRIPT_ID'    : script_id,
+            '_DFF_FUNC_ID'      : func_id,
+            '_DFF_FUNC_NAME'    : func_name,
+        }
+        script_scope = func_runner.load_script_scope(target_script, func_id, extra_vars)
+
+        PROCESS_POOL_SCOPE_MAP[script_id] = {
+            'codeMD5': script_code_md5,
+            'scope'  : script_scope,
+        }
+
+    return script_scope[func_name](*args, **kwargs)
+
+class FuncProcessHelper(FuncThreadHelper):
+    '''
+    多进程处理模块
+    用于CPU密集型处理，只能在指定队列中使用
+    只能调用脚本中顶层定义的函数，参数和返回值需要可以被pickle
+    '''
+    def __init__(self, task):
+        super(FuncProcessHelper, self).__init__(task)
+
+        self.__task = task
+
+    def _get_pool(self):
+        global PROCESS_POOL
+
+        if not PROCESS_POOL or PROCESS_POOL._broken:
+            # 每个Worker进程的进程池大小，保证全部进程池总大小不超过CPU核数
+            #   `_WORKER_CONCURRENCY`可能为"auto"，需要使用Celery配置中已解析的值
+            pool_size = max(int((os.cpu_count() or 1) / app.conf.worker_concurrency), 1)
+
+            self.__task.logger.debug('[PROCESS POOL] Create Pool, size={0}'.format(pool_size))
+
+            # Worker子进程中已运行多个线程，Fork可能复制到被其他线程持有的锁，因此使用spawn方式
+            PROCESS_POOL = ProcessPoolExecutor(pool_size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_process_pool_initializer)
+
+        return PROCESS_POOL
+
+    def _submit_to_pool(self, fn, args, kwargs):
+        queue_alias = CONFIG['_FUNC_TASK_PROCESS_POOL_QUEUE_ALIAS']
+        queue       = CONFIG['WORKER_QUEUE_ALIAS_MAP'].get(queue_alias)
+        if queue is None or str(queue) != str(self.__task.queue) or not hasattr(self.__task, 'get_cached_script'):
+            e = NotSupportException('DFF.PROCESS is only available for published functions on queue `{}`'.format(queue_alias))
+            raise e
+
+        script_id = getattr(fn, '__globals__', {}).get('__name__')
+        if not script_id or fn.__qualname__ != fn.__name__:
+            e = NotSupportException('DFF.PROCESS can only call functions defined at the top level of a script')
+            raise e
+
+        target_script = self.__task.get_cached_script(script_id)
+        if not target_script:
+            e = NotFoundException('Script `{}` not found'.format(script_id))
+            raise e
+
+        return self._get_pool().submit(_process_pool_call, script_id, target_script['codeMD5'], fn.__name__, args, kwargs)
+
+class FuncCallResultSubscriber(object):
+    '''
+    同步调用函数的结果订阅
+    同一次任务中的所有同步调用共用一个订阅连接，收到的结果按Task ID分发
+    '''
+    def __init__(self, task):
+        self.__task = task
+
+        self.__pubsub     = None
+        self.__lock       = threading.Lock()
+        self.__result_map = {}
+
+    def subscribe(self, task_id):
+        channel = CELERY_TASK_KEY_PREFIX + task_id
+        with self.__lock:
+            if self.__pubsub is None:
+                self.__pubsub = self.__task.cache_db.subscribe(channel)
+            else:
+                self.__pubsub.subscribe(channel)
+
+    def get_result(self, task_id, timeout=None):
+        '''
+        获取指定Task的结果，等待超时返回`None`
+        '''
+        with self.__lock:
+            content = self.__result_map.pop(task_id, None)
+            if content is not None:
+                return content
+
+            if self.__pubsub is None:
+                return None
+
+            message = self.__pubsub.get_message(timeout=timeout)
+            if not message or message['type'] != 'message':
+                return None
+
+            channel = six.ensure_str(message['channel'])
+            self.__pubsub.unsubscribe(channel)
+
+            content = toolkit.json_loads(six.ensure_str(message['data']))
+
+            message_task_id = channel[len(CELERY_TASK_KEY_PREFIX):]
+            if message_task_id == task_id:
+                return content
+
+            # 其他调用的结果，暂存等待获取
+            self.__result_map[message_task_id] = content
+            return None
+
+    def close(self):
+        with self.__lock:
+            if self.__pubsub:
+                self.__pubsub.close()
+                self.__pubsub = None
+
+            self.__result_map.clear()
+
+class FuncCallFuture(object):
+    '''
+    同步调用函数（`DFF.FUNC(..., wait=True)`）的结果
+    通过新Task执行时，从Task结果订阅中获取结果
+    '''
+    def __init__(self, func_id, task_id=None, subscriber=None, timeout=None):
+        self.func_id = func_id
+        self.task_id = task_id
+
+        self.__subscriber = subscriber
+        self.__timeout    = timeout
+
+        self.__is_done = False
+        self.__retval  = None
+        self.__error   = None
+
+    def set_result(self, retval=None, error=None):
+        self.__is_done = True
+        self.__retval  = retval
+        self.__error   = error
+
+    def _wait(self, timeout=None):
+        deadline = None
+        if timeout:
+            deadline = time.time() + timeout
+
+        while True:
+            wait_timeout = 1
+            if deadline:
+                wait_timeout = min(deadline - time.time(), 1)
+                if wait_timeout <= 0:
+                    e = TimeoutError('Waiting for result of `{}` timeout ({} seconds)'.format(self.func_id, timeout))
+                    raise e
+
+            content = self.__subscriber.get_result(self.task_id, timeout=wait_timeout)
+            if content is None:
+                continue
+
+            if content['status'] == 'SUCCESS':
+                retval = content.get('retval') or {}
+                self.set_result(retval=retval.get('raw'))
+
+            else:
+                error = FuncCallFailedException('`{}` failed: {}'.format(self.func_id, content.get('exceptionMessage')))
+                self.set_result(error=error)
+
+            return
+
+    def done(self):
+        return self.__is_done
+
+    def result(self, timeout=None):
+        if not self.__is_done:
+            self._wait(timeout or self.__timeout)
+
+        if self.__error is not None:
+            raise self.__error
+
+        return self.__retval
+
 class FuncContextHelper(object):
     def __init__(self, task):
         self.__task = task
@@ -967,18 +1482,49 @@ class FuncResponseFile(BaseFuncResponse):
         super(FuncResponseFile, self).__init__(**kwargs)
 
 class FuncResponseLargeData(BaseFuncResponse):
-    def __init__(self, data, content_type=None):
-        if not content_type:
-            if isinstance(data, (dict, list, tuple)):
-                content_type = 'json'
-            else:
-                content_type = 'txt'
+    def __init__(self, data, content_type=None, compress=False):
+        self._content_type = None
+        self._data         = None
+        self._stream       = None # 流式数据（生成器等迭代器）
+        self._stream_rows  = False
+        self._compress     = compress
+
+        self._file_size      = None
+        self._file_md5       = None
+        self._gzip_file_path = None
+
+        if not isinstance(data, Iterator):
+            if not content_type:
+                if isinstance(data, (dict, list, tuple)):
+                    content_type = 'json'
+                else:
+                    content_type = 'txt'
+
+            if not isinstance(data, (six.string_types, bytes)):
+                data = toolkit.json_dumps(data)
+
+            self._data = data
+
+        else:
+            # 流式数据，写入文件时逐块处理，不在内存中保存完整数据
+            #   元素为字符串时，直接写入
+            #   元素为其他数据时，作为数据行序列化后写入
+            stream = data
+
+            first_chunk = next(stream, None)
+            self._stream_rows = first_chunk is not None and not isinstance(first_chunk, (six.string_types, bytes))
+            if first_chunk is not None:
+                stream = itertools.chain([ first_chunk ], stream)
+
+            if not content_type:
+                if self._stream_rows:
+                    content_type = 'json'
+                else:
+                    content_type = 'txt'
 
-        if not isinstance(data, str):
-            data = toolkit.json_dumps(data)
+            self._stream = stream
 
         self._content_type = content_type
-        self._data         = data
 
         kwargs = {
             'auto_delete_file': True,
@@ -986,6 +1532,33 @@ class FuncResponseLargeData(BaseFuncResponse):
         }
         super(FuncResponseLargeData, self).__init__(**kwargs)
 
+    def _iter_chunks(self):
+        if self._stream is None:
+            yield self._data
+            return
+
+        if not self._stream_rows:
+            for chunk in self._stream:
+                yield chunk
+            return
+
+        # 数据行：JSON格式输出为数组，其他格式每行一个JSON
+        is_json = self._content_type == 'json'
+        if is_json:
+            yield '['
+
+        for i, row in enumerate(self._stream):
+            if is_json:
+                if i > 0:
+                    yield ','
+            elif i > 0:
+                yield '\n'
+
+            yield toolkit.json_dumps(row, indent=None)
+
+        if is_json:
+            yield ']'
+
     def cache_to_file(self, auto_delete=True, cache_expires=0):
         cache_expires = cache_expires or 0
 
@@ -994,73 +1567,428 @@ class FuncResponseLargeData(BaseFuncResponse):
 
         file_name = f"{arrow.get(now).format('YYYYMMDDHHmmss')}_{toolkit.gen_rand_string(16)}_api-resp.{self._content_type}"
         file_path = os.path.join(CONFIG.get('DOWNLOAD_TEMP_ROOT_FOLDER'), file_name)
-        with open(get_resource_path(file_path), 'w') as _f:
-            _f.write(self._data)
 
-        self.file_path        = file_path
-        self.auto_delete_file = auto_delete
+        gzip_file_path = None
+        _gzip_f        = None
+        if self._compress:
+            gzip_file_path = file_path + '.gz'
+            _gzip_f = gzip.open(get_resource_path(gzip_file_path), 'wb')
 
-class ScriptBaseTask(BaseTask, ScriptCacherMixin):
-    def __call__(self, *args, **kwargs):
-        self.__context_helper = FuncContextHelper(self)
+        file_size = 0
+        file_md5  = hashlib.md5()
+        try:
+            with open(get_resource_path(file_path), 'wb') as _f:
+                for chunk in self._iter_chunks():
+                    if not chunk:
+                        continue
 
-        return super(ScriptBaseTask, self).__call__(*args, **kwargs)
+                    if not isinstance(chunk, bytes):
+                        chunk = six.ensure_binary(chunk)
 
-    def _get_func_defination(self, F):
-        f_co   = six.get_function_code(F)
-        f_name = f_co.co_name
-        if f_name:
-            f_name = f_name.strip()
+                    _f.write(chunk)
+                    if _gzip_f:
+                        _gzip_f.write(chunk)
 
-        f_doc  = F.__doc__
-        if f_doc:
-            f_doc = inspect.cleandoc(f_doc)
+                    file_size += len(chunk)
+                    file_md5.update(chunk)
 
-        f_sig = funcsigs.signature(F)
-        f_def = '{}{}'.format(f_name, str(f_sig)).strip()
+        finally:
+            if _gzip_f:
+                _gzip_f.close()
 
-        f_argspec = None
-        f_args    = None
-        f_kwargs  = OrderedDict()
-        if six.PY3:
-            f_argspec = inspect.getfullargspec(F)
-        else:
-            f_argspec = inspect.getargspec(F)
+        # 数据已写入文件，释放内存
+        self._data   = None
+        self._stream = None
 
-        f_args = f_argspec.args
-        if f_argspec.varargs:
-            f_args.append('*{}'.format(f_argspec.varargs))
-        if f_argspec.varkw:
-            f_args.append('**{}'.format(f_argspec.varkw))
+        self.file_path        = file_path
+        self.auto_delete_file = auto_delete
 
-        for arg_name, args_info in f_sig.parameters.items():
-            if str(args_info.kind) == 'VAR_POSITIONAL':
-                f_kwargs['*{}'.format(arg_name)] = {}
+        self._file_size      = file_size
+        self._file_md5       = file_md5.hexdigest()
+        self._gzip_file_path = gzip_file_path
 
-            elif str(args_info.kind) == 'VAR_KEYWORD':
-                f_kwargs['**{}'.format(arg_name)] = {}
+    def _create_response_control(self):
+        response_control = super(FuncResponseLargeData, self)._create_response_control()
 
-            elif str(args_info.kind) == 'POSITIONAL_OR_KEYWORD':
-                f_kwargs[arg_name] = {}
+        if self.file_path:
+            response_control['fileSize'] = self._file_size
+            response_control['fileMD5']  = self._file_md5
 
-                if args_info.default is not funcsigs._empty:
-                    arg_default = '<Complex Object>'
-                    try:
-                        arg_default = toolkit.json_copy(args_info.default)
-                    except Exception as e:
-                        pass
-                    finally:
-                        f_kwargs[arg_name]['default'] = arg_default
+            if self._gzip_file_path:
+                response_control['gzipFilePath'] = self._gzip_file_path
 
-        return (f_name, f_def, f_args, f_kwargs, f_doc)
+        return response_control
 
-    def _resolve_fromlist(self, module, fromlist, globals):
-        if not all([module, fromlist, globals]):
-            return
+def _safe_scope_eval(*args, **kwargs):
+    # 不再限制此类函数，直接调用原生函数
+    return eval(*args, **kwargs)
 
-        for import_name in fromlist:
-            o = module.__dict__.get(import_name)
-            if o:
+def _safe_scope_exec(*args, **kwargs):
+    # 不再限制此类函数，直接调用原生函数
+    return exec(*args, **kwargs)
+
+def _export_as_api_passthrough(F):
+    return F
+
+def get_safe_scope_template():
+    '''
+    获取安全脚本作用域模板
+    内置函数、与任务无关的注入函数在每个进程中只生成一次，
+    创建作用域时只需复制，无需重复遍历builtins
+    '''
+    global SAFE_SCOPE_BUILTINS_TEMPLATE
+    global SAFE_SCOPE_INJECT_FUNCS_TEMPLATE
+
+    if SAFE_SCOPE_BUILTINS_TEMPLATE is None:
+        builtins = {}
+        for name in dir(six.moves.builtins):
+            if name in EXCLUDE_BUILTIN_NAMES:
+                continue
+
+            builtins[name] = getattr(six.moves.builtins, name)
+
+        SAFE_SCOPE_BUILTINS_TEMPLATE = MappingProxyType(builtins)
+
+    if SAFE_SCOPE_INJECT_FUNCS_TEMPLATE is None:
+        inject_funcs = {
+            'EVAL': _safe_scope_eval, # 执行Python表达式
+            'EXEC': _safe_scope_exec, # 执行Python代码
+            'SQL' : format_sql,       # 格式化SQL语句
+
+            'RSRC'           : get_resource_path,     # 获取资源路径
+            'RESP'           : FuncResponse,          # 函数响应体
+            'RESP_FILE'      : FuncResponseFile,      # 函数响应体（返回文件）
+            'RESP_LARGE_DATA': FuncResponseLargeData, # 函数响应题（大量数据）
+        }
+        # 增加小写别名
+        inject_func_names = list(inject_funcs.keys())
+        for k in inject_func_names:
+            inject_funcs[k.lower()] = inject_funcs[k]
+
+        SAFE_SCOPE_INJECT_FUNCS_TEMPLATE = MappingProxyType(inject_funcs)
+
+    return SAFE_SCOPE_BUILTINS_TEMPLATE, SAFE_SCOPE_INJECT_FUNCS_TEMPLATE
+
+class ScriptBaseTask(BaseTask, ScriptCacherMixin):
+    # 无状态处理模块，每个进程中的任务对象只创建一次
+    __data_source_helper = None
+    __config_helper      = None
+    __script_helpers_map = None
+
+    __memory_usage_use_tracemalloc = False
+
+    def __call__(self, *args, **kwargs):
+        self.prepare_task_helpers()
+
+        return super(ScriptBaseTask, self).__call__(*args, **kwargs)
+
+    def prepare_task_helpers(self):
+        '''
+        准备与本次任务执行绑定的处理模块
+        同一次任务中创建的所有作用域（包括被import的脚本）共用
+        '''
+        self.__context_helper      = FuncContextHelper(self)
+        self.__env_variable_helper = FuncEnvVariableHelper(self)
+        self.__thread_helper       = FuncThreadHelper(self)
+        self.__process_helper      = FuncProcessHelper(self)
+
+        self.__func_call_subscriber = FuncCallResultSubscriber(self)
+
+        # 执行各阶段耗时（毫秒）
+        self.phase_costs = OrderedDict()
+
+        # 内存使用
+        # 上次任务未正常结束时，需要停止遗留的内存跟踪
+        if self.__memory_usage_use_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        self.__memory_usage_start_rss       = None
+        self.__memory_usage_use_tracemalloc = False
+
+        if self.__data_source_helper is None:
+            self.__data_source_helper = FuncDataSourceHelper(self)
+            self.__config_helper      = FuncConfigHelper(self)
+
+            self.__script_helpers_map = {}
+
+    def _get_script_helpers(self, script_name):
+        '''
+        获取脚本对应的存储、缓存处理模块
+        '''
+        script_helpers = self.__script_helpers_map.get(script_name)
+        if not script_helpers:
+            script_helpers = (
+                FuncStoreHelper(self, default_scope=script_name),
+                FuncCacheHelper(self, default_scope=script_name),
+            )
+            self.__script_helpers_map[script_name] = script_helpers
+
+        return script_helpers
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''
+        记录执行阶段耗时，同名阶段累加
+        用法：`with self.phase('entryCall'): ...`
+        '''
+        start_time = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            self.add_phase_cost(name, (time.perf_counter() - start_time) * 1000)
+
+    def add_phase_cost(self, name, cost):
+        self.phase_costs[name] = round(self.phase_costs.get(name, 0) + cost, 3)
+
+    def add_queue_wait_phase_cost(self, trigger_time_ms, start_time_ms):
+        '''
+        记录排队等待时间
+        延迟执行的任务从ETA开始计算
+        '''
+        if self.request.eta:
+            eta_ms = int(arrow.get(self.request.eta).datetime.timestamp() * 1000)
+            trigger_time_ms = max(trigger_time_ms or 0, eta_ms)
+
+        if trigger_time_ms:
+            self.add_phase_cost('queueWait', max(start_time_ms - trigger_time_ms, 0))
+
+    def _get_current_process(self):
+        global CURRENT_PROCESS
+
+        if CURRENT_PROCESS is None or CURRENT_PROCESS.pid != os.getpid():
+            CURRENT_PROCESS = psutil.Process()
+
+        return CURRENT_PROCESS
+
+    def start_memory_usage(self):
+        '''
+        开始记录本次任务的内存使用
+            rss        : 只记录常驻内存变化量，开销很小
+            tracemalloc: 额外记录Python内存分配峰值，开销较大，建议仅在排查问题时开启
+        '''
+        mode = CONFIG['_FUNC_TASK_MEMORY_USAGE_MODE']
+        if mode not in ('rss', 'tracemalloc'):
+            return
+
+        self.__memory_usage_start_rss = self._get_current_process().memory_info().rss
+
+        # 已经由其他代码开启时，不做处理
+        if mode == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__memory_usage_use_tracemalloc = True
+
+    def stop_memory_usage(self):
+        '''
+        结束记录本次任务的内存使用（字节）
+        '''
+        if self.__memory_usage_start_rss is None:
+            return None
+
+        rss = self._get_current_process().memory_info().rss
+
+        memory_usage = {
+            'rss'     : rss,
+            'rssDelta': rss - self.__memory_usage_start_rss,
+        }
+
+        if self.__memory_usage_use_tracemalloc:
+            memory_usage['tracemallocPeak'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        self.__memory_usage_start_rss       = None
+        self.__memory_usage_use_tracemalloc = False
+
+        return memory_usage
+
+    def check_memory_recycle(self, func_id):
+        '''
+        检查子进程内存是否超过限制
+        超过时，Celery会在本次任务结束后回收子进程，此处记录导致回收的函数
+        '''
+        max_memory = CONFIG['_WORKER_MAX_MEMORY_PER_CHILD']
+        if not max_memory:
+            return
+
+        # 与Celery判断方式相同，使用进程常驻内存峰值（KB）
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if max_rss <= max_memory * 1024:
+            return
+
+        self.logger.warning('[MEMORY RECYCLE] Child process exceeded memory limit after `{}`: {:.2f}MB / {}MB'.format(
+                func_id, max_rss / 1024, max_memory))
+
+        try:
+            cache_key = toolkit.get_server_cache_key('monitor', 'sysStats', ['metric', 'funcMemoryRecycle', 'funcId', func_id])
+            self.cache_db.ts_add(cache_key, 1, mode='addUp')
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.error(line)
+
+    def _get_async_loop(self):
+        '''
+        获取进程内事件循环
+        非主线程（如批量执行时的线程池）中无法共用，每次创建新的事件循环
+        '''
+        global ASYNC_LOOP
+
+        if threading.current_thread() is not threading.main_thread():
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(CONFIG['_FUNC_TASK_ASYNC_THREAD_POOL_SIZE']))
+            return loop, True
+
+        if not ASYNC_LOOP or ASYNC_LOOP.is_closed():
+            self.logger.debug('[ASYNC LOOP] Create Loop')
+
+            ASYNC_LOOP = asyncio.new_event_loop()
+            ASYNC_LOOP.set_default_executor(ThreadPoolExecutor(CONFIG['_FUNC_TASK_ASYNC_THREAD_POOL_SIZE']))
+
+        return ASYNC_LOOP, False
+
+    def run_coroutine(self, coro, start_time=None):
+        '''
+        在事件循环中执行协程
+        超时时间与Celery的`soft_time_limit`一致，超时抛出`SoftTimeLimitExceeded`
+        '''
+        timeout = None
+        try:
+            soft_time_limit = self.request.timelimit[1]
+        except (AttributeError, IndexError, TypeError) as e:
+            pass
+        else:
+            if soft_time_limit:
+                timeout = soft_time_limit
+                if start_time:
+                    timeout = max(soft_time_limit - (time.time() - start_time), 0)
+
+        loop, is_temp_loop = self._get_async_loop()
+        try:
+            return loop.run_until_complete(asyncio.wait_for(coro, timeout=timeout))
+
+        except asyncio.TimeoutError as e:
+            if timeout is None:
+                raise
+
+            e = SoftTimeLimitExceeded('Async function timeout ({} seconds)'.format(timeout))
+            raise e
+
+        finally:
+            # 取消函数遗留的未完成协程，避免影响下一个任务
+            pending_tasks = asyncio.all_tasks(loop)
+            if pending_tasks:
+                self.logger.debug('[ASYNC LOOP] Cancel {} pending tasks'.format(len(pending_tasks)))
+
+                for t in pending_tasks:
+                    t.cancel()
+
+                loop.run_until_complete(asyncio.gather(*pending_tasks, return_exceptions=True))
+
+            if is_temp_loop:
+                loop.close()
+
+    def call_entry_func(self, entry_func, func_call_kwargs=None, start_time=None):
+        '''
+        调用入口函数
+        `async def`定义的函数在事件循环中执行至完成
+        '''
+        func_resp = entry_func(**(func_call_kwargs or {}))
+        if inspect.isawaitable(func_resp):
+            func_resp = self.run_coroutine(func_resp, start_time=start_time)
+
+        return func_resp
+
+    def get_func_result_repr(self, func_resp):
+        '''
+        生成函数返回值的repr
+        返回值过大时不再执行`pprint.saferepr`，直接截取已序列化的数据
+        '''
+        max_length = CONFIG['_FUNC_TASK_RESULT_REPR_MAX_LENGTH']
+
+        result_repr = None
+        if func_resp.data_dumps is not None and len(func_resp.data_dumps) > max_length:
+            result_repr = func_resp.data_dumps
+        else:
+            result_repr = pprint.saferepr(func_resp.data)
+
+        return toolkit.limit_text(result_repr, max_length=max_length, show_length=True)
+
+    def _copy_func_defination(self, func_defination):
+        # 缓存中的函数信息在多次调用间共享，返回副本避免被调用方修改
+        f_name, f_def, f_args, f_kwargs, f_doc = func_defination
+        return (f_name, f_def, list(f_args), toolkit.json_copy(f_kwargs), f_doc)
+
+    def _get_func_defination(self, F, code_md5=None):
+        # 相同代码的函数信息不会变化，优先从缓存中获取
+        lru_key = None
+        if code_md5:
+            f_co = six.get_function_code(F)
+            lru_key = '{0}-{1}-{2}'.format(f_co.co_filename, code_md5, f_co.co_name)
+
+            try:
+                return self._copy_func_defination(FUNC_DEFINATION_LRU[lru_key])
+            except KeyError as e:
+                pass
+
+        f_co   = six.get_function_code(F)
+        f_name = f_co.co_name
+        if f_name:
+            f_name = f_name.strip()
+
+        f_doc  = F.__doc__
+        if f_doc:
+            f_doc = inspect.cleandoc(f_doc)
+
+        f_sig = funcsigs.signature(F)
+        f_def = '{}{}'.format(f_name, str(f_sig)).strip()
+
+        f_argspec = None
+        f_args    = None
+        f_kwargs  = OrderedDict()
+        if six.PY3:
+            f_argspec = inspect.getfullargspec(F)
+        else:
+            f_argspec = inspect.getargspec(F)
+
+        f_args = f_argspec.args
+        if f_argspec.varargs:
+            f_args.append('*{}'.format(f_argspec.varargs))
+        if f_argspec.varkw:
+            f_args.append('**{}'.format(f_argspec.varkw))
+
+        for arg_name, args_info in f_sig.parameters.items():
+            if str(args_info.kind) == 'VAR_POSITIONAL':
+                f_kwargs['*{}'.format(arg_name)] = {}
+
+            elif str(args_info.kind) == 'VAR_KEYWORD':
+                f_kwargs['**{}'.format(arg_name)] = {}
+
+            elif str(args_info.kind) == 'POSITIONAL_OR_KEYWORD':
+                f_kwargs[arg_name] = {}
+
+                if args_info.default is not funcsigs._empty:
+                    arg_default = '<Complex Object>'
+                    try:
+                        arg_default = toolkit.json_copy(args_info.default)
+                    except Exception as e:
+                        pass
+                    finally:
+                        f_kwargs[arg_name]['default'] = arg_default
+
+        func_defination = (f_name, f_def, f_args, f_kwargs, f_doc)
+        if lru_key:
+            FUNC_DEFINATION_LRU[lru_key] = func_defination
+            return self._copy_func_defination(func_defination)
+
+        return func_defination
+
+    def _resolve_fromlist(self, module, fromlist, globals):
+        if not all([module, fromlist, globals]):
+            return
+
+        for import_name in fromlist:
+            o = module.__dict__.get(import_name)
+            if o:
                 globals[import_name] = o
             else:
                 e = Exception('CustomImport: Cannot import name `{}`'.format(import_name))
@@ -1106,7 +2034,7 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
 
                     _module.__dict__.update(module_scope)
 
-                    script_code_obj = script_dict[name]['codeObj']
+                    script_code_obj = self.get_script_code_obj(script_dict[name])
                     if script_code_obj:
                         exec(script_code_obj, _module.__dict__)
 
@@ -1121,15 +2049,22 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
         else:
             return importlib.__import__(name, globals=globals, locals=locals, fromlist=fromlist, level=level)
 
-    def _export_as_api(self, safe_scope, title,
+    def _export_as_api(self, safe_scope, code_md5, title,
         # 控制类参数
-        fixed_crontab=None, delayed_crontab=None, timeout=None, api_timeout=None, cache_result=None, queue=None,
+        fixed_crontab=None, delayed_crontab=None, timeout=None, api_timeout=None, cache_result=None, cache_result_stale=None, queue=None,
         # 标记类参数
         category=None, tags=None,
         # 集成处理参数
         integration=None, integration_config=None,
         # 文档控制类参数
-        is_hidden=False):
+        is_hidden=False,
+        # 性能控制类参数
+        warm_module=False):
+        # 正式执行时，函数配置已在发布时检查并保存，
+        # 且不会读取导出的函数信息，直接返回原函数即可
+        if not safe_scope.get('_DFF_DEBUG'):
+            return _export_as_api_passthrough
+
         ### 参数检查/预处理 ###
         extra_config = {}
 
@@ -1203,6 +2138,18 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
 
             extra_config['cacheResult'] = cache_result
 
+        # 结果缓存过期后继续使用旧结果的时长（期间在后台重新执行函数刷新缓存）
+        if cache_result_stale is not None:
+            if cache_result is None:
+                e = InvalidOptionException('`cache_result_stale` requires `cache_result`')
+                raise e
+
+            if not isinstance(cache_result_stale, (int, float)):
+                e = InvalidOptionException('`cache_result_stale` should be an int or a float')
+                raise e
+
+            extra_config['cacheResultStale'] = cache_result_stale
+
         # 指定队列
         if queue is not None:
             available_queues = list(range(CONFIG['_WORKER_QUEUE_COUNT'])) + list(CONFIG['WORKER_QUEUE_ALIAS_MAP'].keys())
@@ -1259,18 +2206,23 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
         if is_hidden is True:
             extra_config['isHidden'] = True
 
+        # 复用已执行的脚本模块（不再每次调用都重新执行脚本顶层代码）
+        if warm_module is True:
+            extra_config['warmModule'] = True
+
         # 装饰器函数
         def decorater(F):
-            f_name, f_def, f_args, f_kwargs, f_doc = self._get_func_defination(F)
+            f_name, f_def, f_args, f_kwargs, f_doc = self._get_func_defination(F, code_md5)
 
+            # 同一装饰器可能装饰多个函数，每个函数使用各自的配置副本
             safe_scope['DFF'].exported_api_funcs.append({
                 'name'       : f_name,
                 'title'      : title,
                 'description': f_doc,
                 'definition' : f_def,
-                'extraConfig': extra_config or None,
+                'extraConfig': dict(extra_config) or None,
                 'category'   : category or 'general',
-                'tags'       : tags,
+                'tags'       : list(tags) if tags else tags,
                 'args'       : f_args,
                 'kwargs'     : f_kwargs,
                 'integration': integration,
@@ -1307,7 +2259,163 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
             for line in traceback.format_exc().splitlines():
                 self.logger.error(line)
 
-    def _call_func(self, safe_scope, func_id, kwargs=None, save_result=False):
+    def _get_func_extra_config(self, func_id):
+        '''
+        获取函数所在脚本及函数额外配置
+        优先使用本地脚本缓存，其次使用函数注册表（此时不返回脚本）
+        '''
+        script_id = func_id.split('.')[0]
+
+        if hasattr(self, 'get_cached_script'):
+            target_script = self.get_cached_script(script_id)
+            if target_script and func_id in (target_script.get('funcExtraConfig') or {}):
+                return target_script, target_script['funcExtraConfig'][func_id]
+
+        func = self.get_func_registry().get(func_id)
+        if not func:
+            e = NotFoundException('Function `{}` not found'.format(func_id))
+            raise e
+
+        return None, func['extraConfig']
+
+    def _get_func_queue(self, func_extra_config):
+        '''
+        获取函数指定的队列编号，未指定时返回`None`
+        '''
+        specified_queue = (func_extra_config or {}).get('queue')
+        if specified_queue is None:
+            return None
+
+        if isinstance(specified_queue, int):
+            return str(specified_queue)
+
+        specified_queue = CONFIG['WORKER_QUEUE_ALIAS_MAP'].get(specified_queue)
+        if specified_queue is None:
+            return None
+
+        return str(specified_queue)
+
+    @contextlib.contextmanager
+    def _limit_inline_call_time(self, func_id, timeout):
+        '''
+        限制在当前进程中直接执行的函数的运行时间
+        主线程中使用`SIGALRM`中断执行；其他线程中无法中断，执行结束后检查
+        '''
+        if not timeout:
+            yield
+            return
+
+        start_time = time.time()
+
+        def _get_timeout_error():
+            return TimeoutError('Function `{}` timeout ({} seconds)'.format(func_id, timeout))
+
+        if threading.current_thread() is not threading.main_thread():
+            yield
+
+            if time.time() - start_time > timeout:
+                raise _get_timeout_error()
+
+            return
+
+        # 外层已有更早到期的限制时（嵌套调用），保持不变
+        prev_delay, _ = signal.getitimer(signal.ITIMER_REAL)
+        if prev_delay and prev_delay <= timeout:
+            yield
+            return
+
+        def _on_timeout(signum, frame):
+            raise _get_timeout_error()
+
+        prev_handler = signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            yield
+
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, prev_handler)
+
+            # 恢复外层的限制
+            if prev_delay:
+                remaining = prev_delay - (time.time() - start_time)
+                signal.setitimer(signal.ITIMER_REAL, max(remaining, 0.001))
+
+    def _call_func_inline(self, safe_scope, target_script, func_id, kwargs=None, timeout=None):
+        '''
+        在当前进程中直接执行被调用的函数
+        使用独立的脚本作用域，日志合并至调用方，执行各阶段耗时单独记录
+        '''
+        script_id = target_script['id']
+        func_name = func_id[len(script_id) + 1:]
+
+        func_chain = list(safe_scope.get('_DFF_FUNC_CHAIN') or []) + [func_id]
+
+        extra_vars = dict([ (k, v) for k, v in safe_scope.items() if k.startswith('_DFF_') ])
+        extra_vars.update({
+            '_DFF_SCRIPT_SET_ID': script_id.split('__')[0],
+            '_DFF_SCRIPT_ID'    : script_id,
+            '_DFF_FUNC_ID'      : func_id,
+            '_DFF_FUNC_NAME'    : func_name,
+            '_DFF_FUNC_CHAIN'   : func_chain,
+        })
+
+        self.logger.info('[RUN FUNC INLINE] `{}`'.format(func_id))
+
+        # 被调用函数的阶段耗时不计入调用方
+        caller_phase_costs = self.phase_costs
+        self.phase_costs = OrderedDict()
+
+        start_time   = time.time()
+        future       = FuncCallFuture(func_id)
+        callee_scope = None
+        is_failed    = False
+        try:
+            with self._limit_inline_call_time(func_id, timeout):
+                callee_scope = self.load_script_scope(target_script, func_id, extra_vars, allow_warm_module=False)
+
+                entry_func = callee_scope.get(func_name)
+                if not entry_func:
+                    e = NotFoundException('Function `{}` not found in `{}`'.format(func_name, script_id))
+                    raise e
+
+                with self.phase('entryCall'):
+                    func_resp = self.call_entry_func(entry_func, kwargs)
+
+            if isinstance(func_resp, BaseFuncResponse):
+                if isinstance(func_resp.data, Exception):
+                    raise func_resp.data
+
+                func_resp = func_resp.data
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.warning(line)
+
+            is_failed = True
+            future.set_result(error=e)
+
+        else:
+            future.set_result(retval=func_resp)
+
+        finally:
+            callee_phase_costs = self.phase_costs
+            self.phase_costs = caller_phase_costs
+
+            if callee_scope:
+                safe_scope['DFF'].log_messages.extend(callee_scope['DFF'].log_messages or [])
+
+            self.cache_running_info(
+                func_id=func_id,
+                script_publish_version=target_script['publishVersion'],
+                exec_mode=safe_scope.get('_DFF_EXEC_MODE'),
+                is_failed=is_failed,
+                cost=time.time() - start_time,
+                phase_costs=callee_phase_costs)
+
+        return future
+
+    def _call_func(self, safe_scope, func_id, kwargs=None, save_result=False, wait=False, timeout=None):
         func_chain = safe_scope.get('_DFF_FUNC_CHAIN') or []
         func_chain_info = ' -> '.join(map(lambda x: '`{}`'.format(x), func_chain))
 
@@ -1321,26 +2429,8 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
             e = DuplicationException('{} -> [{}]'.format(func_chain_info, func_id))
             raise e
 
-        # 检查并获取函数信息
-        sql = '''
-            SELECT
-                *
-            FROM biz_main_func AS func
-
-            WHERE
-                `id` = ?
-            LIMIT 1
-            '''
-        sql_params = [func_id]
-        db_res = self.db.query(sql, sql_params)
-        if len(db_res) <= 0:
-            e = NotFoundException()
-            raise e
-
-        func = db_res[0]
-        func_extra_config = None
-        if func.get('extraConfigJSON'):
-            func_extra_config = toolkit.json_loads(func['extraConfigJSON'])
+        # 获取函数信息
+        target_script, func_extra_config = self._get_func_extra_config(func_id)
 
         # 组装函数配置
         soft_time_limit = CONFIG['_FUNC_TASK_DEFAULT_TIMEOUT']
@@ -1353,6 +2443,22 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
             soft_time_limit = func_timeout
             time_limit      = func_timeout + CONFIG['_FUNC_TASK_EXTRA_TIMEOUT_TO_KILL']
 
+        # 调用执行的队列
+        # 异步调用在原队列执行，同步调用在被调用函数指定的队列执行
+        queue = safe_scope.get('_DFF_QUEUE')
+        if wait:
+            queue = self._get_func_queue(func_extra_config) or queue
+
+        # 同步调用，且在当前队列执行时，直接在当前进程中执行
+        # 避免占用当前队列的Worker等待同一队列中的任务，导致死锁
+        if wait and str(queue) == str(safe_scope.get('_DFF_QUEUE')):
+            if not target_script or not hasattr(self, 'load_script_scope'):
+                e = NotSupportException('Waiting for `{}` in the same queue is not supported here'.format(func_id))
+                raise e
+
+            inline_timeout = min(filter(None, [ timeout, soft_time_limit ]))
+            return self._call_func_inline(safe_scope, target_script, func_id, kwargs, timeout=inline_timeout)
+
         _shift_seconds = int(soft_time_limit * CONFIG['_FUNC_TASK_TIMEOUT_TO_EXPIRE_SCALE'])
         expires = arrow.get().shift(seconds=_shift_seconds).datetime
 
@@ -1369,11 +2475,15 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
             'triggerTime'    : safe_scope.get('_DFF_TRIGGER_TIME'),
             'triggerTimeMs'  : safe_scope.get('_DFF_TRIGGER_TIME_MS'),
             'crontab'        : safe_scope.get('_DFF_CRONTAB'),
-            'queue'          : safe_scope.get('_DFF_QUEUE'),
+            'queue'          : queue,
             'rootTaskId'     : safe_scope.get('_DFF_ROOT_TASK_ID'),
             'funcChain'      : func_chain,
         }
 
+        # 同步调用只需要原始返回值
+        if wait:
+            task_kwargs['returnType'] = 'raw'
+
         # 缓存任务状态
         sub_task_id = gen_task_id()
         cache_key = toolkit.get_cache_key('syncCache', 'taskInfo')
@@ -1391,8 +2501,16 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
 
         self.cache_db.run('lpush', cache_key, data)
 
-        # 调用执行（在原队列执行）
-        queue = safe_scope.get('_DFF_QUEUE')
+        # 同步调用时，需要在发送Task前订阅结果
+        future = None
+        if wait:
+            self.__func_call_subscriber.subscribe(sub_task_id)
+            future = FuncCallFuture(func_id,
+                    task_id=sub_task_id,
+                    subscriber=self.__func_call_subscriber,
+                    timeout=timeout or time_limit)
+
+        # 调用执行
         func_runner.apply_async(
             task_id=sub_task_id,
             kwargs=task_kwargs,
@@ -1402,17 +2520,39 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
             time_limit=time_limit,
             expires=expires)
 
+        return future
+
+    def _call_func_map(self, safe_scope, func_id, kwargs_list, timeout=None):
+        '''
+        使用多组参数同时调用函数，等待全部完成后按顺序返回结果
+        被调用函数在其他队列执行时，各调用均通过新Task并行执行；
+        在当前队列执行时，为避免死锁，在当前进程中依次执行
+        '''
+        futures = [ self._call_func(safe_scope, func_id, kwargs, wait=True, timeout=timeout) for kwargs in kwargs_list ]
+        return [ f.result() for f in futures ]
+
+    def _create_custom_import(self, script_dict, imported_script_dict, safe_scope):
+        def __custom_import(name, globals=None, locals=None, fromlist=None, level=0):
+            return self._custom_import(script_dict, imported_script_dict,
+                name, globals, locals, fromlist, level, safe_scope)
+
+        return __custom_import
+
     def create_safe_scope(self, script_name=None, script_dict=None, imported_script_dict=None, extra_vars=None):
         '''
         创建安全脚本作用域
         '''
-        script_dict          = script_dict          or {}
-        imported_script_dict = imported_script_dict or {}
+        if script_dict is None:
+            script_dict = {}
+        if imported_script_dict is None:
+            imported_script_dict = {}
+
+        builtins_template, inject_funcs_template = get_safe_scope_template()
 
         safe_scope = {
             '__name__'    : script_name or '<script>',
             '__file__'    : script_name or '<script>',
-            '__builtins__': {},
+            '__builtins__': dict(builtins_template),
         }
 
         if extra_vars:
@@ -1420,26 +2560,13 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
                 if k not in safe_scope:
                     safe_scope[k] = v
 
-        for name in dir(six.moves.builtins):
-            if name in EXCLUDE_BUILTIN_NAMES:
-                continue
-
-            safe_scope['__builtins__'][name] = six.moves.builtins.__getattribute__(name)
-
         # 自定义import实现
-        def __custom_import(name, globals=None, locals=None, fromlist=None, level=0):
-            return self._custom_import(script_dict, imported_script_dict,
-                name, globals, locals, fromlist, level, safe_scope)
+        __custom_import = self._create_custom_import(script_dict, imported_script_dict, safe_scope)
 
         # 注入方便函数
+        code_md5 = (script_dict.get(script_name) or {}).get('codeMD5')
         def __export_as_api(title=None, **extra_config):
-            return self._export_as_api(safe_scope, title, **extra_config)
-
-        def __get_data_source_helper(data_source_id, **helper_kwargs):
-            return self._get_data_source_helper(data_source_id, **helper_kwargs)
-
-        def __get_env_variable(env_variable_id):
-            return self._get_env_variable(env_variable_id)
+            return self._export_as_api(safe_scope, code_md5, title, **extra_config)
 
         def __log(message):
             return self._log(safe_scope, message)
@@ -1447,115 +2574,265 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
         def __print(*args, **kwargs):
             return self._print(safe_scope, *args, **kwargs)
 
-        def __call_func(func_id, kwargs=None):
-            return self._call_func(safe_scope, func_id, kwargs)
+        def __call_func(func_id, kwargs=None, wait=False, timeout=None):
+            return self._call_func(safe_scope, func_id, kwargs, wait=wait, timeout=timeout)
 
-        def __eval(*args, **kwargs):
-            # 不再限制此类函数，直接调用原生函数
-            return eval(*args, **kwargs)
-
-        def __exec(*args, **kwargs):
-            # 不再限制此类函数，直接调用原生函数
-            return exec(*args, **kwargs)
+        def __call_func_map(func_id, kwargs_list, timeout=None):
+            return self._call_func_map(safe_scope, func_id, kwargs_list, timeout=timeout)
 
         safe_scope['__builtins__']['__import__'] = __custom_import
         safe_scope['__builtins__']['print']      = __print
 
-        __data_source_helper  = FuncDataSourceHelper(self)
-        __env_variable_helper = FuncEnvVariableHelper(self)
-        __store_helper        = FuncStoreHelper(self, default_scope=script_name)
-        __cache_helper        = FuncCacheHelper(self, default_scope=script_name)
-        __config_helper       = FuncConfigHelper(self)
-        __thread_helper       = FuncThreadHelper(self)
-
-        def __list_data_sources():
-            return __data_source_helper.list()
+        __store_helper, __cache_helper = self._get_script_helpers(script_name)
 
-        inject_funcs = {
-            'LOG' : __log,  # 输出日志
-            'EVAL': __eval, # 执行Python表达式
-            'EXEC': __exec, # 执行Python代码
-
-            'API'   : __export_as_api,       # 导出为API
-            'SRC'   : __data_source_helper,  # 数据源处理模块
-            'ENV'   : __env_variable_helper, # 环境变量处理模块
-            'CTX'   : self.__context_helper, # 上下文处理模块
-            'STORE' : __store_helper,        # 存储处理模块
-            'CACHE' : __cache_helper,        # 缓存处理模块
-            'CONFIG': __config_helper,       # 配置处理模块
-            'SQL'   : format_sql,            # 格式化SQL语句
+        # 与任务相关的注入函数
+        task_inject_funcs = {
+            'LOG': __log, # 输出日志
 
-            'RSRC'           : get_resource_path,     # 获取资源路径
-            'RESP'           : FuncResponse,          # 函数响应体
-            'RESP_FILE'      : FuncResponseFile,      # 函数响应体（返回文件）
-            'RESP_LARGE_DATA': FuncResponseLargeData, # 函数响应题（大量数据）
+            'API'   : __export_as_api,            # 导出为API
+            'SRC'   : self.__data_source_helper,  # 数据源处理模块
+            'ENV'   : self.__env_variable_helper, # 环境变量处理模块
+            'CTX'   : self.__context_helper,      # 上下文处理模块
+            'STORE' : __store_helper,             # 存储处理模块
+            'CACHE' : __cache_helper,             # 缓存处理模块
+            'CONFIG': self.__config_helper,       # 配置处理模块
 
-            'FUNC'  : __call_func,     # 调用函数（新Task）
-            'THREAD': __thread_helper, # 多线程处理模块
+            'FUNC'    : __call_func,            # 调用函数（新Task或当前进程）
+            'FUNC_MAP': __call_func_map,        # 使用多组参数并行调用函数
+            'THREAD'  : self.__thread_helper,   # 多线程处理模块
+            'PROCESS' : self.__process_helper,  # 多进程处理模块
 
             'TASK': self, # 任务本身
 
             # 历史遗留
-            'list_data_sources': __list_data_sources, # 列出数据源
+            'list_data_sources': self.__data_source_helper.list, # 列出数据源
         }
-        # 增加小写别名
-        inject_func_names = list(inject_funcs.keys())
-        for k in inject_func_names:
-            inject_funcs[k.lower()] = inject_funcs[k]
+
+        inject_funcs = dict(inject_funcs_template)
+        for k, v in task_inject_funcs.items():
+            # 同时设置小写别名
+            inject_funcs[k] = inject_funcs[k.lower()] = v
 
         safe_scope['DFF'] = DFFWraper(inject_funcs=inject_funcs)
 
         return safe_scope
 
+    def rebind_safe_scope(self, safe_scope, script_dict=None, imported_script_dict=None, extra_vars=None):
+        '''
+        重新绑定安全脚本作用域中与当前任务相关的内容
+        用于复用已执行过的脚本作用域（Warm Module），无需重新执行脚本
+        '''
+        log_messages = []
+
+        if imported_script_dict is None:
+            imported_script_dict = {}
+
+        scopes = [ safe_scope ]
+        scopes += [ m.__dict__ for m in imported_script_dict.values() ]
+
+        for scope in scopes:
+            # 函数内的import使用当前的脚本字典，而非创建作用域时的脚本字典
+            if script_dict is not None and isinstance(scope.get('__builtins__'), dict):
+                scope['__builtins__']['__import__'] = self._create_custom_import(script_dict, imported_script_dict, scope)
+
+            if extra_vars:
+                for k, v in extra_vars.items():
+                    if k.startswith('_DFF_'):
+                        scope[k] = v
+
+            dff = scope.get('DFF')
+            if isinstance(dff, DFFWraper):
+                dff.log_messages = log_messages
+
+                if dff.inject_funcs:
+                    dff.inject_funcs['CTX']     = dff.inject_funcs['ctx']     = self.__context_helper
+                    dff.inject_funcs['ENV']     = dff.inject_funcs['env']     = self.__env_variable_helper
+                    dff.inject_funcs['THREAD']  = dff.inject_funcs['thread']  = self.__thread_helper
+                    dff.inject_funcs['PROCESS'] = dff.inject_funcs['process'] = self.__process_helper
+
+        return safe_scope
+
+    def _get_compiled_code_file_path(self, lru_key):
+        file_name = '{0}-{1}.code'.format(lru_key, importlib.util.MAGIC_NUMBER.hex())
+        return os.path.join(compiled_script_folder, file_name)
+
+    def _get_compiled_code_header(self, code_md5, code_dumps):
+        '''
+        编译结果文件头：Python magic number + 代码MD5 + 签名
+        签名使用系统私钥计算，防止资源目录中的文件被篡改后直接加载执行
+        '''
+        header = importlib.util.MAGIC_NUMBER + six.ensure_binary(code_md5)
+        sign   = hmac.new(six.ensure_binary(CONFIG['SECRET']), header + code_dumps, hashlib.sha256).digest()
+        return header + sign
+
+    def load_compiled_code_file(self, lru_key, code_md5):
+        '''
+        从文件中读取编译后的代码对象
+        文件头校验不通过（Python版本变化、代码变化或文件被篡改）时不加载
+        '''
+        file_path = self._get_compiled_code_file_path(lru_key)
+        if not os.path.exists(file_path):
+            return None
+
+        script_code_obj = None
+        try:
+            with open(file_path, 'rb') as _f:
+                file_data = _f.read()
+
+            header_length = len(self._get_compiled_code_header(code_md5, b''))
+
+            header     = file_data[:header_length]
+            code_dumps = file_data[header_length:]
+            if not hmac.compare_digest(header, self._get_compiled_code_header(code_md5, code_dumps)):
+                self.logger.warning('[LOAD COMPILED SCRIPT] Bad header, skipped: `{}`'.format(file_path))
+                return None
+
+            script_code_obj = marshal.loads(code_dumps)
+
+            # 更新修改时间，避免被自动清理
+            os.utime(file_path)
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.warning(line)
+
+            return None
+
+        return script_code_obj
+
+    def dump_compiled_code_file(self, lru_key, code_md5, script_code_obj):
+        '''
+        将编译后的代码对象写入文件
+        先写入临时文件再改名，避免多个进程同时读写时读取到不完整的文件
+        '''
+        file_path = self._get_compiled_code_file_path(lru_key)
+
+        tmp_file_path = None
+        try:
+            code_dumps = marshal.dumps(script_code_obj)
+
+            tmp_fd, tmp_file_path = tempfile.mkstemp(dir=compiled_script_folder, prefix='.tmp-')
+            with os.fdopen(tmp_fd, 'wb') as _f:
+                _f.write(self._get_compiled_code_header(code_md5, code_dumps))
+                _f.write(code_dumps)
+
+            os.replace(tmp_file_path, file_path)
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.warning(line)
+
+            if tmp_file_path and os.path.exists(tmp_file_path):
+                os.remove(tmp_file_path)
+
+    def compile_script(self, script):
+        lru_key = '{0}-{1}'.format(script['id'], script['codeMD5'])
+
+        # 优先从内存缓存中获取编译后的代码对象
+        script_code_obj = None
+        try:
+            script_code_obj = COMPILED_CODE_LRU[lru_key]
+        except KeyError as e:
+            pass
+
+        # 其次从文件缓存中获取编译后的代码对象
+        if not script_code_obj:
+            script_code_obj = self.load_compiled_code_file(lru_key, script['codeMD5'])
+            if script_code_obj:
+                COMPILED_CODE_LRU[lru_key] = script_code_obj
+                self.logger.debug('[LOAD COMPILED SCRIPT] {}'.format(script['id']))
+
+        if not script_code_obj:
+            script_code_obj = compile(script['code'], script['id'], 'exec')
+            COMPILED_CODE_LRU[lru_key] = script_code_obj
+            self.logger.info('[COMPILE SCRIPT] {}'.format(script['id']))
+
+            self.dump_compiled_code_file(lru_key, script['codeMD5'], script_code_obj)
+
+        return script_code_obj
+
     def create_script_dict(self, scripts):
+        '''
+        创建脚本字典
+        不包含`code`字段的脚本仅记录元数据，代码在首次使用时才加载并编译
+        '''
         script_dict = {}
         for s in scripts:
-            if not s.get('code'):
+            is_lazy = 'code' not in s
+            if not is_lazy and not s.get('code'):
                 continue
 
-            lru_key = '{0}-{1}'.format(s['id'], s['codeMD5'])
-
-            # 优先从内存缓存中获取编译后的代码对象
             script_code_obj = None
-            try:
-                script_code_obj = COMPILED_CODE_LRU[lru_key]
-            except KeyError as e:
-                pass
-
-            if not script_code_obj:
-                script_code_obj = compile(s['code'], s['id'], 'exec')
-                COMPILED_CODE_LRU[lru_key] = script_code_obj
-                self.logger.info('[COMPILE SCRIPT] {}'.format(s['id']))
+            if not is_lazy:
+                script_code_obj = self.compile_script(s)
 
             script_dict[s['id']] = {
                 'id'             : s['id'],
                 'publishVersion' : s['publishVersion'],
-                'code'           : s['code'],
+                'code'           : s.get('code'),
                 'codeMD5'        : s['codeMD5'],
                 'codeObj'        : script_code_obj,
                 'funcExtraConfig': s.get('funcExtraConfig') or {},
-                'scriptSetId'    : s['scriptSetId'],
+                'funcIntegration': s.get('funcIntegration') or {},
+                'scriptSetId'    : s.get('scriptSetId') or s['id'].split('__')[0],
             }
 
         self.script_dict = script_dict
 
         return script_dict
 
+    def get_script_code_obj(self, script):
+        '''
+        获取脚本编译后的代码对象
+        仅包含元数据的脚本，在此时从Redis（或数据库）加载代码并编译
+        '''
+        if script.get('codeObj') is not None:
+            return script['codeObj']
+
+        script_id = script['id']
+
+        loaded_scripts = self.get_cached_scripts([script_id])
+        if not loaded_scripts:
+            self.logger.warning('[SCRIPT CACHE] Cache missed! Use DB data: {}'.format(script_id))
+            loaded_scripts = self.get_scripts(script_ids=[script_id])
+
+        if not loaded_scripts or not loaded_scripts[0].get('code'):
+            return None
+
+        s = loaded_scripts[0]
+        script_code_obj = self.compile_script(s)
+
+        # 脚本字典中的条目在进程内共享，仅在代码与元数据一致时写回
+        # 不一致时（如加载期间脚本被重新发布），本次使用实际加载的代码，等待脚本缓存更新
+        if s['codeMD5'] != script['codeMD5']:
+            self.logger.warning('[SCRIPT CACHE] Code MD5 mismatched, skip caching code: {}'.format(script_id))
+            return script_code_obj
+
+        script.update({
+            'code'   : s['code'],
+            'codeObj': script_code_obj,
+        })
+
+        return script['codeObj']
+
     def safe_exec(self, script_code_obj, globals=None, locals=None, script_dict=None):
         safe_scope = globals or self.create_safe_scope(script_dict=script_dict)
         exec(script_code_obj, safe_scope)
 
         return safe_scope
 
-    def clean_up(self):
-        global THREAD_POOL
-        global THREAD_RESULT_MAP
+    def get_thread_cost(self):
+        '''
+        获取本次任务在多线程处理模块中运行的累计耗时
+        '''
+        return self.__thread_helper.thread_cost
 
-        # 关闭线程池
-        if THREAD_POOL:
-            self.logger.debug('[THREAD POOL] Clear')
+    def clean_up(self):
+        # 取消本次任务未完成的多线程、多进程调用，避免影响同一进程中的下一个任务
+        self.__thread_helper.cancel()
+        self.__process_helper.cancel()
 
-            THREAD_RESULT_MAP.clear()
+        self.__func_call_subscriber.close()
 
     def get_trace_info(self):
         '''
@@ -1693,7 +2970,9 @@ class ScriptBaseTask(BaseTask, ScriptCacherMixin):
 
 from worker.tasks.main.func_debugger   import func_debugger
 from worker.tasks.main.func_runner     import func_runner
+from worker.tasks.main.func_map_runner import func_map_runner
 from worker.tasks.main.crontab_starter import crontab_starter
+from worker.tasks.main.func_profiler   import func_profile
 
 from worker.tasks.main.utils import reload_scripts
 from worker.tasks.main.utils import sync_cache
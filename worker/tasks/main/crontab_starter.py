@@ -21,11 +21,12 @@ from worker.tasks import gen_task_id, webhook
 
 # Current Module
 from worker.tasks import BaseTask
+from worker.tasks.main import ScriptCacherMixin
 from worker.tasks.main.func_runner import func_runner
 
 CONFIG = yaml_resources.get('CONFIG')
 
-class CrontabStarterTask(BaseTask):
+class CrontabStarterTask(BaseTask, ScriptCacherMixin):
     # Crontab过滤器 - 向前筛选
     def crontab_config_filter(self, trigger_time, crontab_config):
         '''
@@ -89,24 +90,10 @@ class CrontabStarterTask(BaseTask):
         return crontab_config
 
     def get_integrated_func_crontab_configs(self):
-        sql = '''
-            SELECT
-                 `func`.`id`
-                ,`func`.`extraConfigJSON`
-            FROM `biz_main_func` AS `func`
-            WHERE
-                    `func`.`integration` = 'autoRun'
-                AND JSON_EXTRACT(`func`.`extraConfigJSON`, '$.integrationConfig.crontab') IS NOT NULL
-            '''
-        funcs = self.db.query(sql)
-
         crontab_configs = []
-        for f in funcs:
-            extra_config_json = f.get('extraConfigJSON')
-            if extra_config_json:
-                f['extraConfig'] = toolkit.json_loads(extra_config_json)
-            else:
-                f['extraConfig'] = {}
+        for f in self.get_func_registry().values():
+            if f['integration'] != 'autoRun':
+                continue
 
             crontab_expr = None
             try:
@@ -114,6 +101,9 @@ class CrontabStarterTask(BaseTask):
             except Exception as e:
                 continue
 
+            if crontab_expr is None:
+                continue
+
             c = {
                 'seq'            : 0,
                 'id'             : 'cron-AUTORUN',
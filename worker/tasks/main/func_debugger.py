@@ -8,7 +8,6 @@
 # Builtin Modules
 import time
 import traceback
-import pprint
 
 # 3rd-party Modules
 import six
@@ -111,6 +110,12 @@ def func_debugger(self, *args, **kwargs):
     start_time    = int(time.time())
     start_time_ms = int(time.time() * 1000)
 
+    # 排队等待时间（从触发时间或ETA到实际启动）
+    self.add_queue_wait_phase_cost(kwargs.get('triggerTimeMs'), start_time_ms)
+
+    # 内存使用
+    self.start_memory_usage()
+
     # HTTP请求
     http_request = kwargs.get('httpRequest') or {}
     if 'headers' in http_request:
@@ -157,14 +162,16 @@ def func_debugger(self, *args, **kwargs):
             '_DFF_HTTP_REQUEST'   : http_request,
         }
         self.logger.info('[CREATE SAFE SCOPE] `{}`'.format(script_id))
-        script_scope = self.create_safe_scope(
-            script_name=script_id,
-            script_dict=script_dict,
-            extra_vars=extra_vars)
+        with self.phase('createScope'):
+            script_scope = self.create_safe_scope(
+                script_name=script_id,
+                script_dict=script_dict,
+                extra_vars=extra_vars)
 
         # 加载代码
         self.logger.info('[LOAD SCRIPT] `{}`'.format(script_id))
-        script_scope = self.safe_exec(target_script['codeObj'], globals=script_scope)
+        with self.phase('execScript'):
+            script_scope = self.safe_exec(target_script['codeObj'], globals=script_scope)
 
         # 执行脚本
         if func_name:
@@ -175,7 +182,8 @@ def func_debugger(self, *args, **kwargs):
 
             # 执行函数
             self.logger.info('[RUN FUNC] `{}`'.format(func_id))
-            func_resp = entry_func(**func_call_kwargs)
+            with self.phase('entryCall'):
+                func_resp = self.call_entry_func(entry_func, func_call_kwargs, start_time=start_time)
             if not isinstance(func_resp, BaseFuncResponse):
                 func_resp = FuncResponse(func_resp)
 
@@ -211,6 +219,8 @@ def func_debugger(self, *args, **kwargs):
             result['logMessages'] = log_messages
 
         if func_name and func_resp:
+            result_serialization_start_time = time.perf_counter()
+
             # 准备函数运行结果
             func_result_raw        = None
             func_result_repr       = None
@@ -224,16 +234,13 @@ def func_debugger(self, *args, **kwargs):
                         self.logger.error(line)
 
                 try:
-                    func_result_repr = pprint.saferepr(func_resp.data)
+                    func_result_repr = self.get_func_result_repr(func_resp)
                 except Exception as e:
                     for line in traceback.format_exc().splitlines():
                         self.logger.error(line)
 
-                try:
-                    func_result_json_dumps = toolkit.json_dumps(func_resp.data, indent=None)
-                except Exception as e:
-                    for line in traceback.format_exc().splitlines():
-                        self.logger.error(line)
+                # 复用`FuncResponse`中已序列化的数据
+                func_result_json_dumps = func_resp.data_dumps
 
             result['funcResult'] = {
                 'raw'      : func_result_raw,
@@ -243,20 +250,27 @@ def func_debugger(self, *args, **kwargs):
                 '_responseControl': func_resp._create_response_control()
             }
 
+            self.add_phase_cost('resultSerialization', (time.perf_counter() - result_serialization_start_time) * 1000)
+
         if end_status == 'failure':
             trace_info = trace_info or self.get_trace_info()
             einfo_text = einfo_text or self.get_formated_einfo(trace_info, only_in_script=True)
 
         # 准备返回值
         retval = {
-            'result'   : result,
-            'traceInfo': trace_info,
-            'einfoTEXT': einfo_text,
-            'cost'     : time.time() - start_time,
+            'result'     : result,
+            'traceInfo'  : trace_info,
+            'einfoTEXT'  : einfo_text,
+            'cost'       : time.time() - start_time,
+            'phaseCosts' : self.phase_costs,
+            'memoryUsage': self.stop_memory_usage(),
         }
 
         # 清理资源
         self.clean_up()
 
+        # 检查内存限制
+        self.check_memory_recycle(func_id)
+
         # 返回函数结果
         return retval
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+'''
+脚本批量执行处理任务
+同一个函数使用多组参数调用时，只加载一次脚本，在一个任务内逐个执行
+'''
+
+# Builtin Modules
+import time
+import traceback
+
+# Project Modules
+from worker import app
+from worker.utils import toolkit, yaml_resources
+
+# Current Module
+from worker.tasks.main import NotFoundException, InvalidOptionException
+from worker.tasks.main import BaseFuncResponse, FuncResponse, FuncResponseLargeData
+from worker.tasks.main.func_runner import FuncRunnerTask
+
+CONFIG = yaml_resources.get('CONFIG')
+
+class FuncMapRunnerTask(FuncRunnerTask):
+    def run_map_item(self, entry_func, index, func_call_kwargs, return_type=None):
+        '''
+        执行单组参数
+        单组参数执行失败不影响其他参数执行，错误信息作为结果返回
+        '''
+        start_time = time.time()
+
+        item = {
+            'index': index,
+        }
+        try:
+            func_resp = self.call_entry_func(entry_func, func_call_kwargs)
+            if not isinstance(func_resp, BaseFuncResponse):
+                func_resp = FuncResponse(func_resp)
+
+            if isinstance(func_resp.data, Exception):
+                raise func_resp.data
+
+            if isinstance(func_resp, FuncResponseLargeData):
+                func_resp.cache_to_file(auto_delete=True)
+
+        except Exception as e:
+            self.logger.warning('[RUN MAP ITEM] #{} failed: {}'.format(index, repr(e)))
+
+            item['isFailed'] = True
+            item['error']    = '{}: {}'.format(e.__class__.__name__, str(e))
+
+        else:
+            item['isFailed'] = False
+            item['result']   = self.create_func_result(func_resp, return_type)
+
+        item['cost'] = time.time() - start_time
+        return item
+
+    def stream_map_item(self, result_key, item):
+        self.cache_db.rpush(result_key, toolkit.json_dumps(item, indent=None))
+        self.cache_db.expire(result_key, CONFIG['_FUNC_TASK_MAP_RESULT_EXPIRES'])
+
+@app.task(name='Main.FuncMapRunner', bind=True, base=FuncMapRunnerTask, ignore_result=True)
+def func_map_runner(self, *args, **kwargs):
+    # 执行函数、参数列表
+    func_id               = kwargs.get('funcId')
+    func_call_kwargs_list = kwargs.get('funcCallKwargsList') or []
+
+    script_set_id = func_id.split('__')[0]
+    script_id     = func_id.split('.')[0]
+    func_name     = func_id[len(script_id) + 1:]
+
+    self.logger.info('Main.FuncMapRunner Task launched: `{}` x {}'.format(func_id, len(func_call_kwargs_list)))
+
+    if len(func_call_kwargs_list) > CONFIG['_FUNC_TASK_MAP_MAX_KWARGS_COUNT']:
+        e = InvalidOptionException('Too many kwargs, max count is {}'.format(CONFIG['_FUNC_TASK_MAP_MAX_KWARGS_COUNT']))
+        raise e
+
+    # 来源
+    origin    = kwargs.get('origin')
+    origin_id = kwargs.get('originId')
+
+    # 顶层任务ID
+    root_task_id = kwargs.get('rootTaskId') or self.request.id
+
+    # 函数链
+    func_chain = kwargs.get('funcChain') or []
+    func_chain.append(func_id)
+
+    # 执行模式
+    exec_mode = kwargs.get('execMode') or 'sync'
+
+    # 启动时间
+    start_time    = int(time.time())
+    start_time_ms = int(time.time() * 1000)
+
+    # 内存使用
+    self.start_memory_usage()
+
+    # HTTP请求
+    http_request = kwargs.get('httpRequest') or {}
+    if 'headers' in http_request:
+        http_request['headers'] = toolkit.IgnoreCaseDict(http_request['headers'])
+
+    # 调用方所需的返回类型（`raw`, `repr`, `jsonDumps`, `ALL`），未指定时生成全部内容
+    return_type = kwargs.get('returnType')
+
+    # 是否流式输出结果（逐个写入Redis列表，任务只返回汇总信息）
+    stream_result = kwargs.get('streamResult') or False
+    result_key    = None
+    if stream_result:
+        result_key = toolkit.get_cache_key('cache', 'funcMapResult', tags=['taskId', self.request.id])
+
+    # 执行结果、汇总、上下文、跟踪信息、错误堆栈
+    items         = []
+    succeed_count = 0
+    fail_count    = 0
+    costs         = []
+    script_scope  = None
+    log_messages  = None
+    trace_info    = None
+    einfo_text    = None
+
+    # 被强行Kill时，不会进入except范围，所以默认制定为"failure"
+    end_status = 'failure'
+
+    target_script = None
+    try:
+        # 记录任务信息（运行中）
+        self.cache_task_status(
+            origin=origin,
+            origin_id=origin_id,
+            exec_mode=exec_mode,
+            status='pending',
+            func_id=func_id)
+
+        # 更新脚本缓存
+        self.update_script_dict_cache()
+        target_script = self.get_cached_script(script_id)
+
+        # 脚本代码按需加载
+        if not target_script or not self.get_script_code_obj(target_script):
+            e = NotFoundException('Script `{}` not found'.format(script_id))
+            raise e
+
+        extra_vars = {
+            '_DFF_DEBUG'          : False,
+            '_DFF_ROOT_TASK_ID'   : root_task_id,
+            '_DFF_SCRIPT_SET_ID'  : script_set_id,
+            '_DFF_SCRIPT_ID'      : script_id,
+            '_DFF_FUNC_ID'        : func_id,
+            '_DFF_FUNC_NAME'      : func_name,
+            '_DFF_FUNC_CHAIN'     : func_chain,
+            '_DFF_ORIGIN'         : origin,
+            '_DFF_ORIGIN_ID'      : origin_id,
+            '_DFF_EXEC_MODE'      : exec_mode,
+            '_DFF_START_TIME'     : start_time,
+            '_DFF_START_TIME_MS'  : start_time_ms,
+            '_DFF_TRIGGER_TIME'   : kwargs.get('triggerTime') or start_time,
+            '_DFF_TRIGGER_TIME_MS': kwargs.get('triggerTimeMs') or start_time_ms,
+            '_DFF_CRONTAB'        : kwargs.get('crontab'),
+            '_DFF_CRONTAB_DELAY'  : kwargs.get('crontabDelay'),
+            '_DFF_QUEUE'          : self.queue,
+            '_DFF_WORKER_QUEUE'   : self.worker_queue,
+            '_DFF_HTTP_REQUEST'   : http_request,
+        }
+        script_scope = self.load_script_scope(target_script, func_id, extra_vars)
+
+        # 执行脚本
+        entry_func = script_scope.get(func_name)
+        if not entry_func:
+            e = NotFoundException('Function `{}` not found in `{}`'.format(func_name, script_id))
+            raise e
+
+        # 逐个执行函数
+        # 注意：各组参数共用同一个脚本作用域，因此只能依次执行
+        self.logger.info('[RUN FUNC MAP] `{}` x {}'.format(func_id, len(func_call_kwargs_list)))
+
+        def on_item_done(item):
+            nonlocal succeed_count
+            nonlocal fail_count
+
+            if item['isFailed']:
+                fail_count += 1
+            else:
+                succeed_count += 1
+
+            costs.append(item.pop('cost'))
+
+            if stream_result:
+                self.stream_map_item(result_key, item)
+            else:
+                items.append(item)
+
+        for index, func_call_kwargs in enumerate(func_call_kwargs_list):
+            on_item_done(self.run_map_item(entry_func, index, func_call_kwargs, return_type))
+
+    except Exception as e:
+        for line in traceback.format_exc().splitlines():
+            self.logger.error(line)
+
+        end_status = 'failure'
+
+        self.logger.error('Error occured in script. `{}`'.format(func_id))
+
+        trace_info = self.get_trace_info()
+        einfo_text = self.get_formated_einfo(trace_info, only_in_script=True)
+
+        raise
+
+    else:
+        end_status = 'success'
+
+    finally:
+        memory_usage = self.stop_memory_usage()
+
+        # 记录脚本日志
+        if script_scope:
+            log_messages = script_scope['DFF'].log_messages or None
+
+            self.cache_script_log(
+                func_id=func_id,
+                script_publish_version=target_script['publishVersion'],
+                log_messages=log_messages,
+                exec_mode=exec_mode)
+
+        if target_script:
+            # 记录函数运行故障
+            if end_status == 'failure':
+                trace_info = trace_info or self.get_trace_info()
+                einfo_text = einfo_text or self.get_formated_einfo(trace_info, only_in_script=True)
+
+                self.cache_script_failure(
+                    func_id=func_id,
+                    script_publish_version=target_script['publishVersion'],
+                    exec_mode=exec_mode,
+                    einfo_text=einfo_text,
+                    trace_info=trace_info)
+
+            # 记录函数运行信息（批量执行汇总为一条）
+            if costs:
+                self.cache_running_info(
+                    func_id=func_id,
+                    script_publish_version=target_script['publishVersion'],
+                    exec_mode=exec_mode,
+                    is_failed=(fail_count > 0),
+                    cost=sum(costs) / len(costs),
+                    succeed_count=succeed_count,
+                    fail_count=fail_count,
+                    min_cost=min(costs),
+                    max_cost=max(costs),
+                    total_cost=sum(costs),
+                    thread_cost=self.get_thread_cost(),
+                    memory_usage=memory_usage)
+
+            else:
+                self.cache_running_info(
+                    func_id=func_id,
+                    script_publish_version=target_script['publishVersion'],
+                    exec_mode=exec_mode,
+                    is_failed=(end_status == 'failure'),
+                    cost=time.time() - start_time,
+                    thread_cost=self.get_thread_cost(),
+                    memory_usage=memory_usage)
+
+        # 缓存任务状态
+        self.cache_task_status(
+            origin=origin,
+            origin_id=origin_id,
+            exec_mode=exec_mode,
+            status=end_status,
+            func_id=func_id,
+            script_publish_version=target_script['publishVersion'] if target_script else None,
+            log_messages=log_messages,
+            einfo_text=einfo_text)
+
+        # 清理资源
+        self.clean_up()
+
+        # 检查内存限制
+        self.check_memory_recycle(func_id)
+
+    # 返回执行结果
+    result = {
+        'succeedCount': succeed_count,
+        'failCount'   : fail_count,
+    }
+    if stream_result:
+        result['resultKey'] = result_key
+    else:
+        result['items'] = items
+
+    return result
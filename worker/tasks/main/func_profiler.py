@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+'''
+函数性能分析
+通过Redis中的开关，对指定函数接下来的N次调用进行性能分析
+分析数据汇总后通过 Main.FuncProfile 任务获取
+
+支持两种模式：
+    cProfile: 使用cProfile，输出pstats格式
+    sample  : 使用低开销栈采样，输出折叠栈（collapsed stack）格式
+'''
+
+# Builtin Modules
+import io
+import sys
+import time
+import base64
+import marshal
+import pstats
+import cProfile
+import threading
+import traceback
+from collections import Counter
+
+# 3rd-party Modules
+import six
+
+# Project Modules
+from worker import app
+from worker.utils import toolkit, yaml_resources
+
+# Current Module
+from worker.tasks import BaseTask
+from worker.tasks.main import ScriptCacherMixin, InvalidOptionException
+
+CONFIG = yaml_resources.get('CONFIG')
+
+PROFILE_MODES = ('cProfile', 'sample')
+
+# 本地缓存的性能分析开关
+# 结构如下：{ "<函数ID>": { "mode": "<模式>", "expireTime": <过期时间戳> } }
+PROFILE_SWITCH_MAP             = {}
+PROFILE_SWITCH_CHECK_TIMESTAMP = 0
+
+def get_profile_switch_cache_key():
+    return toolkit.get_cache_key('cache', 'funcProfileSwitch')
+
+def get_profile_remaining_cache_key(func_id):
+    return toolkit.get_cache_key('cache', 'funcProfileRemaining', tags=['funcId', func_id])
+
+def get_profile_data_cache_key(func_id, mode):
+    return toolkit.get_cache_key('cache', 'funcProfileData', tags=['funcId', func_id, 'mode', mode])
+
+def is_script_file(filename):
+    # 与`get_trace_info()`判断方式相同
+    return not filename.endswith('.py') and '__' in filename
+
+class _PStatsData(object):
+    '''
+    用于将已汇总的统计数据加载为`pstats.Stats`
+    '''
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+class StackSampler(object):
+    '''
+    低开销栈采样器
+    后台线程定期采样目标线程的调用栈，只保留从脚本代码开始的部分
+    '''
+    def __init__(self, interval=None, thread_id=None):
+        self.interval  = interval or CONFIG['_FUNC_TASK_PROFILE_SAMPLE_INTERVAL']
+        self.thread_id = thread_id or threading.get_ident()
+
+        self.stack_counts = Counter()
+
+        self.__stop_event = threading.Event()
+        self.__thread     = None
+
+    def _format_frame(self, frame):
+        filename = frame.f_code.co_filename
+        funcname = frame.f_code.co_name
+
+        if is_script_file(filename):
+            return '{} ({}:{})'.format(funcname, filename, frame.f_lineno)
+        else:
+            return '{} ({})'.format(funcname, filename)
+
+    def _sample(self):
+        while not self.__stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+
+            # 从最外层的脚本代码开始记录
+            stack = []
+            for f in reversed(frames):
+                if not stack and not is_script_file(f.f_code.co_filename):
+                    continue
+
+                stack.append(self._format_frame(f))
+
+            if stack:
+                self.stack_counts[';'.join(stack)] += 1
+
+    def start(self):
+        self.__thread = threading.Thread(target=self._sample, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop_event.set()
+        if self.__thread:
+            self.__thread.join()
+
+class FuncProfilerMixin(object):
+    def get_func_profile_mode(self, func_id):
+        '''
+        获取函数当前调用需要使用的性能分析模式，不需要分析时返回`None`
+        开关在本地缓存，按间隔从Redis刷新，仅在开关打开时才消耗剩余次数
+        '''
+        global PROFILE_SWITCH_MAP
+        global PROFILE_SWITCH_CHECK_TIMESTAMP
+
+        now = time.time()
+        if now - PROFILE_SWITCH_CHECK_TIMESTAMP > CONFIG['_FUNC_TASK_PROFILE_SWITCH_CHECK_INTERVAL']:
+            PROFILE_SWITCH_CHECK_TIMESTAMP = now
+
+            next_profile_switch_map = {}
+            for k, v in self.cache_db.hgetall(get_profile_switch_cache_key()).items():
+                try:
+                    next_profile_switch_map[k] = toolkit.json_loads(six.ensure_str(v))
+                except Exception as e:
+                    for line in traceback.format_exc().splitlines():
+                        self.logger.error(line)
+
+            PROFILE_SWITCH_MAP = next_profile_switch_map
+
+        profile_switch = PROFILE_SWITCH_MAP.get(func_id)
+        if not profile_switch or profile_switch['expireTime'] < now:
+            return None
+
+        # 分析停止后剩余次数Key已被删除，不能重新创建
+        remaining = self.cache_db.decr_if_exists(get_profile_remaining_cache_key(func_id))
+        if remaining is None or remaining < 0:
+            return None
+
+        return profile_switch['mode']
+
+    def profile_func_call(self, func_id, mode, F):
+        '''
+        执行并分析函数调用，分析数据追加到Redis
+        '''
+        # 注意：函数抛出错误时同样记录分析数据
+        if mode == 'cProfile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return F()
+
+            finally:
+                profiler.disable()
+                profiler.create_stats()
+
+                profile_data = base64.b64encode(marshal.dumps(profiler.stats)).decode()
+                self.save_func_profile_data(func_id, mode, profile_data)
+
+        else:
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                return F()
+
+            finally:
+                sampler.stop()
+
+                profile_data = toolkit.json_dumps(sampler.stack_counts, indent=None)
+                self.save_func_profile_data(func_id, mode, profile_data)
+
+    def save_func_profile_data(self, func_id, mode, profile_data):
+        try:
+            self._save_func_profile_data(func_id, mode, profile_data)
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.error(line)
+
+    def _save_func_profile_data(self, func_id, mode, profile_data):
+        cache_key = get_profile_data_cache_key(func_id, mode)
+
+        self.cache_db.rpush(cache_key, profile_data)
+        self.cache_db.ltrim(cache_key, -1 * CONFIG['_FUNC_TASK_PROFILE_DATA_MAX_COUNT'], -1)
+        self.cache_db.expire(cache_key, CONFIG['_FUNC_TASK_PROFILE_EXPIRES'])
+
+class FuncProfileTask(BaseTask, ScriptCacherMixin):
+    def start_profile(self, func_id, mode, count, expires):
+        expire_time = int(time.time()) + expires
+
+        self.cache_db.setex(get_profile_remaining_cache_key(func_id), expires, count)
+        self.cache_db.delete(get_profile_data_cache_key(func_id, mode))
+
+        profile_switch = {
+            'mode'      : mode,
+            'expireTime': expire_time,
+        }
+        self.cache_db.hset(get_profile_switch_cache_key(), func_id, toolkit.json_dumps(profile_switch, indent=None))
+
+    def stop_profile(self, func_id):
+        self.cache_db.hdel(get_profile_switch_cache_key(), [func_id])
+        self.cache_db.delete(get_profile_remaining_cache_key(func_id))
+
+    def get_script_code_lines_map(self, script_ids):
+        script_code_lines_map = {}
+        for s in self.get_cached_scripts(script_ids):
+            script_code_lines_map[s['id']] = (s.get('code') or '').splitlines()
+
+        return script_code_lines_map
+
+    def get_cprofile_result(self, func_id, sort_by=None, limit=None):
+        sort_by = sort_by or 'cumulative'
+        if sort_by not in pstats.Stats.sort_arg_dict_default:
+            e = InvalidOptionException('`sortBy` should be one of {}'.format(', '.join(sorted(pstats.Stats.sort_arg_dict_default.keys()))))
+            raise e
+
+        limit = limit or 50
+        try:
+            limit = int(limit)
+        except (ValueError, TypeError):
+            e = InvalidOptionException('`limit` should be an integer')
+            raise e
+
+        if limit <= 0:
+            e = InvalidOptionException('`limit` should be greater than 0')
+            raise e
+
+        cache_res = self.cache_db.lrange(get_profile_data_cache_key(func_id, 'cProfile'), 0, -1)
+        if not cache_res:
+            return None
+
+        # 汇总多次调用的统计数据
+        output = io.StringIO()
+        stats = None
+        for profile_data in cache_res:
+            profile_data = _PStatsData(marshal.loads(base64.b64decode(profile_data)))
+            if stats is None:
+                stats = pstats.Stats(profile_data, stream=output)
+            else:
+                stats.add(profile_data)
+
+        stats.sort_stats(sort_by).print_stats(limit)
+
+        # 脚本内的函数对应到脚本ID及行号
+        script_ids = set([ k[0] for k in stats.stats.keys() if is_script_file(k[0]) ])
+        script_code_lines_map = self.get_script_code_lines_map(script_ids)
+
+        script_frames = []
+        for k in stats.fcn_list[:limit]:
+            filename, line_number, funcname = k
+            if not is_script_file(filename):
+                continue
+
+            cc, nc, tt, ct, callers = stats.stats[k]
+
+            line_code = ''
+            script_code_lines = script_code_lines_map.get(filename) or []
+            if line_number and len(script_code_lines) >= line_number:
+                line_code = script_code_lines[line_number - 1].strip()
+
+            script_frames.append({
+                'scriptId'      : filename,
+                'lineNumber'    : line_number,
+                'lineCode'      : line_code,
+                'funcname'      : funcname,
+                'callCount'     : nc,
+                'totalTime'     : tt,
+                'cumulativeTime': ct,
+            })
+
+        result = {
+            'mode'        : 'cProfile',
+            'profileCount': len(cache_res),
+            'pstats'      : output.getvalue(),
+            'scriptFrames': script_frames,
+        }
+        return result
+
+    def get_sample_result(self, func_id):
+        cache_res = self.cache_db.lrange(get_profile_data_cache_key(func_id, 'sample'), 0, -1)
+        if not cache_res:
+            return None
+
+        # 汇总多次调用的采样数据
+        stack_counts = Counter()
+        for profile_data in cache_res:
+            stack_counts.update(toolkit.json_loads(six.ensure_str(profile_data)))
+
+        collapsed_stacks = [ '{} {}'.format(stack, count) for stack, count in stack_counts.most_common() ]
+
+        result = {
+            'mode'           : 'sample',
+            'profileCount'   : len(cache_res),
+            'sampleCount'    : sum(stack_counts.values()),
+            'collapsedStacks': '\n'.join(collapsed_stacks),
+        }
+        return result
+
+@app.task(name='Main.FuncProfile', bind=True, base=FuncProfileTask)
+def func_profile(self, *args, **kwargs):
+    self.logger.info('Main.FuncProfile Task launched.')
+
+    action  = kwargs.get('action') or 'get'
+    func_id = kwargs.get('funcId')
+    mode    = kwargs.get('mode')   or 'cProfile'
+
+    if mode not in PROFILE_MODES:
+        e = InvalidOptionException('`mode` should be one of {}'.format(', '.join(PROFILE_MODES)))
+        raise e
+
+    # 开始分析
+    if action == 'start':
+        count   = int(kwargs.get('count')   or 10)
+        expires = int(kwargs.get('expires') or CONFIG['_FUNC_TASK_PROFILE_EXPIRES'])
+
+        self.start_profile(func_id, mode, count, expires)
+
+    # 停止分析
+    elif action == 'stop':
+        self.stop_profile(func_id)
+
+    # 获取分析结果
+    elif action == 'get':
+        if mode == 'cProfile':
+            return self.get_cprofile_result(func_id, sort_by=kwargs.get('sortBy'), limit=kwargs.get('limit'))
+        else:
+            return self.get_sample_result(func_id)
+
+    else:
+        e = InvalidOptionException('`action` should be one of start, stop, get')
+        raise e
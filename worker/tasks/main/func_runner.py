@@ -6,32 +6,236 @@
 '''
 
 # Builtin Modules
+import os
 import time
+import math
 import traceback
-import pprint
+import threading
+from collections import OrderedDict
 
 # 3rd-party Modules
+from celery import signals
 import celery.states as celery_status
 import six
 import simplejson as json
+import pylru
 
 # Project Modules
 from worker import app
 from worker.utils import toolkit, yaml_resources
 from worker.tasks import gen_task_id, webhook
 from worker.tasks import BaseResultSavingTask
+from worker.utils.log_helper import LogHelper
+from worker.utils.extra_helpers import RedisHelper
 
 # Current Module
 from worker.tasks import BaseTask
-from worker.tasks.main import DataFluxFuncBaseException, NotFoundException, NotFoundException
+from worker.tasks.main import DataFluxFuncBaseException, NotFoundException
 from worker.tasks.main import ScriptBaseTask
 from worker.tasks.main import BaseFuncResponse, FuncResponse, FuncResponseFile, FuncResponseLargeData
+from worker.tasks.main.func_profiler import FuncProfilerMixin
 
 CONFIG = yaml_resources.get('CONFIG')
 
 SCRIPTS_CACHE_MD5 = None
 SCRIPT_DICT_CACHE = None
 
+# 脚本更新通知
+SCRIPTS_UPDATE_SUBSCRIBER     = None
+SCRIPTS_UPDATE_NOTIFIED       = False
+SCRIPTS_CACHE_CHECK_TIMESTAMP = 0
+
+# 已执行的脚本模块缓存（Warm Module）
+WARM_MODULE_LRU = pylru.lrucache(max(CONFIG['_FUNC_TASK_WARM_MODULE_CACHE_MAX_SIZE'], 1))
+
+# 函数运行信息进程内汇总，定期合并写入Redis
+# 结构如下：{ <分钟时间戳>: { "<函数ID>~<脚本发布版本>~<执行模式>": { ...汇总数据 } } }
+RUNNING_INFO_AGG_LOCK        = threading.Lock()
+RUNNING_INFO_AGG_MAP         = {}
+RUNNING_INFO_AGG_FLUSHER_PID = None
+
+# 函数运行信息写入使用独立的日志及Redis连接，不依赖任务实例
+RUNNING_INFO_LOGGER   = LogHelper()
+RUNNING_INFO_CACHE_DB = RedisHelper(logger=RUNNING_INFO_LOGGER)
+RUNNING_INFO_CACHE_DB.skip_log = True
+
+def merge_back_running_info_agg(agg_map):
+    '''
+    将写入失败的函数运行信息合并回进程内汇总，等待下次写入
+    超过保留时间的数据直接丢弃
+    '''
+    expire_timestamp = time.time() - CONFIG['_FUNC_TASK_RUNNING_INFO_AGG_EXPIRES']
+
+    with RUNNING_INFO_AGG_LOCK:
+        for minute_timestamp, minute_agg_map in agg_map.items():
+            if minute_timestamp < expire_timestamp:
+                continue
+
+            current_minute_agg_map = RUNNING_INFO_AGG_MAP.setdefault(minute_timestamp, {})
+            for pk, agg in minute_agg_map.items():
+                current_agg = current_minute_agg_map.get(pk)
+                if current_agg is None:
+                    current_minute_agg_map[pk] = agg
+                    continue
+
+                current_agg['succeedCount'] += agg['succeedCount']
+                current_agg['failCount']    += agg['failCount']
+                current_agg['minCost']      = min(current_agg['minCost'], agg['minCost'])
+                current_agg['maxCost']      = max(current_agg['maxCost'], agg['maxCost'])
+                current_agg['totalCost']    += agg['totalCost']
+                current_agg['threadCost']   += agg['threadCost']
+                current_agg['timestamp']    = max(current_agg['timestamp'], agg['timestamp'])
+
+                for phase, phase_cost in agg['phaseCosts'].items():
+                    current_agg['phaseCosts'][phase] = current_agg['phaseCosts'].get(phase, 0.0) + phase_cost
+
+                for k, v in agg['memoryUsage'].items():
+                    current_agg['memoryUsage'][k] = max(current_agg['memoryUsage'].get(k, v), v)
+
+def start_running_info_flusher():
+    '''
+    启动当前进程的函数运行信息写入线程
+    '''
+    global RUNNING_INFO_AGG_FLUSHER_PID
+
+    pid = os.getpid()
+
+    with RUNNING_INFO_AGG_LOCK:
+        if RUNNING_INFO_AGG_FLUSHER_PID == pid:
+            return
+
+        RUNNING_INFO_AGG_FLUSHER_PID = pid
+
+    def _flusher():
+        while True:
+            time.sleep(CONFIG['_FUNC_TASK_RUNNING_INFO_FLUSH_INTERVAL'])
+
+            try:
+                flush_running_info()
+
+            except Exception as e:
+                for line in traceback.format_exc().splitlines():
+                    RUNNING_INFO_LOGGER.error(line)
+
+    t = threading.Thread(target=_flusher, daemon=True)
+    t.start()
+
+def flush_running_info():
+    '''
+    将进程内汇总的函数运行信息合并写入Redis
+    每分钟一个哈希表，字段为"<函数ID>~<脚本发布版本>~<执行模式>~<指标>"
+    写入失败时数据合并回进程内汇总，等待下次写入
+
+    注意：进程被强制结束（如SIGKILL、超过time_limit）时，
+    尚未写入的数据（最多一个写入间隔）会丢失
+    '''
+    global RUNNING_INFO_AGG_MAP
+
+    with RUNNING_INFO_AGG_LOCK:
+        agg_map = RUNNING_INFO_AGG_MAP
+        RUNNING_INFO_AGG_MAP = {}
+
+    if not agg_map:
+        return
+
+    keys_cache_key = toolkit.get_cache_key('syncCache', 'funcRunningInfoAggKeys')
+
+    # 按分钟写入，每分钟的数据与索引在同一事务中写入
+    pending_minute_timestamps = sorted(agg_map.keys())
+    try:
+        while pending_minute_timestamps:
+            minute_timestamp = pending_minute_timestamps[0]
+            _flush_minute_running_info(keys_cache_key, minute_timestamp, agg_map[minute_timestamp])
+
+            pending_minute_timestamps.pop(0)
+
+    except Exception as e:
+        merge_back_running_info_agg(dict([ (ts, agg_map[ts]) for ts in pending_minute_timestamps ]))
+        raise
+
+def _flush_minute_running_info(keys_cache_key, minute_timestamp, minute_agg_map):
+    incr_fields = {}
+    max_fields  = {}
+    min_fields  = {}
+    set_fields  = {}
+
+    for pk, agg in minute_agg_map.items():
+        incr_fields[pk + '~succeedCount'] = agg['succeedCount']
+        incr_fields[pk + '~failCount']    = agg['failCount']
+        incr_fields[pk + '~totalCost']    = float(agg['totalCost'])
+
+        if agg['threadCost']:
+            incr_fields[pk + '~threadCost'] = float(agg['threadCost'])
+
+        for phase, phase_cost in agg['phaseCosts'].items():
+            incr_fields[pk + '~phaseCost~' + phase] = float(phase_cost)
+
+        max_fields[pk + '~maxCost']   = agg['maxCost']
+        max_fields[pk + '~timestamp'] = agg['timestamp']
+
+        for k, v in agg['memoryUsage'].items():
+            max_fields[pk + '~memoryUsage~' + k] = v
+
+        min_fields[pk + '~minCost'] = agg['minCost']
+
+        set_fields[pk + '~latestCost'] = agg['latestCost']
+
+    cache_key = toolkit.get_cache_key('syncCache', 'funcRunningInfoAgg', tags=['timestamp', minute_timestamp])
+    RUNNING_INFO_CACHE_DB.hmerge(cache_key,
+            incr_fields=incr_fields,
+            max_fields=max_fields,
+            min_fields=min_fields,
+            set_fields=set_fields,
+            expires=CONFIG['_FUNC_TASK_RUNNING_INFO_AGG_EXPIRES'],
+            index_key=keys_cache_key)
+
+class FuncResultLRU(object):
+    '''
+    进程内函数运行结果缓存
+    同时限制条目数量和总字节数，条目过期时间与Redis中一致
+    '''
+    def __init__(self, max_size, max_bytes):
+        self.max_size  = max_size
+        self.max_bytes = max_bytes
+
+        self.total_bytes = 0
+        self.cache       = OrderedDict() # Key -> (Expire Time, Value)
+
+    def get(self, key):
+        item = self.cache.get(key)
+        if item is None:
+            return None
+
+        expire_time, value = item
+        if expire_time <= time.time():
+            self.delete(key)
+            return None
+
+        self.cache.move_to_end(key)
+        return value
+
+    def set(self, key, value, max_age):
+        if max_age <= 0 or len(value) > self.max_bytes:
+            return
+
+        self.delete(key)
+
+        self.cache[key] = (time.time() + max_age, value)
+        self.total_bytes += len(value)
+
+        while len(self.cache) > self.max_size or self.total_bytes > self.max_bytes:
+            _, (_, ejected_value) = self.cache.popitem(last=False)
+            self.total_bytes -= len(ejected_value)
+
+    def delete(self, key):
+        item = self.cache.pop(key, None)
+        if item is not None:
+            self.total_bytes -= len(item[1])
+
+FUNC_RESULT_LRU = FuncResultLRU(
+    max_size=CONFIG['_FUNC_TASK_RESULT_LRU_MAX_SIZE'],
+    max_bytes=CONFIG['_FUNC_TASK_RESULT_LRU_MAX_BYTES'])
+
 @app.task(name='Main.FuncRunner.Result', bind=True, base=BaseResultSavingTask, ignore_result=True)
 def result_saving_task(self, task_id, name, origin, start_time, end_time, args, kwargs, retval, status, einfo_text):
     options = kwargs or {}
@@ -60,7 +264,7 @@ def result_saving_task(self, task_id, name, origin, start_time, end_time, args,
     sql_params = (task_id, name, origin, start_time, end_time, args_json, kwargs_json, retval_json, status, einfo_text)
     self.db.query(sql, sql_params)
 
-class FuncRunnerTask(ScriptBaseTask):
+class FuncRunnerTask(ScriptBaseTask, FuncProfilerMixin):
     '''
     由于绝大部分的调用都直接返回给前端，
     因此只要保存失败案例即可。
@@ -69,95 +273,337 @@ class FuncRunnerTask(ScriptBaseTask):
     # _success_result_saving_task = result_saving_task
     # _failure_result_saving_task = result_saving_task
 
+    def subscribe_scripts_update(self):
+        '''
+        订阅脚本更新通知
+        每个进程启动一个订阅线程，进程Fork或连接断开后自动重新订阅
+        '''
+        global SCRIPTS_UPDATE_SUBSCRIBER
+        global SCRIPTS_UPDATE_NOTIFIED
+
+        pid = os.getpid()
+        if SCRIPTS_UPDATE_SUBSCRIBER:
+            subscriber_pid, subscriber_thread = SCRIPTS_UPDATE_SUBSCRIBER
+            if subscriber_pid == pid and subscriber_thread.is_alive():
+                return True
+
+        def on_message(message):
+            global SCRIPTS_UPDATE_NOTIFIED
+            SCRIPTS_UPDATE_NOTIFIED = True
+
+        try:
+            channel = toolkit.get_cache_key('broadcast', 'scriptsUpdated')
+
+            pubsub = self.cache_db.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{ channel: on_message })
+            subscriber_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.warning(line)
+
+            SCRIPTS_UPDATE_SUBSCRIBER = None
+            return False
+
+        else:
+            SCRIPTS_UPDATE_SUBSCRIBER = (pid, subscriber_thread)
+
+            # 订阅前可能已发生变化，需要检查一次
+            SCRIPTS_UPDATE_NOTIFIED = True
+            return True
+
+    def load_script_dict_cache(self, use_db=True, materialize=False):
+        '''
+        从Redis增量加载脚本字典缓存
+        只更新 codeMD5 / publishVersion 发生变化的脚本
+        默认只加载脚本元数据，代码在首次使用时再加载并编译
+        Redis中无脚本清单时返回False
+        '''
+        global SCRIPTS_CACHE_MD5
+        global SCRIPT_DICT_CACHE
+
+        cache_key_script_md5 = toolkit.get_cache_key('fixedCache', 'scriptsMD5')
+
+        scripts_md5 = self.cache_db.get(cache_key_script_md5)
+        if not scripts_md5:
+            return False
+
+        scripts_md5 = six.ensure_str(scripts_md5)
+        if scripts_md5 == SCRIPTS_CACHE_MD5:
+            # 存在缓存，且MD5未发生变化，不更新本地缓存
+            self.logger.debug('[SCRIPT CACHE] Not Modified, extend local cache')
+            return True
+
+        script_manifest = self.get_cached_script_manifest()
+        if script_manifest is None:
+            return False
+
+        # 对比脚本清单，保留未变化的脚本
+        prev_script_dict = SCRIPT_DICT_CACHE or {}
+        next_script_dict = {}
+
+        changed_script_ids = []
+        for script_id, script_meta in script_manifest.items():
+            prev_script = prev_script_dict.get(script_id)
+            if prev_script \
+                    and prev_script['codeMD5']        == script_meta['codeMD5'] \
+                    and prev_script['publishVersion'] == script_meta['publishVersion']:
+                next_script_dict[script_id] = prev_script
+            else:
+                changed_script_ids.append(script_id)
+
+        # 仅获取发生变化的脚本
+        if changed_script_ids:
+            self.logger.debug('[SCRIPT CACHE] Modified, Reload {} script(s) from Redis cache'.format(len(changed_script_ids)))
+
+            scripts = None
+            if materialize:
+                scripts = self.get_cached_scripts(changed_script_ids)
+
+                # Redis中缺失的脚本，直接从数据库获取（极少情况）
+                missed_script_ids = set(changed_script_ids) - set([s['id'] for s in scripts])
+                if missed_script_ids:
+                    if not use_db:
+                        return False
+
+                    self.logger.warning('[SCRIPT CACHE] Cache missed! Use DB data: {}'.format(', '.join(missed_script_ids)))
+                    scripts += self.get_scripts(script_ids=missed_script_ids)
+
+            else:
+                # 仅使用脚本清单中的元数据
+                scripts = []
+                for script_id in changed_script_ids:
+                    script_meta = toolkit.json_copy(script_manifest[script_id])
+                    script_meta['id'] = script_id
+                    scripts.append(script_meta)
+
+            next_script_dict.update(self.create_script_dict(scripts))
+
+        SCRIPTS_CACHE_MD5 = scripts_md5
+        SCRIPT_DICT_CACHE = next_script_dict
+
+        self.script_dict = SCRIPT_DICT_CACHE
+
+        return True
+
     def update_script_dict_cache(self):
         '''
         更新脚本字典缓存
         与 ReloadScriptsTask 配合完成高速脚本加载处理
         具体如下：
-            1. 从本地内存中获取缓存时间，未超时直接结束
+            1. 已订阅脚本更新通知时，如未收到通知且未超过检查间隔，直接使用本地缓存
             2. 从Redis检查当前脚本缓存MD5值
             2.1. 如未改变，则延长缓存时间并结束
-            2.2. 如已改变，则从Redis中获取脚本缓存数据
+            2.2. 如已改变，则对比脚本清单，仅从Redis中获取发生变化的脚本
             3. 如Redis中无脚本缓存数据，则直接从数据库中获取数据
               （正常不会发生，ReloadScriptsTask 会定时更新Redis缓存）
         '''
         global SCRIPTS_CACHE_MD5
         global SCRIPT_DICT_CACHE
+        global SCRIPTS_UPDATE_NOTIFIED
+        global SCRIPTS_CACHE_CHECK_TIMESTAMP
+
+        # 1. 检查脚本更新通知
+        is_subscribed = self.subscribe_scripts_update()
+
+        now = time.time()
+        if is_subscribed \
+                and SCRIPT_DICT_CACHE is not None \
+                and not SCRIPTS_UPDATE_NOTIFIED \
+                and now - SCRIPTS_CACHE_CHECK_TIMESTAMP < CONFIG['_FUNC_TASK_SCRIPT_CACHE_CHECK_INTERVAL']:
+            self.logger.debug('[SCRIPT CACHE] No update notified, use local cache')
+            return
 
-        cache_key_script_md5 = toolkit.get_cache_key('fixedCache', 'scriptsMD5')
+        SCRIPTS_UPDATE_NOTIFIED       = False
+        SCRIPTS_CACHE_CHECK_TIMESTAMP = now
 
-        # 1. 检查Redis缓存
-        scripts_md5 = self.cache_db.get(cache_key_script_md5)
-        if scripts_md5:
-            scripts_md5 = six.ensure_str(scripts_md5)
+        # 2. 检查Redis缓存
+        if self.load_script_dict_cache():
+            return
 
+        # 3. 未能从Redis读取，从数据库获取完整用户脚本
+        self.logger.warning('[SCRIPT CACHE] Cache failed! Use DB data')
 
-        if scripts_md5 and scripts_md5 == SCRIPTS_CACHE_MD5:
-            # 存在缓存，且MD5未发生变化，不更新本地缓存
-            self.logger.debug('[SCRIPT CACHE] Not Modified, extend local cache')
-            return
+        scripts = self.get_scripts(with_code=False)
 
-        # 2. 不存在缓存/缓存MD5发生变化，从Redis读取Dump
-        scripts = None
+        # 不记录MD5，下次继续检查Redis缓存
+        SCRIPTS_CACHE_MD5 = None
+        SCRIPT_DICT_CACHE = self.create_script_dict(scripts)
 
-        cache_key_script_dump = toolkit.get_cache_key('fixedCache', 'scriptsDump')
-        scripts_dump = self.cache_db.get(cache_key_script_dump)
-        if scripts_dump:
-            self.logger.debug('[SCRIPT CACHE] Modified, Use Redis cache')
+    def preload_script_dict_cache(self):
+        '''
+        在Worker主进程中预加载脚本字典缓存
+        子进程Fork后以写时复制方式共享，之后仅在脚本变化时重新加载
+        注意：主进程中不访问数据库，避免数据库连接被子进程继承
+        '''
+        self.logger   = LogHelper()
+        self.cache_db = RedisHelper(self.logger)
 
-            scripts_dump = six.ensure_str(scripts_dump)
+        # 只从Redis加载，且预先加载所有代码供子进程共享
+        if not self.load_script_dict_cache(use_db=False, materialize=True):
+            self.logger.warning('[SCRIPT CACHE] No cache found, skip preloading')
+            return
 
-            try:
-                scripts = toolkit.json_loads(scripts_dump)
-            except Exception as e:
-                pass
+        self.logger.info('[SCRIPT CACHE] Preloaded {} scripts'.format(len(SCRIPT_DICT_CACHE)))
 
-            if not scripts_md5:
-                # 不存在缓存，自行计算（极少情况）
-                scripts_md5 = toolkit.get_md5(scripts_dump)
+    def get_warm_module(self, script_id):
+        '''
+        获取已执行的脚本模块
+        脚本本身或任意被引用脚本的codeMD5发生变化时，视为无效
+        '''
+        if CONFIG['_FUNC_TASK_WARM_MODULE_CACHE_MAX_SIZE'] <= 0:
+            return None
 
-            # 记录缓存MD5
-            SCRIPTS_CACHE_MD5 = scripts_md5
+        target_script = SCRIPT_DICT_CACHE.get(script_id)
+        if not target_script:
+            return None
 
-        # 3. 未能从Redis读取Dump，从数据库获取完整用户脚本
-        if not scripts or not scripts_dump:
-            self.logger.warning('[SCRIPT CACHE] Cache failed! Use DB data')
+        warm_module = WARM_MODULE_LRU.get(script_id)
+        if not warm_module:
+            return None
 
-            scripts = self.get_scripts()
+        dep_code_md5_map = warm_module['depCodeMD5Map']
+        for name, code_md5 in dep_code_md5_map.items():
+            s = SCRIPT_DICT_CACHE.get(name)
+            if not s or s['codeMD5'] != code_md5:
+                self.logger.debug('[WARM MODULE] Expired: `{}`'.format(script_id))
+                del WARM_MODULE_LRU[script_id]
+                return None
 
-            # 自行计算并记录缓存MD5
-            scripts_dump      = toolkit.json_dumps(scripts, sort_keys=True)
-            SCRIPTS_CACHE_MD5 = toolkit.get_md5(scripts_dump)
+        return warm_module
 
-        # 记录到本地缓存
-        SCRIPT_DICT_CACHE = self.create_script_dict(scripts)
+    def put_warm_module(self, script_id, script_scope, imported_script_dict):
+        '''
+        缓存已执行的脚本模块
+        '''
+        if CONFIG['_FUNC_TASK_WARM_MODULE_CACHE_MAX_SIZE'] <= 0:
+            return
 
-    def cache_running_info(self, func_id, script_publish_version, exec_mode=None, is_failed=False, cost=None):
-        timestamp = int(time.time())
+        dep_code_md5_map = {}
+        for name in [script_id] + list(imported_script_dict.keys()):
+            s = SCRIPT_DICT_CACHE.get(name)
+            if not s:
+                return
 
-        # 全局计数
-        data = {
-            'funcId'              : func_id,
-            'scriptPublishVersion': script_publish_version,
-            'execMode'            : exec_mode,
-            'isFailed'            : is_failed,
-            'cost'                : cost,
-            'timestamp'           : timestamp,
+            dep_code_md5_map[name] = s['codeMD5']
+
+        WARM_MODULE_LRU[script_id] = {
+            'scope'             : script_scope,
+            'importedScriptDict': imported_script_dict,
+            'depCodeMD5Map'     : dep_code_md5_map,
         }
-        data = toolkit.json_dumps(data, indent=0)
 
-        cache_key = toolkit.get_cache_key('syncCache', 'scriptRunningInfo')
-        self.cache_db.lpush(cache_key, data)
+    def get_cached_script(self, script_id):
+        return (SCRIPT_DICT_CACHE or {}).get(script_id)
 
-        # 函数调用记数
-        data = {
-            'funcId'   : func_id,
-            'timestamp': timestamp,
-        }
-        data = toolkit.json_dumps(data, indent=0)
+    def load_script_scope(self, target_script, func_id, extra_vars, allow_warm_module=True):
+        '''
+        创建作用域并执行脚本，返回执行后的脚本作用域
+        函数配置为复用已执行的脚本模块时，优先使用缓存的模块
+        '''
+        script_id = target_script['id']
 
-        cache_key = toolkit.get_cache_key('syncCache', 'funcCallInfo')
-        self.cache_db.lpush(cache_key, data)
+        # 是否复用已执行的脚本模块
+        use_warm_module = False
+        if allow_warm_module:
+            try:
+                use_warm_module = target_script['funcExtraConfig'][func_id]['warmModule'] is True
+            except (KeyError, TypeError) as e:
+                pass
+
+        warm_module = None
+        if use_warm_module:
+            warm_module = self.get_warm_module(script_id)
+
+        if warm_module:
+            # 复用已执行的脚本模块，仅替换任务相关内容
+            self.logger.info('[USE WARM MODULE] `{}`'.format(script_id))
+            with self.phase('createScope'):
+                script_scope = self.rebind_safe_scope(
+                    safe_scope=warm_module['scope'],
+                    script_dict=SCRIPT_DICT_CACHE,
+                    imported_script_dict=warm_module['importedScriptDict'],
+                    extra_vars=extra_vars)
+
+        else:
+            imported_script_dict = {}
+
+            self.logger.info('[CREATE SAFE SCOPE] `{}`'.format(script_id))
+            with self.phase('createScope'):
+                script_scope = self.create_safe_scope(
+                    script_name=script_id,
+                    script_dict=SCRIPT_DICT_CACHE,
+                    imported_script_dict=imported_script_dict,
+                    extra_vars=extra_vars)
+
+            # 加载代码
+            self.logger.info('[LOAD SCRIPT] `{}`'.format(script_id))
+            with self.phase('execScript'):
+                script_scope = self.safe_exec(self.get_script_code_obj(target_script), globals=script_scope)
+
+            if use_warm_module:
+                self.put_warm_module(script_id, script_scope, imported_script_dict)
+
+        return script_scope
+
+    def cache_running_info(self, func_id, script_publish_version, exec_mode=None, is_failed=False, cost=None, succeed_count=None, fail_count=None, min_cost=None, max_cost=None, total_cost=None, thread_cost=None, phase_costs=None, memory_usage=None):
+        '''
+        记录函数运行信息
+        数据在进程内按照函数、脚本发布版本、执行模式、分钟预先汇总，由后台线程定期合并写入Redis
+        '''
+        timestamp = int(time.time())
+
+        # 时间戳按照分钟对齐
+        minute_timestamp = int(timestamp / 60) * 60
+
+        # 批量执行时，数据已预先汇总
+        if succeed_count is None and fail_count is None:
+            succeed_count = 0 if is_failed else 1
+            fail_count    = 1 if is_failed else 0
+            min_cost      = cost
+            max_cost      = cost
+            total_cost    = cost
+
+        pk = '~'.join([func_id, str(script_publish_version), exec_mode or 'sync'])
+
+        with RUNNING_INFO_AGG_LOCK:
+            minute_agg_map = RUNNING_INFO_AGG_MAP.setdefault(minute_timestamp, {})
+
+            agg = minute_agg_map.get(pk)
+            if agg is None:
+                agg = minute_agg_map[pk] = {
+                    'succeedCount': 0,
+                    'failCount'   : 0,
+                    'minCost'     : min_cost,
+                    'maxCost'     : max_cost,
+                    'totalCost'   : 0.0,
+                    'threadCost'  : 0.0,
+                    'phaseCosts'  : {},
+                    'memoryUsage' : {},
+                }
+
+            agg['succeedCount'] += succeed_count or 0
+            agg['failCount']    += fail_count    or 0
+            agg['minCost']      = min(agg['minCost'], min_cost)
+            agg['maxCost']      = max(agg['maxCost'], max_cost)
+            agg['totalCost']    += total_cost
+            agg['latestCost']   = cost
+            agg['timestamp']    = timestamp
+
+            # 多线程处理模块中运行的累计耗时
+            if thread_cost:
+                agg['threadCost'] += thread_cost
+
+            # 执行各阶段耗时（毫秒）
+            for phase, phase_cost in (phase_costs or {}).items():
+                agg['phaseCosts'][phase] = agg['phaseCosts'].get(phase, 0.0) + phase_cost
+
+            # 内存使用（字节），保留最大值
+            for k in ('rssDelta', 'tracemallocPeak'):
+                if memory_usage and memory_usage.get(k) is not None:
+                    agg['memoryUsage'][k] = max(agg['memoryUsage'].get(k, memory_usage[k]), memory_usage[k])
+
+        start_running_info_flusher()
 
     def cache_script_failure(self, func_id, script_publish_version, exec_mode=None, einfo_text=None, trace_info=None):
         if not CONFIG['_INTERNAL_KEEP_SCRIPT_FAILURE']:
@@ -225,18 +671,205 @@ class FuncRunnerTask(ScriptBaseTask):
 
         self.cache_db.run('lpush', cache_key, data)
 
-    def cache_func_result(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, result, cache_result_expires):
-        if not all([func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_expires]):
-            return
-
-        cache_key = toolkit.get_cache_key('cache', 'funcResult', tags=[
+    def _get_func_result_cache_tags(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5):
+        return [
             'funcId'              , func_id,
             'scriptCodeMD5'       , script_code_md5,
             'scriptPublishVersion', script_publish_version,
-            'funcCallKwargsMD5'   , func_call_kwargs_md5])
+            'funcCallKwargsMD5'   , func_call_kwargs_md5,
+        ]
+
+    def get_func_result_from_cache(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_stale=None):
+        if not all([func_id, script_code_md5, script_publish_version, func_call_kwargs_md5]):
+            return None
+
+        tags = self._get_func_result_cache_tags(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5)
+        cache_key = toolkit.get_cache_key('cache', 'funcResult', tags=tags)
+
+        # 1. 从本地缓存中获取
+        result_dumps = FUNC_RESULT_LRU.get(cache_key)
+
+        # 2. 从Redis中获取
+        if result_dumps is None:
+            pipe = self.cache_db.client.pipeline()
+            pipe.get(cache_key)
+            pipe.ttl(cache_key)
 
-        result_dumps = toolkit.json_dumps(result)
-        self.cache_db.setex(cache_key, cache_result_expires, result_dumps)
+            # 开启过期后继续使用旧结果时，Redis中的结果包含过期后的时间，
+            # 本地缓存只保留到结果失效为止
+            if cache_result_stale:
+                fresh_cache_key = toolkit.get_cache_key('cache', 'funcResultFresh', tags=tags)
+                pipe.ttl(fresh_cache_key)
+
+            cache_res = pipe.execute()
+
+            result_dumps, ttl = cache_res[0], cache_res[-1]
+            if result_dumps is None:
+                return None
+
+            if ttl and ttl > 0:
+                FUNC_RESULT_LRU.set(cache_key, result_dumps, ttl)
+
+        return toolkit.json_loads(result_dumps)
+
+    def lock_func_result(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, max_lock_time, cache_result_stale=None):
+        '''
+        相同的函数调用同时只执行一次，其他调用等待并直接使用执行结果（Single-flight）
+        返回`(缓存的函数运行结果, 锁值)`，
+        获得锁的调用执行完毕后需要调用`unlock_func_result()`解锁
+
+        等待方订阅解锁通知，而不是轮询缓存。
+        等待会占用Worker的并发数，因此等待时间有上限，
+        且持有锁的调用结束但未产生结果时（如执行失败），立即停止等待
+        '''
+        result = self.get_func_result_from_cache(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_stale)
+        if result is not None:
+            return result, None
+
+        tags = self._get_func_result_cache_tags(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5)
+        lock_key   = toolkit.get_cache_key('lock', 'funcResult', tags=tags)
+        lock_value = toolkit.gen_uuid()
+
+        if self.cache_db.lock(lock_key, lock_value, max_lock_time):
+            # 获得锁后再次检查，避免前一次执行刚好结束
+            result = self.get_func_result_from_cache(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_stale)
+            if result is not None:
+                self.cache_db.unlock(lock_key, lock_value)
+                return result, None
+
+            return None, lock_value
+
+        # 未获得锁，订阅解锁通知并等待
+        channel    = toolkit.get_cache_key('broadcast', 'funcResultUnlocked', tags=tags)
+        wait_until = time.time() + min(max_lock_time, CONFIG['_FUNC_TASK_RESULT_SINGLE_FLIGHT_MAX_WAIT'])
+
+        pubsub = self.cache_db.subscribe(channel)
+        try:
+            # 订阅前持有锁的调用可能已经结束，需要检查一次
+            if self.cache_db.exists(lock_key):
+                while True:
+                    timeout = wait_until - time.time()
+                    if timeout <= 0:
+                        break
+
+                    message = pubsub.get_message(timeout=timeout)
+                    if message and message['type'] == 'message':
+                        break
+
+        finally:
+            pubsub.close()
+
+        # 持有锁的调用已结束但没有结果，或等待超时后，不再等待，直接执行
+        result = self.get_func_result_from_cache(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_stale)
+        return result, None
+
+    def unlock_func_result(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, lock_value):
+        tags = self._get_func_result_cache_tags(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5)
+        lock_key = toolkit.get_cache_key('lock', 'funcResult', tags=tags)
+
+        self.cache_db.unlock(lock_key, lock_value)
+
+        # 通知等待中的相同调用
+        channel = toolkit.get_cache_key('broadcast', 'funcResultUnlocked', tags=tags)
+        self.cache_db.publish(channel, 'x')
+
+    def cache_func_result(self, func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, result, cache_result_expires, cache_result_stale=None):
+        if not all([func_id, script_code_md5, script_publish_version, func_call_kwargs_md5, cache_result_expires]):
+            return
+
+        tags = self._get_func_result_cache_tags(func_id, script_code_md5, script_publish_version, func_call_kwargs_md5)
+        cache_key = toolkit.get_cache_key('cache', 'funcResult', tags=tags)
+
+        cache_keys = [ cache_key ]
+
+        # 开启过期后继续使用旧结果时，结果本身保存至过期后，另外记录结果是否仍然有效
+        result_expires = cache_result_expires
+        if cache_result_stale:
+            result_expires += cache_result_stale
+
+            fresh_cache_key = toolkit.get_cache_key('cache', 'funcResultFresh', tags=tags)
+            self.cache_db.setex(fresh_cache_key, cache_result_expires, 'x')
+
+            cache_keys.append(fresh_cache_key)
+
+        result_dumps = six.ensure_binary(toolkit.json_dumps(result))
+        self.cache_db.setex(cache_key, result_expires, result_dumps)
+
+        FUNC_RESULT_LRU.set(cache_key, result_dumps, cache_result_expires)
+
+        # 记录缓存索引
+        self.index_func_result_cache(func_id, cache_keys, result_expires)
+
+    def index_func_result_cache(self, func_id, cache_keys, expires):
+        '''
+        将函数结果缓存Key记录至函数、脚本索引中
+        脚本更新时直接根据索引删除，无需扫描整个Redis
+
+        索引使用有序集合，分数为过期时间戳，写入时同时清理已过期的成员
+        '''
+        script_id = func_id.split('.')[0]
+
+        func_index_key   = toolkit.get_cache_key('cache', 'funcResultIndex', tags=['funcId', func_id])
+        script_index_key = toolkit.get_cache_key('cache', 'funcResultIndex', tags=['scriptId', script_id])
+
+        now = time.time()
+        expires = int(math.ceil(expires))
+        expire_timestamp = int(now) + expires
+
+        pipe = self.cache_db.client.pipeline()
+        pipe.zremrangebyscore(func_index_key, '-inf', now)
+        pipe.zadd(func_index_key, dict([ (k, expire_timestamp) for k in cache_keys ]))
+        pipe.zremrangebyscore(script_index_key, '-inf', now)
+        pipe.zadd(script_index_key, { func_index_key: expire_timestamp })
+        pipe.ttl(func_index_key)
+        pipe.ttl(script_index_key)
+        func_index_ttl, script_index_ttl = pipe.execute()[-2:]
+
+        # 索引过期时间不短于其中的缓存
+        if func_index_ttl < expires:
+            self.cache_db.expire(func_index_key, expires)
+        if script_index_ttl < expires:
+            self.cache_db.expire(script_index_key, expires)
+
+    def create_func_result(self, func_resp, return_type=None):
+        '''
+        生成函数运行结果
+        只生成调用方所需的内容，`jsonDumps`直接复用`FuncResponse`中已序列化的数据
+        '''
+        if return_type is None:
+            return_type = 'ALL'
+
+        response_control = func_resp._create_response_control()
+
+        func_result_raw        = None
+        func_result_repr       = None
+        func_result_json_dumps = None
+
+        if func_resp.data:
+            # 指定响应体类型或下载文件时，API端固定使用`raw`
+            if return_type in ('ALL', 'raw') \
+                    or response_control.get('contentType') \
+                    or response_control.get('downloadFile'):
+                func_result_raw = func_resp.data
+
+            if return_type in ('ALL', 'repr'):
+                try:
+                    func_result_repr = self.get_func_result_repr(func_resp)
+                except Exception as e:
+                    for line in traceback.format_exc().splitlines():
+                        self.logger.error(line)
+
+            if return_type in ('ALL', 'jsonDumps'):
+                func_result_json_dumps = func_resp.data_dumps
+
+        result = {
+            'raw'      : func_result_raw,
+            'repr'     : func_result_repr,
+            'jsonDumps': func_result_json_dumps,
+
+            '_responseControl': response_control,
+        }
+        return result
 
 @app.task(name='Main.FuncRunner', bind=True, base=FuncRunnerTask, ignore_result=True)
 def func_runner(self, *args, **kwargs):
@@ -269,17 +902,31 @@ def func_runner(self, *args, **kwargs):
     start_time    = int(time.time())
     start_time_ms = int(time.time() * 1000)
 
+    # 排队等待时间（从触发时间或ETA到实际启动）
+    self.add_queue_wait_phase_cost(kwargs.get('triggerTimeMs'), start_time_ms)
+
+    # 内存使用
+    self.start_memory_usage()
+
     # HTTP请求
     http_request = kwargs.get('httpRequest') or {}
     if 'headers' in http_request:
         http_request['headers'] = toolkit.IgnoreCaseDict(http_request['headers'])
 
     # 是否缓存函数运行结果
-    cache_result_expires = None
+    cache_result_expires   = None
+    cache_result_stale     = None
+    func_result_lock_value = None
+
+    # 是否为刷新缓存结果的调用（过期后继续使用旧结果时，由API端在后台发起）
+    cache_refresh = kwargs.get('cacheRefresh') or False
 
     # 是否保存结果
     save_result = kwargs.get('saveResult') or False
 
+    # 调用方所需的返回类型（`raw`, `repr`, `jsonDumps`, `ALL`），未指定时生成全部内容
+    return_type = kwargs.get('returnType')
+
     # 函数结果、上下文、跟踪信息、错误堆栈
     func_resp    = None
     script_scope = None
@@ -303,13 +950,50 @@ def func_runner(self, *args, **kwargs):
         global SCRIPT_DICT_CACHE
 
         # 更新脚本缓存
-        self.update_script_dict_cache()
+        with self.phase('updateScriptCache'):
+            self.update_script_dict_cache()
+
         target_script = SCRIPT_DICT_CACHE.get(script_id)
 
-        if not target_script:
+        # 脚本代码按需加载
+        if not target_script or not self.get_script_code_obj(target_script):
             e = NotFoundException('Script `{}` not found'.format(script_id))
             raise e
 
+        # 获取函数结果缓存配置
+        try:
+            cache_result_expires = target_script['funcExtraConfig'][func_id]['cacheResult']
+        except (KeyError, TypeError) as e:
+            pass
+
+        try:
+            cache_result_stale = target_script['funcExtraConfig'][func_id]['cacheResultStale']
+        except (KeyError, TypeError) as e:
+            pass
+
+        # 开启缓存时，优先使用已缓存的结果，并合并相同的并发调用
+        if cache_result_expires and func_call_kwargs_md5 and not save_result and not cache_refresh:
+            func_timeout = CONFIG['_FUNC_TASK_DEFAULT_TIMEOUT']
+            try:
+                func_timeout = target_script['funcExtraConfig'][func_id]['timeout'] or func_timeout
+            except (KeyError, TypeError) as e:
+                pass
+
+            with self.phase('resultCacheRead'):
+                cached_result, func_result_lock_value = self.lock_func_result(
+                    func_id=func_id,
+                    script_code_md5=target_script['codeMD5'],
+                    script_publish_version=target_script['publishVersion'],
+                    func_call_kwargs_md5=func_call_kwargs_md5,
+                    max_lock_time=func_timeout + CONFIG['_FUNC_TASK_EXTRA_TIMEOUT_TO_KILL'],
+                    cache_result_stale=cache_result_stale)
+
+            if cached_result is not None:
+                self.logger.info('[USE CACHED RESULT] `{}`'.format(func_id))
+
+                end_status = 'success'
+                return cached_result
+
         extra_vars = {
             '_DFF_DEBUG'          : False,
             '_DFF_ROOT_TASK_ID'   : root_task_id,
@@ -331,15 +1015,7 @@ def func_runner(self, *args, **kwargs):
             '_DFF_WORKER_QUEUE'   : self.worker_queue,
             '_DFF_HTTP_REQUEST'   : http_request,
         }
-        self.logger.info('[CREATE SAFE SCOPE] `{}`'.format(script_id))
-        script_scope = self.create_safe_scope(
-            script_name=script_id,
-            script_dict=SCRIPT_DICT_CACHE,
-            extra_vars=extra_vars)
-
-        # 加载代码
-        self.logger.info('[LOAD SCRIPT] `{}`'.format(script_id))
-        script_scope = self.safe_exec(target_script['codeObj'], globals=script_scope)
+        script_scope = self.load_script_scope(target_script, func_id, extra_vars)
 
         # 执行脚本
         entry_func = script_scope.get(func_name)
@@ -349,19 +1025,22 @@ def func_runner(self, *args, **kwargs):
 
         # 执行函数
         self.logger.info('[RUN FUNC] `{}`'.format(func_id))
-        func_resp = entry_func(**func_call_kwargs)
+
+        # 按需进行性能分析
+        profile_mode = self.get_func_profile_mode(func_id)
+        with self.phase('entryCall'):
+            if profile_mode:
+                self.logger.info('[PROFILE FUNC] `{}`, mode={}'.format(func_id, profile_mode))
+                func_resp = self.profile_func_call(func_id, profile_mode,
+                        lambda: self.call_entry_func(entry_func, func_call_kwargs, start_time=start_time))
+            else:
+                func_resp = self.call_entry_func(entry_func, func_call_kwargs, start_time=start_time)
         if not isinstance(func_resp, BaseFuncResponse):
             func_resp = FuncResponse(func_resp)
 
         if isinstance(func_resp.data, Exception):
             raise func_resp.data
 
-        # 获取函数结果缓存配置
-        try:
-            cache_result_expires = target_script['funcExtraConfig'][func_id]['cacheResult']
-        except (KeyError, TypeError) as e:
-            pass
-
         # 响应大型数据，根据是否开启缓存函数运行结果区分处理
         if isinstance(func_resp, FuncResponseLargeData):
             if cache_result_expires is None:
@@ -388,36 +1067,12 @@ def func_runner(self, *args, **kwargs):
         end_status = 'success'
 
         # 准备函数运行结果
-        func_result_raw        = None
-        func_result_repr       = None
-        func_result_json_dumps = None
+        #   结果需要保存或缓存时，后续读取方式无法确定，需要生成全部内容
+        if save_result or cache_result_expires:
+            return_type = 'ALL'
 
-        if func_resp.data:
-            try:
-                func_result_raw = func_resp.data
-            except Exception as e:
-                for line in traceback.format_exc().splitlines():
-                    self.logger.error(line)
-
-            try:
-                func_result_repr = pprint.saferepr(func_resp.data)
-            except Exception as e:
-                for line in traceback.format_exc().splitlines():
-                    self.logger.error(line)
-
-            try:
-                func_result_json_dumps = toolkit.json_dumps(func_resp.data)
-            except Exception as e:
-                for line in traceback.format_exc().splitlines():
-                    self.logger.error(line)
-
-        result = {
-            'raw'      : func_result_raw,
-            'repr'     : func_result_repr,
-            'jsonDumps': func_result_json_dumps,
-
-            '_responseControl': func_resp._create_response_control()
-        }
+        with self.phase('resultSerialization'):
+            result = self.create_func_result(func_resp, return_type)
 
         # 记录函数运行结果
         if save_result:
@@ -438,13 +1093,15 @@ def func_runner(self, *args, **kwargs):
 
         # 缓存函数运行结果
         if cache_result_expires:
-            self.cache_func_result(
-                func_id=func_id,
-                script_code_md5=target_script['codeMD5'],
-                script_publish_version=target_script['publishVersion'],
-                func_call_kwargs_md5=func_call_kwargs_md5,
-                result=result,
-                cache_result_expires=cache_result_expires)
+            with self.phase('resultCacheWrite'):
+                self.cache_func_result(
+                    func_id=func_id,
+                    script_code_md5=target_script['codeMD5'],
+                    script_publish_version=target_script['publishVersion'],
+                    func_call_kwargs_md5=func_call_kwargs_md5,
+                    result=result,
+                    cache_result_expires=cache_result_expires,
+                    cache_result_stale=cache_result_stale)
 
         # 返回函数结果
         return result
@@ -456,6 +1113,19 @@ def func_runner(self, *args, **kwargs):
         if lock_key and lock_value:
             self.cache_db.unlock(lock_key, lock_value)
 
+        # 函数结果缓存解锁
+        if func_result_lock_value:
+            self.unlock_func_result(
+                func_id=func_id,
+                script_code_md5=target_script['codeMD5'],
+                script_publish_version=target_script['publishVersion'],
+                func_call_kwargs_md5=func_call_kwargs_md5,
+                lock_value=func_result_lock_value)
+
+        memory_usage = self.stop_memory_usage()
+
+        telemetry_start_time = time.perf_counter()
+
         # 记录脚本日志
         if script_scope:
             log_messages = script_scope['DFF'].log_messages or None
@@ -478,14 +1148,6 @@ def func_runner(self, *args, **kwargs):
                 einfo_text=einfo_text,
                 trace_info=trace_info)
 
-        # 记录函数运行信息
-        self.cache_running_info(
-            func_id=func_id,
-            script_publish_version=target_script['publishVersion'],
-            exec_mode=exec_mode,
-            is_failed=(end_status == 'failure'),
-            cost=time.time() - start_time)
-
         # 缓存任务状态
         self.cache_task_status(
             origin=origin,
@@ -497,5 +1159,35 @@ def func_runner(self, *args, **kwargs):
             log_messages=log_messages,
             einfo_text=einfo_text)
 
+        self.add_phase_cost('telemetry', (time.perf_counter() - telemetry_start_time) * 1000)
+
+        # 记录函数运行信息（附带各阶段耗时，因此最后记录）
+        self.cache_running_info(
+            func_id=func_id,
+            script_publish_version=target_script['publishVersion'],
+            exec_mode=exec_mode,
+            is_failed=(end_status == 'failure'),
+            cost=time.time() - start_time,
+            thread_cost=self.get_thread_cost(),
+            phase_costs=self.phase_costs,
+            memory_usage=memory_usage)
+
         # 清理资源
         self.clean_up()
+
+        # 检查内存限制
+        self.check_memory_recycle(func_id)
+
+@signals.worker_process_init.connect
+def on_worker_process_init(*args, **kwargs):
+    # 子进程启动后即开始定期写入函数运行信息，不依赖首次任务调用
+    start_running_info_flusher()
+
+@signals.worker_process_shutdown.connect
+def on_worker_process_shutdown(*args, **kwargs):
+    # 子进程退出前，写入剩余的函数运行信息
+    try:
+        flush_running_info()
+    except Exception as e:
+        for line in traceback.format_exc().splitlines():
+            RUNNING_INFO_LOGGER.error(line)
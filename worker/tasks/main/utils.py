@@ -38,7 +38,7 @@ from worker.tasks.main import func_runner, ScriptCacherMixin, DATA_SOURCE_HELPER
 
 CONFIG = yaml_resources.get('CONFIG')
 
-SCRIPT_MAP = {}
+CLEAR_CACHE_KEYS_BATCH_SIZE = 1000
 
 # Main.ReloadScripts
 class ReloadScriptsTask(BaseTask, ScriptCacherMixin):
@@ -46,69 +46,127 @@ class ReloadScriptsTask(BaseTask, ScriptCacherMixin):
     脚本重新载入任务
     与 RunnerTask.update_script_dict_cache 配合完成高速脚本加载处理
     具体如下：
-        1. 由于只有当用户「发布」脚本后，才需要重新加载，
-           因此以 biz_main_func 表的所有`id`+`scriptMD5`作为是否需要重新读取数据库的标准
-        2. 内存中维护 SCRIPT_MAP 作为缓存，结构如下：
-           { "<脚本ID>": {完整脚本数据JSON} }
+        1. 由于只有当用户「发布」、删除脚本等操作后，才需要重新加载，
+           因此以脚本变更记录 biz_main_script_change_log 的`seq`作为是否需要重新读取数据库的标准
+           （每次向前多读取一部分，避免遗漏较晚提交的变更记录）
+        2. Redis中按脚本逐个缓存，并维护脚本清单（scriptManifest）作为索引，结构如下：
+           { "<脚本ID>": { "codeMD5": "<MD5>", "publishVersion": <发布版本>, "funcExtraConfig": {...}, "funcIntegration": {...}, ... } }
         3. 由于代码内容可能比较多，
-           因此每次重新加载代码时，先只读取所有脚本的ID和MD5值，
-           和内存中维护的 SCRIPT_MAP 对比获取需要更新的脚本ID列表
+           因此每次重新加载代码时，先只读取发生变更的脚本的ID和MD5值，
+           和脚本清单对比获取需要更新的脚本ID列表
         4.1. 如果没有需要更新的脚本，则结束
-        4.2. 如果存在需要更新的脚本，则从数据库中读取需要更新的脚本信息，并合并到 SCRIPT_MAP 中，
-             最后更新整个脚本库和脚本库MD5缓存
+        4.2. 如果存在需要更新的脚本，则从数据库中读取需要更新的脚本信息，逐个写入缓存，
+             最后更新脚本清单和脚本清单MD5，并发布脚本更新通知
         X.1. 附带强制重新加载功能
     '''
 
-    def get_latest_script_data_hash(self):
+    def get_latest_script_change_seq(self):
         sql = '''
-                SELECT
-                    `id`,
-                    `publishVersion`,
-                    `codeMD5`
-                FROM biz_main_script
+            SELECT
+                MAX(`seq`) AS `seq`
+            FROM biz_main_script_change_log
             '''
         db_res = self.db.query(sql)
 
-        str_to_hash_parts = []
+        latest_seq = 0
+        if db_res and db_res[0]['seq']:
+            latest_seq = int(db_res[0]['seq'])
+
+        return latest_seq
+
+    def get_changed_script_ids(self, prev_seq):
+        '''
+        获取发生变更的脚本ID
+        `seq`在事务提交前分配，较晚提交的变更记录`seq`可能小于已处理的最大值，
+        因此每次从上次位置向前多读取一部分，重复的脚本在对比MD5后不会重新加载
+        变更记录中包含全部脚本变更（scriptId 为 NULL）时，返回None
+        '''
+        start_seq = max(prev_seq - CONFIG['_FUNC_TASK_SCRIPT_CHANGE_SEQ_OVERLAP'], 0)
+
+        sql = '''
+            SELECT DISTINCT
+                `scriptId`
+            FROM biz_main_script_change_log
+            WHERE
+                `seq` > ?
+            '''
+        sql_params = [start_seq]
+        db_res = self.db.query(sql, sql_params)
+
+        script_ids = set()
         for d in db_res:
-            _id              = d.get('id')             or '<NO_ID>'
-            _publish_version = d.get('publishVersion') or '<NO_PUBLISH_VERSION>'
-            _code_md5        = d.get('codeMD5')        or '<NO_CODE_MD5>'
-            str_to_hash_parts.append(','.join([str(_id), str(_publish_version), str(_code_md5)]))
+            if not d['scriptId']:
+                return None
 
-        str_to_hash = ';'.join(str_to_hash_parts)
-        script_data_hash = toolkit.get_sha1(str_to_hash)
+            script_ids.add(d['scriptId'])
 
-        return script_data_hash
+        return script_ids
+
+    def _cache_scripts(self, script_manifest, scripts=None, removed_script_ids=None):
+        removed_script_ids = set(removed_script_ids or [])
+
+        # 逐个写入脚本
+        if scripts:
+            key_values = {}
+            for s in scripts:
+                # 无代码的脚本视为不存在
+                if not s.get('code'):
+                    removed_script_ids.add(s['id'])
+                    continue
+
+                key_values[self.get_script_cache_key(s['id'])] = toolkit.json_dumps(s, sort_keys=True)
+
+                # 脚本清单仅包含元数据
+                script_manifest[s['id']] = {
+                    'codeMD5'        : s['codeMD5'],
+                    'publishVersion' : s['publishVersion'],
+                    'scriptSetId'    : s['scriptSetId'],
+                    'funcExtraConfig': s.get('funcExtraConfig') or {},
+                    'funcIntegration': s.get('funcIntegration') or {},
+                }
+
+            if key_values:
+                self.cache_db.mset(key_values)
+
+        # 删除已经不存在的脚本
+        if removed_script_ids:
+            for script_id in removed_script_ids:
+                self.logger.debug('[SCRIPT CACHE] Remove {}'.format(script_id))
 
-    def _cache_scripts(self):
-        scripts = sorted(SCRIPT_MAP.values(), key=lambda x: x['seq'])
-        scripts_dump = toolkit.json_dumps(scripts, sort_keys=True)
+                self.cache_db.delete(self.get_script_cache_key(script_id))
+                script_manifest.pop(script_id, None)
+
+        # 更新脚本清单及MD5
+        script_manifest_dump = toolkit.json_dumps(script_manifest, sort_keys=True)
+        scripts_md5 = toolkit.get_md5(script_manifest_dump)
+
+        cache_key = toolkit.get_cache_key('fixedCache', 'scriptManifest')
+        self.cache_db.set(cache_key, script_manifest_dump)
 
         cache_key = toolkit.get_cache_key('fixedCache', 'scriptsMD5')
-        self.cache_db.set(cache_key, toolkit.get_md5(scripts_dump))
+        prev_scripts_md5 = self.cache_db.getset(cache_key, scripts_md5)
+        if prev_scripts_md5 and six.ensure_str(prev_scripts_md5) == scripts_md5:
+            return
 
-        cache_key = toolkit.get_cache_key('fixedCache', 'scriptsDump')
-        self.cache_db.set(cache_key, scripts_dump)
+        # 发布脚本更新通知
+        channel = toolkit.get_cache_key('broadcast', 'scriptsUpdated')
+        self.cache_db.publish(channel, scripts_md5)
 
     def force_reload_script(self):
-        global SCRIPT_MAP
-
         # 获取所有脚本
         scripts = self.get_scripts()
         for s in scripts:
             self.logger.debug('[SCRIPT CACHE] Load {}'.format(s['id']))
 
-        # 字典化
-        SCRIPT_MAP = dict([(s['id'], s) for s in scripts])
-
-        # 3. Dump和MD5值写入缓存
-        self._cache_scripts()
+        # 清除脚本清单中已经不存在的脚本
+        prev_script_manifest = self.get_cached_script_manifest() or {}
+        removed_script_ids = set(prev_script_manifest.keys()) - set([s['id'] for s in scripts])
 
-    def reload_script(self):
-        global SCRIPT_MAP
+        # 重建脚本缓存
+        self._cache_scripts({}, scripts, removed_script_ids)
 
-        # 1. 获取当前所有脚本ID和MD5
+    def reload_script(self, script_ids=None):
+        # 1. 获取发生变更的脚本ID和MD5（未指定时为全部脚本）
         sql = '''
             SELECT
                  `scpt`.`id`
@@ -118,8 +176,20 @@ class ReloadScriptsTask(BaseTask, ScriptCacherMixin):
             FROM biz_main_script AS scpt
 
             JOIN biz_main_script_set as sset
+                ON `sset`.`id` = `scpt`.`scriptSetId`
             '''
-        db_res = self.db.query(sql)
+        sql_params = None
+
+        if script_ids is not None:
+            if not script_ids:
+                return False
+
+            sql += '''WHERE `scpt`.`id` IN (?) '''
+            sql_params = [script_ids]
+
+        db_res = self.db.query(sql, sql_params)
+
+        script_manifest = self.get_cached_script_manifest() or {}
 
         current_script_ids = set()
         reload_script_ids  = set()
@@ -127,7 +197,7 @@ class ReloadScriptsTask(BaseTask, ScriptCacherMixin):
             script_id  = d['id']
 
             current_script_ids.add(script_id)
-            cached_script = SCRIPT_MAP.get(script_id)
+            cached_script = script_manifest.get(script_id)
 
             if not cached_script:
                 # 新脚本
@@ -138,37 +208,45 @@ class ReloadScriptsTask(BaseTask, ScriptCacherMixin):
                 reload_script_ids.add(script_id)
 
         # 去除已经不存在的脚本
-        script_ids_to_pop = []
-        for script_id in SCRIPT_MAP.keys():
-            if script_id not in current_script_ids:
-                self.logger.debug('[SCRIPT CACHE] Remove {}'.format(script_id))
-                script_ids_to_pop.append(script_id)
+        if script_ids is None:
+            removed_script_ids = set(script_manifest.keys()) - current_script_ids
+        else:
+            removed_script_ids = (set(script_ids) & set(script_manifest.keys())) - current_script_ids
 
-        for script_id in script_ids_to_pop:
-            SCRIPT_MAP.pop(script_id, None)
+        if not reload_script_ids and not removed_script_ids:
+            return False
 
+        # 2. 从数据库获取更新后的脚本
+        scripts = []
         if reload_script_ids:
-            # 2. 从数据库获取更新后的脚本
             scripts = self.get_scripts(script_ids=reload_script_ids)
             for s in scripts:
                 self.logger.debug('[SCRIPT CACHE] Load {}'.format(s['id']))
 
-            # 合并加载的脚本
-            reloaded_script_map = dict([(s['id'], s) for s in scripts])
-            SCRIPT_MAP.update(reloaded_script_map)
+        # 3. 逐个写入缓存，并更新脚本清单
+        self._cache_scripts(script_manifest, scripts, removed_script_ids)
+
+        # 4. 删除函数结果缓存
+        self.clear_func_result_cache(reload_script_ids | removed_script_ids)
+
+        return True
 
-            # 3. Dump和MD5值写入缓存
-            self._cache_scripts()
+    def clear_func_result_cache(self, script_ids):
+        '''
+        根据索引删除脚本的函数结果缓存
+        '''
+        keys = []
+        for script_id in script_ids:
+            script_index_key = toolkit.get_cache_key('cache', 'funcResultIndex', tags=['scriptId', script_id])
+            keys.append(script_index_key)
+
+            func_index_keys = self.cache_db.zrange(script_index_key)
+            for func_index_key in func_index_keys:
+                keys.append(func_index_key)
+                keys.extend(self.cache_db.zrange(func_index_key))
 
-            # 4. 删除函数结果缓存
-            for script_id in reload_script_ids:
-                func_id_pattern = '{0}.*'.format(script_id)
-                cache_key = toolkit.get_cache_key('cache', 'funcResult', tags=[
-                    'funcId', func_id_pattern,
-                    'scriptCodeMD5', '*',
-                    'funcKwargsMD5', '*'])
-                for k in self.cache_db.client.scan_iter(cache_key):
-                    self.cache_db.delete(six.ensure_str(k))
+        for i in range(0, len(keys), CLEAR_CACHE_KEYS_BATCH_SIZE):
+            self.cache_db.unlink(keys[i:i + CLEAR_CACHE_KEYS_BATCH_SIZE])
 
 @app.task(name='Main.ReloadScripts', bind=True, base=ReloadScriptsTask)
 def reload_scripts(self, *args, **kwargs):
@@ -182,45 +260,110 @@ def reload_scripts(self, *args, **kwargs):
     else:
         self.launch_log()
 
-    cache_key = toolkit.get_cache_key('fixedCache', 'prevScriptDataHash')
+    cache_key = toolkit.get_cache_key('fixedCache', 'prevScriptChangeSeq')
 
-    # 上次脚本更新时间
-    prev_script_data_hash = self.cache_db.get(cache_key)
-    if not prev_script_data_hash:
+    # 上次脚本变更记录SEQ
+    prev_script_change_seq = self.cache_db.get(cache_key)
+    if prev_script_change_seq is None:
         force = True
     else:
-        prev_script_data_hash = six.ensure_str(prev_script_data_hash)
+        prev_script_change_seq = int(six.ensure_str(prev_script_change_seq))
 
-    # 最新脚本数据Hash
-    latest_script_data_hash = self.get_latest_script_data_hash()
+    # 最新脚本变更记录SEQ
+    latest_script_change_seq = self.get_latest_script_change_seq()
+
+    # 变更记录被重置时，需要强制重新加载
+    if prev_script_change_seq is not None and latest_script_change_seq < prev_script_change_seq:
+        force = True
 
     is_script_reloaded = False
     if force:
         self.force_reload_script()
         is_script_reloaded = True
 
-    elif latest_script_data_hash != prev_script_data_hash:
-        self.reload_script()
-        is_script_reloaded = True
+    else:
+        # 最新SEQ未变化时，同样需要检查较晚提交的变更记录
+        changed_script_ids = self.get_changed_script_ids(prev_script_change_seq)
+        is_script_reloaded = self.reload_script(script_ids=changed_script_ids)
 
     if is_script_reloaded:
         self.logger.info('[SCRIPT CACHE] Reload script {} -> {} {}'.format(
-            prev_script_data_hash, latest_script_data_hash, '[FORCE]' if force else ''))
+            prev_script_change_seq, latest_script_change_seq, '[FORCE]' if force else ''))
 
-        self.cache_db.set(cache_key, latest_script_data_hash)
+    if is_script_reloaded or latest_script_change_seq != prev_script_change_seq:
+        self.cache_db.set(cache_key, latest_script_change_seq)
 
 # Main.SyncCache
 class SyncCache(BaseTask):
-    def sync_func_call_count(self):
+    def pop_func_running_info_agg(self):
+        '''
+        获取Worker进程内预先汇总的函数运行信息
+        转换为与批量执行时预先汇总的`scriptRunningInfo`相同结构
+        '''
+        data = []
+
+        keys_cache_key    = toolkit.get_cache_key('syncCache', 'funcRunningInfoAggKeys')
+        syncing_cache_key = toolkit.get_cache_key('syncCache', 'funcRunningInfoAggSyncing')
+        for cache_key in self.cache_db.smembers(keys_cache_key):
+            cache_key = six.ensure_str(cache_key)
+
+            # 先移出列表再改名，改名后Worker写入的数据会重新创建哈希表并加入列表，不会丢失
+            self.cache_db.srem(keys_cache_key, [cache_key])
+            if not self.cache_db.exists(cache_key):
+                continue
+
+            self.cache_db.run('rename', cache_key, syncing_cache_key)
+            cache_res = self.cache_db.hgetall(syncing_cache_key)
+            self.cache_db.delete(syncing_cache_key)
+
+            agg_map = {}
+            for field, value in cache_res.items():
+                # 字段格式："<函数ID>~<脚本发布版本>~<执行模式>~<指标>[~<子项>]"
+                parts = field.split('~')
+                if len(parts) < 4:
+                    continue
+
+                func_id, script_publish_version, exec_mode, metric = parts[:4]
+
+                pk = '~'.join(parts[:3])
+                if pk not in agg_map:
+                    agg_map[pk] = {
+                        'funcId'              : func_id,
+                        'scriptPublishVersion': int(script_publish_version),
+                        'execMode'            : exec_mode,
+                        'phaseCosts'          : {},
+                        'memoryUsage'         : {},
+                    }
+
+                value = float(six.ensure_str(value))
+                if metric == 'phaseCost':
+                    agg_map[pk]['phaseCosts'][parts[4]] = value
+                elif metric == 'memoryUsage':
+                    agg_map[pk]['memoryUsage'][parts[4]] = int(value)
+                else:
+                    agg_map[pk][metric] = value
+
+            for d in agg_map.values():
+                if not all([ k in d for k in ('timestamp', 'minCost', 'maxCost', 'totalCost') ]):
+                    continue
+
+                d['timestamp']    = int(d['timestamp'])
+                d['succeedCount'] = int(d.get('succeedCount') or 0)
+                d['failCount']    = int(d.get('failCount')    or 0)
+                d['isFailed']     = d['failCount'] > 0
+                d['cost']         = d.get('latestCost') or 0
+
+                data.append(d)
+
+        return data
+
+    def sync_func_call_count(self, running_info_agg_data=None):
         data = []
 
         # 搜集数据
         cache_key = toolkit.get_cache_key('syncCache', 'funcCallInfo')
-        for i in range(CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT']):
-            cache_res = self.cache_db.run('rpop', cache_key)
-            if not cache_res:
-                break
-
+        cache_res_list = self.cache_db.rpop_n(cache_key, CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT'])
+        for cache_res in cache_res_list:
             try:
                 cache_res = toolkit.json_loads(cache_res)
             except Exception as e:
@@ -229,6 +372,14 @@ class SyncCache(BaseTask):
             else:
                 data.append(cache_res)
 
+        # Worker预先汇总的数据
+        for d in running_info_agg_data or []:
+            data.append({
+                'funcId'   : d['funcId'],
+                'timestamp': d['timestamp'],
+                'count'    : d['succeedCount'] + d['failCount'],
+            })
+
         # 归类计算
         count_map = {}
         for d in data:
@@ -246,7 +397,7 @@ class SyncCache(BaseTask):
                     'count'    : 0
                 }
 
-            count_map[pk]['count'] += 1
+            count_map[pk]['count'] += d.get('count') or 1
 
         # 写入时序数据
         for pk, c in count_map.items():
@@ -254,16 +405,81 @@ class SyncCache(BaseTask):
 
             self.cache_db.ts_add(cache_key, c['count'], timestamp=c['timestamp'], mode='addUp')
 
-    def sync_script_running_info(self):
+    def sync_func_phase_costs(self, data):
+        '''
+        函数执行各阶段耗时写入时序数据
+        按函数、阶段汇总每分钟的累计耗时（毫秒）
+        '''
+        phase_cost_map = {}
+        for d in data:
+            phase_costs = d.get('phaseCosts')
+            timestamp   = d.get('timestamp')
+            if not phase_costs or not timestamp:
+                continue
+
+            # 时间戳按照分钟对齐（减少内部时序数据存储压力）
+            timestamp = int(int(timestamp) / 60) * 60
+
+            for phase, cost in phase_costs.items():
+                pk = '~'.join([d['funcId'], phase, str(timestamp)])
+                if pk not in phase_cost_map:
+                    phase_cost_map[pk] = {
+                        'funcId'   : d['funcId'],
+                        'phase'    : phase,
+                        'timestamp': timestamp,
+                        'cost'     : 0,
+                    }
+
+                phase_cost_map[pk]['cost'] += cost
+
+        for pk, c in phase_cost_map.items():
+            cache_key = toolkit.get_server_cache_key('monitor', 'sysStats', ['metric', 'funcPhaseCost', 'funcId', c['funcId'], 'phase', c['phase']]);
+
+            self.cache_db.ts_add(cache_key, round(c['cost'], 3), timestamp=c['timestamp'], mode='addUp')
+
+    def sync_func_memory_usage(self, data):
+        '''
+        函数执行内存使用写入时序数据
+        按函数汇总每分钟的最大值（字节）
+        '''
+        memory_usage_map = {}
+        for d in data:
+            memory_usage = d.get('memoryUsage')
+            timestamp    = d.get('timestamp')
+            if not memory_usage or not timestamp:
+                continue
+
+            # 时间戳按照分钟对齐（减少内部时序数据存储压力）
+            timestamp = int(int(timestamp) / 60) * 60
+
+            for metric, field in (('funcMemoryRSSDelta', 'rssDelta'), ('funcMemoryTracemallocPeak', 'tracemallocPeak')):
+                value = memory_usage.get(field)
+                if value is None:
+                    continue
+
+                pk = '~'.join([d['funcId'], metric, str(timestamp)])
+                if pk not in memory_usage_map:
+                    memory_usage_map[pk] = {
+                        'funcId'   : d['funcId'],
+                        'metric'   : metric,
+                        'timestamp': timestamp,
+                        'value'    : value,
+                    }
+                else:
+                    memory_usage_map[pk]['value'] = max(memory_usage_map[pk]['value'], value)
+
+        for pk, c in memory_usage_map.items():
+            cache_key = toolkit.get_server_cache_key('monitor', 'sysStats', ['metric', c['metric'], 'funcId', c['funcId']]);
+
+            self.cache_db.ts_add(cache_key, c['value'], timestamp=c['timestamp'], mode='max')
+
+    def sync_script_running_info(self, running_info_agg_data=None):
         data = []
 
         # 搜集数据
         cache_key = toolkit.get_cache_key('syncCache', 'scriptRunningInfo')
-        for i in range(CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT']):
-            cache_res = self.cache_db.run('rpop', cache_key)
-            if not cache_res:
-                break
-
+        cache_res_list = self.cache_db.rpop_n(cache_key, CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT'])
+        for cache_res in cache_res_list:
             try:
                 cache_res = toolkit.json_loads(cache_res)
             except Exception as e:
@@ -272,6 +488,23 @@ class SyncCache(BaseTask):
             else:
                 data.append(cache_res)
 
+        # Worker预先汇总的数据
+        data.extend(running_info_agg_data or [])
+
+        # 写入各阶段耗时时序数据
+        try:
+            self.sync_func_phase_costs(data)
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.error(line)
+
+        # 写入内存使用时序数据
+        try:
+            self.sync_func_memory_usage(data)
+        except Exception as e:
+            for line in traceback.format_exc().splitlines():
+                self.logger.error(line)
+
         # 计算最新版本号
         func_latest_version_map = {}
         for d in data:
@@ -317,156 +550,118 @@ class SyncCache(BaseTask):
             if 'failCount' not in data_map[pk]:
                 data_map[pk]['failCount'] = 0
 
+            # 批量执行时，数据已预先汇总
+            succeed_count = d.get('succeedCount')
+            fail_count    = d.get('failCount')
+            if succeed_count is None and fail_count is None:
+                succeed_count = 0 if is_failed else 1
+                fail_count    = 1 if is_failed else 0
+
+            min_cost   = cost
+            max_cost   = cost
+            total_cost = cost
+            if d.get('totalCost') is not None:
+                min_cost   = int(d['minCost']   * 1000)
+                max_cost   = int(d['maxCost']   * 1000)
+                total_cost = int(d['totalCost'] * 1000)
+
             data_map[pk]['latestFailTimestamp']    = None
             data_map[pk]['latestSucceedTimestamp'] = None
 
-            if is_failed:
-                data_map[pk]['failCount']           += 1
+            if fail_count:
+                data_map[pk]['failCount']           += fail_count
                 data_map[pk]['latestFailTimestamp'] = timestamp
                 data_map[pk]['status']              = 'failed'
-            else:
-                data_map[pk]['succeedCount']           += 1
+            if succeed_count:
+                data_map[pk]['succeedCount']           += succeed_count
                 data_map[pk]['latestSucceedTimestamp'] = timestamp
-                data_map[pk]['status']                 = 'succeeded'
+                if not fail_count:
+                    data_map[pk]['status'] = 'succeeded'
 
             if 'minCost' not in data_map[pk]:
-                data_map[pk]['minCost'] = cost
+                data_map[pk]['minCost'] = min_cost
             else:
-                data_map[pk]['minCost'] = min(data_map[pk]['minCost'], cost)
+                data_map[pk]['minCost'] = min(data_map[pk]['minCost'], min_cost)
 
             if 'maxCost' not in data_map[pk]:
-                data_map[pk]['maxCost'] = cost
+                data_map[pk]['maxCost'] = max_cost
             else:
-                data_map[pk]['maxCost'] = max(data_map[pk]['maxCost'], cost)
+                data_map[pk]['maxCost'] = max(data_map[pk]['maxCost'], max_cost)
 
             if 'totalCost' not in data_map[pk]:
-                data_map[pk]['totalCost'] = cost
+                data_map[pk]['totalCost'] = total_cost
             else:
-                data_map[pk]['totalCost'] += cost
+                data_map[pk]['totalCost'] += total_cost
 
             data_map[pk]['latestCost'] = cost
 
-        # 分类入库
+        # 批量合并入库
+        rows_params = []
         for pk, d in data_map.items():
-            func_id                = d['funcId']
-            script_publish_version = d['scriptPublishVersion']
-            exec_mode              = d['execMode']
+            rows_params.append([
+                d['funcId'],
+                d['scriptPublishVersion'],
+                d['execMode'],
+
+                d['succeedCount'],
+                d['failCount'],
+                d['minCost'],
+                d['maxCost'],
+                d['totalCost'],
+                d['latestCost'],
+                d['latestSucceedTimestamp'],
+                d['latestFailTimestamp'],
+                d['status'],
+            ])
 
-            sql = '''
-                SELECT
-                     `succeedCount`
-                    ,`failCount`
-                    ,`minCost`
-                    ,`maxCost`
-                    ,`totalCost`
-                    ,`latestCost`
-                    ,UNIX_TIMESTAMP(`latestSucceedTime`) AS `latestSucceedTimestamp`
-                    ,UNIX_TIMESTAMP(`latestFailTime`)    AS `latestFailTimestamp`
-                    ,`status`
-                FROM biz_rel_func_running_info
-                WHERE
-                        `funcId`               = ?
-                    AND `scriptPublishVersion` = ?
-                    AND `execMode`             = ?
-                LIMIT 1
-                '''
-            sql_params = [
-                func_id,
-                script_publish_version,
-                exec_mode,
-            ]
-            prev_info = self.db.query(sql, sql_params)
-
-            # 删除已过时记录
-
-            if not prev_info:
-                # 无记录，则补全记录
-                sql = '''
-                    INSERT IGNORE INTO biz_rel_func_running_info
-                    SET
-                       `funcId`               = ?
-                      ,`scriptPublishVersion` = ?
-                      ,`execMode`             = ?
-
-                      ,`succeedCount`      = ?
-                      ,`failCount`         = ?
-                      ,`minCost`           = ?
-                      ,`maxCost`           = ?
-                      ,`totalCost`         = ?
-                      ,`latestCost`        = ?
-                      ,`latestSucceedTime` = FROM_UNIXTIME(?)
-                      ,`latestFailTime`    = FROM_UNIXTIME(?)
-                      ,`status`            = ?
-                '''
-                sql_params = [
-                    func_id,
-                    script_publish_version,
-                    exec_mode,
-
-                    d['succeedCount'],
-                    d['failCount'],
-                    d['minCost'],
-                    d['maxCost'],
-                    d['totalCost'],
-                    d['latestCost'],
-                    d['latestSucceedTimestamp'],
-                    d['latestFailTimestamp'],
-                    d['status'],
-                ]
-                self.db.query(sql, sql_params)
+        sql = '''
+            INSERT INTO biz_rel_func_running_info
+            (
+                 `funcId`
+                ,`scriptPublishVersion`
+                ,`execMode`
+
+                ,`succeedCount`
+                ,`failCount`
+                ,`minCost`
+                ,`maxCost`
+                ,`totalCost`
+                ,`latestCost`
+                ,`latestSucceedTime`
+                ,`latestFailTime`
+                ,`status`
+            )
+            VALUES
+        '''
+        row_sql = '(?, ?, ?, ?, ?, ?, ?, ?, ?, FROM_UNIXTIME(?), FROM_UNIXTIME(?), ?)'
+        suffix_sql = '''
+            ON DUPLICATE KEY UPDATE
+                 `succeedCount`      = `succeedCount` + VALUES(`succeedCount`)
+                ,`failCount`         = `failCount`    + VALUES(`failCount`)
+                ,`minCost`           = LEAST(IFNULL(`minCost`, VALUES(`minCost`)), VALUES(`minCost`))
+                ,`maxCost`           = GREATEST(IFNULL(`maxCost`, VALUES(`maxCost`)), VALUES(`maxCost`))
+                ,`totalCost`         = IFNULL(`totalCost`, 0) + VALUES(`totalCost`)
+                ,`latestCost`        = VALUES(`latestCost`)
+                ,`latestSucceedTime` = IFNULL(VALUES(`latestSucceedTime`), `latestSucceedTime`)
+                ,`latestFailTime`    = IFNULL(VALUES(`latestFailTime`),    `latestFailTime`)
+                ,`status`            = VALUES(`status`)
+        '''
+        self.db.bulk_insert(sql, row_sql, rows_params, suffix_sql=suffix_sql)
 
-            else:
-                prev_info = prev_info[0]
-
-                # 有记录，合并
-                sql = '''
-                    UPDATE biz_rel_func_running_info
-                    SET
-                         `succeedCount`      = ?
-                        ,`failCount`         = ?
-                        ,`minCost`           = ?
-                        ,`maxCost`           = ?
-                        ,`totalCost`         = ?
-                        ,`latestCost`        = ?
-                        ,`latestSucceedTime` = FROM_UNIXTIME(?)
-                        ,`latestFailTime`    = FROM_UNIXTIME(?)
-                        ,`status`            = ?
-
-                    WHERE
-                            `funcId`               = ?
-                        AND `scriptPublishVersion` = ?
-                        AND `execMode`             = ?
-                    LIMIT 1
-                '''
-                sql_params = [
-                    d['succeedCount'] + (prev_info['succeedCount'] or 0),
-                    d['failCount']    + (prev_info['failCount']    or 0),
-                    min(filter(lambda x: x is not None, (d['minCost'], prev_info['minCost']))),
-                    max(filter(lambda x: x is not None, (d['maxCost'], prev_info['maxCost']))),
-                    d['totalCost'] + (prev_info['totalCost'] or 0),
-                    d['latestCost'],
-                    d['latestSucceedTimestamp'] or prev_info['latestSucceedTimestamp'],
-                    d['latestFailTimestamp']    or prev_info['latestFailTimestamp'],
-                    d['status'],
-
-                    func_id,
-                    script_publish_version,
-                    exec_mode,
-                ]
-                self.db.query(sql, sql_params)
-
-        # 删除过时数据
-        for func_id, latest_version in func_latest_version_map.items():
+        # 删除过时数据（非最新版本、长时间未更新）
+        if func_latest_version_map:
             sql = '''
                 DELETE FROM biz_rel_func_running_info
                 WHERE
-                        `funcId`                                      =  ?
-                    AND `scriptPublishVersion`                        != ?
-                    OR  UNIX_TIMESTAMP() - UNIX_TIMESTAMP(updateTime) >  ?
+                        (
+                                `funcId` IN (?)
+                            AND (`funcId`, `scriptPublishVersion`) NOT IN (?)
+                        )
+                    OR  UNIX_TIMESTAMP() - UNIX_TIMESTAMP(updateTime) > ?
                 '''
             sql_params = [
-                func_id,
-                latest_version,
+                list(func_latest_version_map.keys()),
+                list(func_latest_version_map.items()),
                 3600 * 24 * 30,
             ]
             self.db.query(sql, sql_params)
@@ -477,11 +672,10 @@ class SyncCache(BaseTask):
 
         cache_key = toolkit.get_cache_key('syncCache', 'scriptFailure')
 
-        for i in range(CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT']):
-            cache_res = self.cache_db.run('rpop', cache_key)
-            if not cache_res:
-                break
+        rows_params = []
 
+        cache_res_list = self.cache_db.rpop_n(cache_key, CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT'])
+        for cache_res in cache_res_list:
             try:
                 cache_res = toolkit.json_loads(cache_res)
             except Exception as e:
@@ -516,20 +710,7 @@ class SyncCache(BaseTask):
 
                 trace_info = toolkit.json_dumps(trace_info)
 
-            sql = '''
-                INSERT INTO biz_main_script_failure
-                SET
-                   `id`                   = ?
-                  ,`funcId`               = ?
-                  ,`scriptPublishVersion` = ?
-                  ,`execMode`             = ?
-                  ,`einfoTEXT`            = ?
-                  ,`exception`            = ?
-                  ,`traceInfoJSON`        = ?
-                  ,`createTime`           = FROM_UNIXTIME(?)
-                  ,`updateTime`           = FROM_UNIXTIME(?)
-            '''
-            sql_params = [
+            rows_params.append([
                 failure_id,
                 func_id,
                 script_publish_version,
@@ -538,8 +719,26 @@ class SyncCache(BaseTask):
                 exception,
                 trace_info,
                 timestamp, timestamp,
-            ]
-            self.db.query(sql, sql_params)
+            ])
+
+        # 批量写入
+        sql = '''
+            INSERT INTO biz_main_script_failure
+            (
+                 `id`
+                ,`funcId`
+                ,`scriptPublishVersion`
+                ,`execMode`
+                ,`einfoTEXT`
+                ,`exception`
+                ,`traceInfoJSON`
+                ,`createTime`
+                ,`updateTime`
+            )
+            VALUES
+        '''
+        row_sql = '(?, ?, ?, ?, ?, ?, ?, FROM_UNIXTIME(?), FROM_UNIXTIME(?))'
+        self.db.bulk_insert(sql, row_sql, rows_params)
 
     def sync_script_log(self):
         if not CONFIG['_INTERNAL_KEEP_SCRIPT_LOG']:
@@ -555,11 +754,10 @@ class SyncCache(BaseTask):
 
         is_service_degraded = queue_length > CONFIG['_BUILTIN_TASK_SYNC_CACHE_SERVICE_DEGRADE_QUEUE_LENGTH']
 
-        for i in range(CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT']):
-            cache_res = self.cache_db.run('rpop', cache_key)
-            if not cache_res:
-                break
+        rows_params = []
 
+        cache_res_list = self.cache_db.rpop_n(cache_key, CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT'])
+        for cache_res in cache_res_list:
             # 发生服务降级时，随机丢弃
             if is_service_degraded:
                 if random.randint(0, queue_length) * 2 > CONFIG['_BUILTIN_TASK_SYNC_CACHE_SERVICE_DEGRADE_QUEUE_LENGTH']:
@@ -590,26 +788,31 @@ class SyncCache(BaseTask):
 
             message_text = '\n'.join(log_messages).strip()
 
-            sql = '''
-                INSERT INTO biz_main_script_log
-                SET
-                   `id`                   = ?
-                  ,`funcId`               = ?
-                  ,`scriptPublishVersion` = ?
-                  ,`execMode`             = ?
-                  ,`messageTEXT`          = ?
-                  ,`createTime`           = FROM_UNIXTIME(?)
-                  ,`updateTime`           = FROM_UNIXTIME(?)
-            '''
-            sql_params = [
+            rows_params.append([
                 log_id,
                 func_id,
                 script_publish_version,
                 exec_mode,
                 message_text,
                 timestamp, timestamp,
-            ]
-            self.db.query(sql, sql_params)
+            ])
+
+        # 批量写入
+        sql = '''
+            INSERT INTO biz_main_script_log
+            (
+                 `id`
+                ,`funcId`
+                ,`scriptPublishVersion`
+                ,`execMode`
+                ,`messageTEXT`
+                ,`createTime`
+                ,`updateTime`
+            )
+            VALUES
+        '''
+        row_sql = '(?, ?, ?, ?, ?, FROM_UNIXTIME(?), FROM_UNIXTIME(?))'
+        self.db.bulk_insert(sql, row_sql, rows_params)
 
     def sync_task_info(self):
         cache_key = toolkit.get_cache_key('syncCache', 'taskInfo')
@@ -622,11 +825,8 @@ class SyncCache(BaseTask):
 
         is_service_degraded = queue_length > CONFIG['_BUILTIN_TASK_SYNC_CACHE_SERVICE_DEGRADE_QUEUE_LENGTH']
 
-        for i in range(CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT']):
-            cache_res = self.cache_db.run('rpop', cache_key)
-            if not cache_res:
-                break
-
+        cache_res_list = self.cache_db.rpop_n(cache_key, CONFIG['_BUILTIN_TASK_SYNC_CACHE_BATCH_COUNT'])
+        for cache_res in cache_res_list:
             try:
                 cache_res = toolkit.json_loads(cache_res)
             except Exception as e:
@@ -781,16 +981,24 @@ def sync_cache(self, *args, **kwargs):
     # 上锁
     self.lock(max_age=30)
 
+    # Worker预先汇总的函数运行信息
+    running_info_agg_data = None
+    try:
+        running_info_agg_data = self.pop_func_running_info_agg()
+    except Exception as e:
+        for line in traceback.format_exc().splitlines():
+            self.logger.error(line)
+
     # 函数调用计数刷入数据库
     try:
-        self.sync_func_call_count()
+        self.sync_func_call_count(running_info_agg_data)
     except Exception as e:
         for line in traceback.format_exc().splitlines():
             self.logger.error(line)
 
     # 脚本运行信息刷入数据库
     try:
-        self.sync_script_running_info()
+        self.sync_script_running_info(running_info_agg_data)
     except Exception as e:
         for line in traceback.format_exc().splitlines():
             self.logger.error(line)
@@ -877,6 +1085,23 @@ class AutoCleanTask(BaseTask):
                     file_path = os.path.join(folder_path, file_name)
                     os.remove(file_path)
 
+    def clear_compiled_script_file(self):
+        limit_timestamp = time.time() - CONFIG['_FUNC_TASK_COMPILE_CACHE_FILE_EXPIRES']
+
+        compiled_script_dir = os.path.join(CONFIG['RESOURCE_ROOT_PATH'], CONFIG['COMPILED_SCRIPT_ROOT_FOLDER'])
+        if not os.path.exists(compiled_script_dir):
+            return
+
+        for file_name in os.listdir(compiled_script_dir):
+            file_path = os.path.join(compiled_script_dir, file_name)
+            try:
+                if os.path.getmtime(file_path) < limit_timestamp:
+                    os.remove(file_path)
+
+            except FileNotFoundError as e:
+                # 可能已被其他进程删除
+                pass
+
 @app.task(name='Main.AutoClean', bind=True, base=AutoCleanTask)
 def auto_clean(self, *args, **kwargs):
     # 上锁
@@ -902,18 +1127,26 @@ def auto_clean(self, *args, **kwargs):
     self.clear_temp_file(CONFIG['UPLOAD_TEMP_ROOT_FOLDER'])
     self.clear_temp_file(CONFIG['DOWNLOAD_TEMP_ROOT_FOLDER'])
 
+    # 清理过期的脚本编译结果缓存
+    self.clear_compiled_script_file()
+
 # Main.AutoRun
-class AutoRunTask(BaseTask):
+class AutoRunTask(BaseTask, ScriptCacherMixin):
     def get_integrated_auto_run_funcs(self):
-        sql = '''
-            SELECT
-               `func`.`id`
-            FROM biz_main_func AS `func`
-            WHERE
-                   `func`.`integration` = 'autoRun'
-                AND JSON_EXTRACT(`func`.`extraConfigJSON`, '$.integrationConfig.onLaunch') = TRUE;
-            '''
-        return self.db.query(sql)
+        funcs = []
+        for func_id, func in self.get_func_registry().items():
+            if func['integration'] != 'autoRun':
+                continue
+
+            try:
+                if func['extraConfig']['integrationConfig']['onLaunch'] is not True:
+                    continue
+            except (KeyError, TypeError) as e:
+                continue
+
+            funcs.append(func)
+
+        return funcs
 
 @app.task(name='Main.AutoRun', bind=True, base=AutoRunTask)
 def auto_run(self, *args, **kwargs):
@@ -2,6 +2,8 @@
 
 # Builtin Modules
 import re
+import asyncio
+import functools
 
 # 3rd-party Modules
 import six
@@ -204,6 +206,34 @@ def to_db_res_dict(cur, db_res):
 
     return db_res_dict or db_res
 
+class AsyncProxy(object):
+    '''
+    将处理模块的同步方法包装为awaitable
+    方法在当前事件循环的默认线程池中执行，不阻塞事件循环
+    '''
+    def __init__(self, target):
+        self.__target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self.__target, name)
+        if not callable(attr):
+            return attr
+
+        async def async_attr(*args, **kwargs):
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, functools.partial(attr, *args, **kwargs))
+
+        return async_attr
+
+class AsyncHelperMixin(object):
+    '''
+    为处理模块提供awaitable版本的方法
+    用法：`await helper.aio.query(...)`
+    '''
+    @property
+    def aio(self):
+        return AsyncProxy(self)
+
 from .datakit_helper         import DataKitHelper
 from .dataway_helper         import DataWayHelper
 from .sidecar_helper         import SidecarHelper
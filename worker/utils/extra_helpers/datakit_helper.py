@@ -9,6 +9,7 @@ import requests
 
 # Project Modules
 from worker.utils import toolkit
+from worker.utils.extra_helpers import AsyncHelperMixin
 from worker.utils.extra_helpers.datakit import DataKit
 
 def get_config(c):
@@ -21,7 +22,7 @@ def get_config(c):
         'debug'   : c.get('debug', False),
     })
 
-class DataKitHelper(object):
+class DataKitHelper(AsyncHelperMixin):
     def __init__(self, logger, config, source=None, *args, **kwargs):
         self.logger = logger
 
@@ -9,6 +9,7 @@ import requests
 
 # Project Modules
 from worker.utils import toolkit
+from worker.utils.extra_helpers import AsyncHelperMixin
 from worker.utils.extra_helpers.dataway import DataWay
 
 def get_config(c):
@@ -25,7 +26,7 @@ def get_config(c):
         'debug'     : c.get('debug', False),
     })
 
-class DataWayHelper(object):
+class DataWayHelper(AsyncHelperMixin):
     def __init__(self, logger, config, token=None, rp=None, *args, **kwargs):
         self.logger = logger
 
@@ -9,7 +9,7 @@ import traceback
 import requests
 
 # Project Modules
-from . import parse_response
+from . import parse_response, AsyncHelperMixin
 from worker.utils import toolkit
 
 def get_config(c):
@@ -22,7 +22,7 @@ def get_config(c):
     }
     return config
 
-class ElasticSearchHelper(object):
+class ElasticSearchHelper(AsyncHelperMixin):
     def __init__(self, logger, config=None, *args, **kwargs):
         self.logger = logger
 
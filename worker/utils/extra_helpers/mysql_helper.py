@@ -37,12 +37,17 @@ def get_config(c):
 CLIENT_CONFIG = None
 CLIENT        = None
 
+# 批量插入时，单条语句最多使用`max_allowed_packet`的比例
+BULK_INSERT_PACKET_RATIO = 0.8
+
 class MySQLHelper(object):
     def __init__(self, logger, config=None, database=None, pool_size=None, *args, **kwargs):
         self.logger = logger
 
         self.skip_log = False
 
+        self.max_allowed_packet = None
+
         if config:
             if database:
                 config['database'] = database
@@ -201,6 +206,54 @@ class MySQLHelper(object):
         result, count = self._execute(sql, sql_params)
         return count
 
+    def get_max_allowed_packet(self):
+        if self.max_allowed_packet is None:
+            db_res = self.query('SELECT @@max_allowed_packet AS maxAllowedPacket')
+            self.max_allowed_packet = int(db_res[0]['maxAllowedPacket'])
+
+        return self.max_allowed_packet
+
+    def bulk_insert(self, sql, row_sql, rows_params, suffix_sql=None):
+        '''
+        多行插入
+        根据`max_allowed_packet`自动拆分为多条语句执行
+
+        用法：
+            sql         = 'INSERT INTO table (`a`, `b`, `createTime`) VALUES'
+            row_sql     = '(?, ?, FROM_UNIXTIME(?))'
+            rows_params = [ [a1, b1, t1], [a2, b2, t2], ... ]
+            suffix_sql  = 'ON DUPLICATE KEY UPDATE `b` = VALUES(`b`)' （可选）
+        '''
+        if not rows_params:
+            return 0
+
+        suffix_sql = suffix_sql or ''
+
+        max_sql_length = int(self.get_max_allowed_packet() * BULK_INSERT_PACKET_RATIO)
+        base_length    = len(sql) + len(suffix_sql) + 1
+
+        count = 0
+
+        rows_sql        = []
+        rows_sql_length = base_length
+        for row_params in rows_params:
+            formatted_row_sql = format_sql(row_sql, row_params)
+            formatted_row_sql_length = len(formatted_row_sql.encode('utf8')) + 1
+
+            if rows_sql and rows_sql_length + formatted_row_sql_length > max_sql_length:
+                count += self.non_query(' '.join([sql, ','.join(rows_sql), suffix_sql]))
+
+                rows_sql        = []
+                rows_sql_length = base_length
+
+            rows_sql.append(formatted_row_sql)
+            rows_sql_length += formatted_row_sql_length
+
+        if rows_sql:
+            count += self.non_query(' '.join([sql, ','.join(rows_sql), suffix_sql]))
+
+        return count
+
     def dump_for_json(self, val):
         '''
         Dump JSON to string
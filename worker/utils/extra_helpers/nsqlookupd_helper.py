@@ -10,7 +10,7 @@ import requests
 import six
 
 # Project Modules
-from . import parse_response
+from . import parse_response, AsyncHelperMixin
 from worker.utils import toolkit
 
 LIMIT_MESSAGE_DUMP = 200
@@ -32,7 +32,7 @@ def get_config(c):
     }
     return config
 
-class NSQLookupHelper(object):
+class NSQLookupHelper(AsyncHelperMixin):
     PRODUCERS_UPDATE_INTERVAL = 60
 
     def __init__(self, logger, config=None, *args, **kwargs):
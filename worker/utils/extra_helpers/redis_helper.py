@@ -31,6 +31,14 @@ LIMIT_ARGS_DUMP = 200
 LUA_UNLOCK_KEY_KEY_NUMBER = 1;
 LUA_UNLOCK_KEY = 'if redis.call("get", KEYS[1]) == ARGV[1] then return redis.call("del", KEYS[1]) else return 0 end ';
 
+LUA_HASH_SET_MAX_KEY_NUMBER = 1;
+LUA_HASH_SET_MAX = 'local v = redis.call("hget", KEYS[1], ARGV[1]); if v == false or tonumber(ARGV[2]) > tonumber(v) then return redis.call("hset", KEYS[1], ARGV[1], ARGV[2]) else return 0 end ';
+
+LUA_HASH_SET_MIN_KEY_NUMBER = 1;
+LUA_HASH_SET_MIN = 'local v = redis.call("hget", KEYS[1], ARGV[1]); if v == false or tonumber(ARGV[2]) < tonumber(v) then return redis.call("hset", KEYS[1], ARGV[1], ARGV[2]) else return 0 end ';
+LUA_DECR_IF_EXISTS_KEY_NUMBER = 1;
+LUA_DECR_IF_EXISTS = 'if redis.call("exists", KEYS[1]) == 1 then return redis.call("decr", KEYS[1]) else return false end ';
+
 CLIENT_CONFIG = None
 CLIENT        = None
 
@@ -169,6 +177,9 @@ class RedisHelper(object):
     def delete(self, key):
         return self.run('delete', key)
 
+    def unlink(self, keys):
+        return self.run('unlink', *keys)
+
     def expire(self, key, expires):
         return self.run('expire', key, expires)
 
@@ -225,6 +236,61 @@ class RedisHelper(object):
     def hdel(self, key, fields):
         return self.run('hdel', key, *fields)
 
+    def hmerge(self, key, incr_fields=None, max_fields=None, min_fields=None, set_fields=None, expires=None, index_key=None):
+        '''
+        合并数据到哈希表（一次往返，原子操作）
+            incr_fields: 累加（整数使用`HINCRBY`，浮点数使用`HINCRBYFLOAT`）
+            max_fields : 保留最大值
+            min_fields : 保留最小值
+            set_fields : 直接覆盖
+            index_key  : 同时将哈希表Key加入此集合
+        '''
+        if not self.skip_log:
+            self.logger.debug('[REDIS] HMERGE `{}`'.format(key))
+
+        pipe = self.client.pipeline(transaction=True)
+
+        for field, value in (incr_fields or {}).items():
+            if isinstance(value, float):
+                pipe.hincrbyfloat(key, field, value)
+            else:
+                pipe.hincrby(key, field, value)
+
+        for field, value in (max_fields or {}).items():
+            pipe.eval(LUA_HASH_SET_MAX, LUA_HASH_SET_MAX_KEY_NUMBER, key, field, value)
+
+        for field, value in (min_fields or {}).items():
+            pipe.eval(LUA_HASH_SET_MIN, LUA_HASH_SET_MIN_KEY_NUMBER, key, field, value)
+
+        for field, value in (set_fields or {}).items():
+            pipe.hset(key, field, value)
+
+        if expires:
+            pipe.expire(key, expires)
+
+        if index_key:
+            pipe.sadd(index_key, key)
+
+        return pipe.execute()
+
+    def decr_if_exists(self, key):
+        '''
+        Key存在时减1并返回结果，不存在时返回`None`（不会创建Key）
+        '''
+        return self.run('eval', LUA_DECR_IF_EXISTS, LUA_DECR_IF_EXISTS_KEY_NUMBER, key)
+
+    def sadd(self, key, members):
+        return self.run('sadd', key, *members)
+
+    def smembers(self, key):
+        return self.run('smembers', key)
+
+    def srem(self, key, members):
+        return self.run('srem', key, *members)
+
+    def zrange(self, key, start=0, end=-1):
+        return self.run('zrange', key, start, end)
+
     def lpush(self, key, value):
         return self.run('lpush', key, value)
 
@@ -237,6 +303,24 @@ class RedisHelper(object):
     def rpop(self, key):
         return self.run('rpop', key)
 
+    def rpop_n(self, key, count):
+        '''
+        从列表尾部原子性地弹出最多`count`个元素，顺序与多次执行`RPOP`相同
+        '''
+        if count <= 0:
+            return []
+
+        if not self.skip_log:
+            self.logger.debug('[REDIS] RPOP N `{}` x {}'.format(key, count))
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.lrange(key, -count, -1)
+        pipe.ltrim(key, 0, -count - 1)
+        items, _ = pipe.execute()
+
+        items.reverse()
+        return items
+
     def llen(self, key):
         return self.run('llen', key)
 
@@ -254,6 +338,15 @@ class RedisHelper(object):
 
         return self.run('rpoplpush', key, dest_key)
 
+    def publish(self, channel, message):
+        return self.run('publish', channel, message)
+
+    def subscribe(self, channels):
+        pubsub = self.run('pubsub', ignore_subscribe_messages=True)
+        pubsub.subscribe(*toolkit.as_array(channels))
+
+        return pubsub
+
     def ttl(self, key):
         return self.run('ttl', key)
 
@@ -304,11 +397,14 @@ class RedisHelper(object):
         # 时间戳自动根据最小间隔对齐
         timestamp = int(timestamp / self.config['tsMinInterval']) * self.config['tsMinInterval']
 
-        if mode.lower() == 'addup':
+        if mode.lower() in ('addup', 'max'):
             prev_points = self.client.zrangebyscore(key, timestamp, timestamp)
             if prev_points:
                 _, prev_value = self.ts_parse_point(prev_points[0])
-                value += float(prev_value)
+                if mode.lower() == 'addup':
+                    value += float(prev_value)
+                else:
+                    value = max(value, float(prev_value))
 
         self.client.zremrangebyscore(key, timestamp, timestamp)
 
@@ -12,7 +12,7 @@ import traceback
 import requests
 
 # Project Modules
-from . import parse_response
+from . import parse_response, AsyncHelperMixin
 from worker.utils import toolkit
 
 def get_config(c):
@@ -24,7 +24,7 @@ def get_config(c):
         'secretKey': c.get('secretKey'),
     })
 
-class SidecarHelper(object):
+class SidecarHelper(AsyncHelperMixin):
     def __init__(self, logger, config, *args, **kwargs):
         self.logger = logger
 
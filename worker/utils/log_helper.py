@@ -103,6 +103,7 @@ LOG_JSON_FIELD_MAP = {
     'clientIP'          : 'client_ip',
     'diffTime'          : 'diff_time',
     'costTime'          : 'cost_time',
+    'phaseCosts'        : 'phase_costs',
 }
 MAX_STAGED_LOGS = 3000
 
@@ -121,6 +122,10 @@ class LoggingFormatter(logging.Formatter):
         if self.options.get('json'):
             log_content_json = {}
             for field, k in LOG_JSON_FIELD_MAP.items():
+                # 可选字段（如`phaseCosts`）只在存在时输出
+                if field not in meta:
+                    continue
+
                 log_content_json[k] = meta[field]
 
             log_content_json['message'] = message
@@ -247,6 +252,12 @@ class LogHelper(object):
             }
         }
 
+        # 函数执行各阶段耗时
+        if CONFIG['LOG_FUNC_PHASE_COSTS']:
+            phase_costs = getattr(self.task, 'phase_costs', None)
+            if phase_costs is not None:
+                log_line['meta']['phaseCosts'] = phase_costs
+
         self._prev_log_time = now_ms
 
         if self.level == 'ALL':